@@ -1,138 +1,207 @@
 import heapq
 from collections import defaultdict
 
-class AStarSolver:
-    def __init__(self, cnf):
-        self.cnf = cnf
-        self.variables = self._extract_variables()
-        self.freq = self._compute_frequency()
-
-    def _extract_variables(self):
-        variables = set()
-        for clause in self.cnf:
+from compact_cnf import as_compact
+from heuristics import make_heuristic
+from instrumentation import Instrumented
+
+class AStarSolver(Instrumented):
+    """
+    Trạng thái được lưu gọn bằng số nguyên Python dùng như bitset:
+      - assigned: bit v bật nếu biến v đã được gán
+      - true:     bit v bật nếu biến v được gán True
+      - unsat:    bit c bật nếu mệnh đề c chưa được thỏa
+    Con của một nút chỉ tạo ra vài số nguyên mới thay vì sao chép dict và set.
+
+    mode="astar": A* với bảng visited lưu một khóa số nguyên cho mỗi trạng thái.
+    mode="ida":   IDA*, chỉ giữ đường đi hiện tại nên bộ nhớ bị chặn theo độ sâu,
+                  đổi lại các nút có thể bị mở rộng lại ở mỗi vòng ngưỡng.
+
+    Biến rẽ nhánh là biến có điểm cao nhất theo heuristic.best() (xem heuristics.py)
+    trong mệnh đề chưa thỏa có ít biến tự do nhất, tìm ngay trong lượt quét lan truyền.
+    Xung đột (một mệnh đề có mọi literal sai, hoặc hai mệnh đề đơn vị đòi giá trị trái
+    ngược) được báo cho heuristic để VSIDS / dom-wdeg cập nhật điểm.
+    """
+
+    STATS = ("nodes", "decisions", "propagations", "conflicts", "max_frontier", "visited", "clauses_scanned")
+
+    def __init__(self, cnf, mode="astar", heuristic="vsids", bridge_order=None):
+        self.cnf = as_compact(cnf)
+        self.reset_stats()
+        self.mode = mode
+        self.variables = set(self.cnf.variables)
+        self.num_bits = max(self.variables) + 1 if self.variables else 1
+
+        # occ[lit]: bitset các mệnh đề chứa literal lit
+        self.occ = defaultdict(int)
+        # clause_mask[c]: bitset các biến xuất hiện trong mệnh đề c
+        self.clause_mask = []
+        # heavy_vars: bitset các biến thuộc mệnh đề có literal với tần suất > 5;
+        # rẽ nhánh trên các biến này không bị tính thêm chi phí g
+        self.heavy_vars = 0
+        # tautologies: bitset các mệnh đề chứa cả x và -x, luôn thỏa nên không đưa vào unsat
+        # (clause_mask chỉ giữ x một lần, nếu không x sẽ bị coi là literal đơn vị x=True)
+        self.tautologies = 0
+        for idx, clause in enumerate(self.cnf):
+            bit = 1 << idx
+            if any(-lit in clause for lit in clause):
+                self.tautologies |= bit
+            mask = 0
             for lit in clause:
-                variables.add(abs(lit))
-        return variables
-
-    def _compute_frequency(self):
-        freq = defaultdict(int)
-        for clause in self.cnf:
-            for lit in clause:
-                freq[abs(lit)] += 1
-        return freq
+                self.occ[lit] |= bit
+                mask |= 1 << abs(lit)
+            self.clause_mask.append(mask)
+            if any(self.cnf.frequency(abs(lit)) > 5 for lit in clause):
+                self.heavy_vars |= mask
+        self.heuristic = make_heuristic(heuristic, self.cnf.variables, None, self.cnf, bridge_order)
+
+    @staticmethod
+    def _iter_bits(bits):
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
 
     def solve(self):
-        # Mỗi phần tử trong heap: (f, g, counter, current_assignment, unsat)
+        initial_unsat = ((1 << len(self.cnf)) - 1) & ~self.tautologies
+        if self.mode == "ida":
+            return self._solve_ida(initial_unsat)
+        return self._solve_astar(initial_unsat)
+
+    def _solve_astar(self, initial_unsat):
+        # Mỗi phần tử trong heap: (f, g, counter, assigned, true, unsat)
         heap = []
         counter = 0
-        initial_assignment = {}
-        initial_unsat = set(range(len(self.cnf)))
-        heapq.heappush(heap, (len(initial_unsat), 0, counter, initial_assignment, initial_unsat))
+        heapq.heappush(heap, (initial_unsat.bit_count(), 0, counter, 0, 0, initial_unsat))
         counter += 1
 
         visited = set()
 
         while heap:
-            current_f, current_g, _, current_assignment, unsat = heapq.heappop(heap)
+            _, current_g, _, assigned, true, unsat = heapq.heappop(heap)
 
             if not unsat:
-                return self._format_solution(current_assignment)
+                return self._format_solution(assigned, true)
 
-            assignment_key = frozenset(current_assignment.items())
-            if assignment_key in visited:
+            # Khóa visited: 'true' là tập con của 'assigned' nên gộp được thành một số
+            key = assigned | (true << self.num_bits)
+            if key in visited:
                 continue
-            visited.add(assignment_key)
-
-            # Unit propagation
-            unit_clauses = []
-            for clause_idx in unsat:
-                clause = self.cnf[clause_idx]
-                unassigned_lits = [lit for lit in clause if abs(lit) not in current_assignment]
-                if len(unassigned_lits) == 1:
-                    lit = unassigned_lits[0]
-                    var = abs(lit)
-                    value = (lit > 0)
-                    unit_clauses.append((var, value))
-
-            if unit_clauses:
-                new_assignment = current_assignment.copy()
-                new_unsat = unsat.copy()
-                for var, value in unit_clauses:
-                    new_assignment[var] = value
-                    # loại bỏ các clause được thỏa
-                    for c_idx in list(new_unsat):
-                        cl = self.cnf[c_idx]
-                        for l in cl:
-                            if (l > 0 and new_assignment.get(abs(l), False)) or \
-                               (l < 0 and not new_assignment.get(abs(l), True)):
-                                new_unsat.remove(c_idx)
-                                break
-                heapq.heappush(heap, (len(new_unsat), current_g + len(unit_clauses), counter, new_assignment, new_unsat))
-                counter += 1
-                continue
-
-            # Heuristic chọn biến
-            var_scores = defaultdict(float)
-            bridge_vars = set()
-
-            # Ví dụ: tăng trọng số cho biến có tần suất cao
-            for clause_idx in unsat:
-                clause = self.cnf[clause_idx]
-                if any(abs(lit) in self.freq and self.freq[abs(lit)] > 5 for lit in clause):
-                    for lit in clause:
-                        var = abs(lit)
-                        if var not in current_assignment:
-                            var_scores[var] += 2.0
-                            bridge_vars.add(var)
-
-            if not var_scores:
-                # Fallback
-                for clause_idx in unsat:
-                    clause = self.cnf[clause_idx]
-                    for lit in clause:
-                        var = abs(lit)
-                        if var not in current_assignment:
-                            var_scores[var] += 1.0 / len(clause)
-
-            if not var_scores:
-                # Không còn biến nào để gán => bế tắc
-                continue
-
-            next_var = max(var_scores.keys(), key=lambda x: var_scores[x])
-
-            # Thử gán True hoặc False
-            for value in [True, False]:
-                new_assignment = current_assignment.copy()
-                new_assignment[next_var] = value
-                new_unsat = set()
-                for c_idx in unsat:
-                    cl = self.cnf[c_idx]
-                    satisfied = False
-                    for l in cl:
-                        if abs(l) in new_assignment:
-                            if (l > 0 and new_assignment[abs(l)]) or \
-                               (l < 0 and not new_assignment[abs(l)]):
-                                satisfied = True
-                                break
-                    if not satisfied:
-                        new_unsat.add(c_idx)
-
-                cost = current_g + 1
-                # Ưu tiên biến 'bridge' (nếu muốn)
-                if next_var in bridge_vars:
-                    f_val = len(new_unsat)
-                else:
-                    f_val = len(new_unsat) + cost
-
-                heapq.heappush(heap, (f_val, cost, counter, new_assignment, new_unsat))
+            visited.add(key)
+            self.nodes += 1
+            self.visited = len(visited)
+            if len(heap) >= self.max_frontier:
+                self.max_frontier = len(heap) + 1
+            if self.progress_callback is not None and self.nodes % self.progress_interval == 0:
+                self._report_progress()
+
+            for child in self._expand(current_g, assigned, true, unsat):
+                heapq.heappush(heap, (child[0], child[1], counter) + child[2:])
                 counter += 1
 
         return None
 
-    def _format_solution(self, assignment):
+    def _solve_ida(self, initial_unsat):
+        threshold = initial_unsat.bit_count()
+        while True:
+            next_threshold = None
+            # Ngăn xếp tường minh: mỗi phần tử là (g, assigned, true, unsat)
+            stack = [(0, 0, 0, initial_unsat)]
+            while stack:
+                current_g, assigned, true, unsat = stack.pop()
+                if not unsat:
+                    return self._format_solution(assigned, true)
+                self.nodes += 1
+                if len(stack) >= self.max_frontier:
+                    self.max_frontier = len(stack) + 1
+                if self.progress_callback is not None and self.nodes % self.progress_interval == 0:
+                    self._report_progress()
+
+                children = []
+                for f_val, g, child_assigned, child_true, child_unsat in self._expand(current_g, assigned, true, unsat):
+                    if f_val > threshold:
+                        if next_threshold is None or f_val < next_threshold:
+                            next_threshold = f_val
+                    else:
+                        children.append((f_val, g, child_assigned, child_true, child_unsat))
+
+                # Con có f nhỏ nhất được lấy ra trước
+                children.sort(key=lambda child: child[0], reverse=True)
+                for _, g, child_assigned, child_true, child_unsat in children:
+                    stack.append((g, child_assigned, child_true, child_unsat))
+
+            if next_threshold is None:
+                return None
+            threshold = next_threshold
+
+    def _expand(self, current_g, assigned, true, unsat):
+        """Sinh các nút con dưới dạng (f, g, assigned, true, unsat)."""
+        # Unit propagation
+        self.clauses_scanned += unsat.bit_count()
+        unit_clauses = {}
+        # Mệnh đề chưa thỏa ngắn nhất (ít biến tự do nhất), dùng để rẽ nhánh nếu không có mệnh đề đơn vị
+        branch_free = 0
+        branch_size = None
+        for clause_idx in self._iter_bits(unsat):
+            free = self.clause_mask[clause_idx] & ~assigned
+            if not free:
+                # Mọi literal đã sai: nút chết
+                self.conflicts += 1
+                self.heuristic.on_conflict(self.cnf[clause_idx])
+                return []
+            if free & (free - 1):
+                if not unit_clauses:
+                    size = free.bit_count()
+                    if branch_size is None or size < branch_size:
+                        branch_free, branch_size = free, size
+            else:
+                var = free.bit_length() - 1
+                value = var in self.cnf[clause_idx]
+                if var in unit_clauses and unit_clauses[var][0] != value:
+                    # Hai mệnh đề đơn vị đòi giá trị trái ngược: nút chết
+                    self.conflicts += 1
+                    self.heuristic.on_conflict(self.cnf[unit_clauses[var][1]] + self.cnf[clause_idx])
+                    return []
+                unit_clauses[var] = (value, clause_idx)
+
+        if unit_clauses:
+            self.propagations += len(unit_clauses)
+            new_assigned, new_true, new_unsat = assigned, true, unsat
+            for var, (value, _) in unit_clauses.items():
+                new_assigned |= 1 << var
+                if value:
+                    new_true |= 1 << var
+                # loại bỏ các clause được thỏa
+                new_unsat &= ~self.occ[var if value else -var]
+            return [(new_unsat.bit_count(), current_g + len(unit_clauses), new_assigned, new_true, new_unsat)]
+
+        if branch_size is None:
+            # Không còn biến nào để gán => bế tắc
+            return []
+        # Heuristic chọn biến có điểm cao nhất trong mệnh đề ngắn nhất, không cần sắp xếp lại
+        next_var = self.heuristic.best(self._iter_bits(branch_free))
+
+        # Thử gán True hoặc False
+        self.decisions += 1
+        children = []
+        cost = current_g + 1
+        for value in [True, False]:
+            new_assigned = assigned | (1 << next_var)
+            new_true = true | (1 << next_var) if value else true
+            new_unsat = unsat & ~self.occ[next_var if value else -next_var]
+
+            # Ưu tiên biến 'bridge' (nếu muốn)
+            if self.heavy_vars >> next_var & 1:
+                f_val = new_unsat.bit_count()
+            else:
+                f_val = new_unsat.bit_count() + cost
+            children.append((f_val, cost, new_assigned, new_true, new_unsat))
+        return children
+
+    def _format_solution(self, assigned, true):
         solution = []
-        for var in sorted(assignment.keys()):
-            if assignment[var]:
+        for var in self._iter_bits(assigned):
+            if true >> var & 1:
                 solution.append(var)
             else:
                 solution.append(-var)
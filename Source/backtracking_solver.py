@@ -1,121 +1,427 @@
+import math
+import multiprocessing
+import os
+import queue as queue_module
 from collections import defaultdict
 
-class BacktrackingSolver:
-    def __init__(self, cnf):
-        self.cnf = cnf
-        self.variables = self._extract_variables()
-        self.freq = self._compute_frequency()
+from compact_cnf import as_compact
+from heuristics import frequency_order, make_heuristic
+from instrumentation import Instrumented
 
-    def _extract_variables(self):
-        variables = set()
-        for clause in self.cnf:
-            for lit in clause:
-                variables.add(abs(lit))
-        return sorted(variables)
+# backtrack() trả về UNKNOWN khi hết ngân sách xung đột của một cube
+UNKNOWN = "unknown"
+
+
+def _cube_worker(cnf, solver_kwargs, conflict_budget, tasks, results):
+    """
+    Chạy trong tiến trình con: lấy cube từ hàng đợi chung và giải. Mỗi kết quả gửi
+    về là (pid, trạng thái, cube, dữ liệu, thống kê) với trạng thái:
+      "sat"   : dữ liệu là mô hình (dạng _format_solution)
+      "unsat" : cube vô nghiệm
+      "split" : hết ngân sách xung đột, dữ liệu là các cube con để tiến trình cha
+                đưa lại vào hàng đợi
+    """
+    solver = BacktrackingSolver(cnf, **solver_kwargs)
+    pid = os.getpid()
+    try:
+        while True:
+            cube = tasks.get()
+            result = solver.solve_cube(cube, conflict_budget)
+            if result is UNKNOWN:
+                children = solver.split_cube(cube)
+                if not children:
+                    result = None
+                elif children == [cube]:
+                    # Không còn biến nào để tách: giải cube đến cùng
+                    result = solver.solve_cube(cube)
+                else:
+                    results.put((pid, "split", cube, children, solver.get_stats()))
+                    continue
+            status = "unsat" if result is None else "sat"
+            results.put((pid, status, cube, result, solver.get_stats()))
+    except Exception as exc:
+        results.put((pid, "error", None, repr(exc), solver.get_stats()))
+
+
+class BacktrackingSolver(Instrumented):
+    STATS = ("decisions", "propagations", "conflicts", "clauses_scanned", "cubes", "resplits")
+
+    def __init__(self, cnf, heuristic="vsids", bridge_order=None, jobs=1, cube_depth=None,
+                 cube_conflicts=2000, lookahead_vars=64):
+        """
+        'heuristic': cách chọn biến rẽ nhánh (xem heuristics.py). Mặc định VSIDS: các
+        biến của mệnh đề gây xung đột được tăng điểm; "freq" là thứ tự tĩnh cũ, biến
+        xuất hiện nhiều nhất được thử trước. 'bridge_order' là thứ tự biến cầu cho
+        heuristic "bridge", và là tập biến ứng viên khi chia cube.
+
+        Nếu 'jobs' > 1 (None = tất cả CPU), solver chạy theo kiểu cube-and-conquer:
+        lookahead chia bài toán thành các cube (phép gán một phần trên các biến có ảnh
+        hưởng lớn nhất, tối đa 'cube_depth' biến), các tiến trình con lấy cube từ một
+        hàng đợi chung và giải với ngân sách 'cube_conflicts' xung đột; cube nào hết
+        ngân sách được tách tiếp. 'lookahead_vars' là số biến được thử ở mỗi lần tách.
+        """
+        self.cnf = as_compact(cnf)
+        self.reset_stats()
+        self.variables = list(self.cnf.variables)
+        self.heuristic_name = heuristic
+        self.bridge_order = bridge_order
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cube_depth = cube_depth
+        self.cube_conflicts = cube_conflicts
+        self.lookahead_vars = lookahead_vars
+        self.root_ok = None
+
+        num_vars = self.variables[-1] if self.variables else 0
+        # value[var]: 1 = True, -1 = False, 0 = chưa gán
+        self.value = [0] * (num_vars + 1)
+        self.heuristic = make_heuristic(heuristic, self.variables, self.value, self.cnf, bridge_order)
+        self.conflict_clause = None
+
+        self.clauses = []
+        self.watches = defaultdict(list)
+        self.units = []
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.empty_clause = False
+        self._init_watches()
 
-    def _compute_frequency(self):
-        freq = defaultdict(int)
+    def _init_watches(self):
+        """
+        Mỗi mệnh đề có >= 2 literal được theo dõi bởi 2 literal đầu tiên
+        (clause[0] và clause[1]). Mệnh đề đơn được đưa vào hàng đợi ở mức 0.
+        """
         for clause in self.cnf:
-            for lit in clause:
-                freq[abs(lit)] += 1
-        return freq
+            # Sao chép để không làm thay đổi thứ tự literal của cnf gốc
+            clause = list(dict.fromkeys(clause))
+            if not clause:
+                self.empty_clause = True
+            elif len(clause) == 1:
+                self.units.append(clause[0])
+            else:
+                idx = len(self.clauses)
+                self.clauses.append(clause)
+                self.watches[clause[0]].append(idx)
+                self.watches[clause[1]].append(idx)
+
+    def lit_value(self, lit):
+        v = self.value[abs(lit)]
+        return v if lit > 0 else -v
+
+    def assign(self, lit):
+        self.value[abs(lit)] = 1 if lit > 0 else -1
+        self.trail.append(lit)
 
     def solve(self):
-        assignment = {}
-        unsat = set(range(len(self.cnf)))
-        assignment, unsat = self.unit_propagate(assignment, unsat)
-        if assignment is None:
-            return None, 0
+        if not self.propagate_root():
+            return None
+        if self.jobs > 1:
+            return self._solve_cubes()
 
-        solution = self.backtrack(assignment, unsat)
+        solution = self.backtrack()
         return solution
 
-    def unit_propagate(self, assignment, unsat):
-        new_assignment = assignment.copy()
-        new_unsat = unsat.copy()
+    def propagate_root(self):
+        """Gán các mệnh đề đơn và lan truyền ở mức 0 (một lần); False nếu gặp mâu thuẫn."""
+        if self.root_ok is not None:
+            return self.root_ok
+        self.root_ok = False
+        if self.empty_clause:
+            return False
+
+        for lit in self.units:
+            val = self.lit_value(lit)
+            if val == -1:
+                return False
+            if val == 0:
+                self.assign(lit)
+
+        if not self.unit_propagate():
+            return False
+        self.root_ok = True
+        return True
+
+    def unit_propagate(self):
+        """
+        Lan truyền đơn vị bằng 2 literal theo dõi (two watched literals).
+        Chỉ duyệt các mệnh đề đang theo dõi literal vừa bị gán sai,
+        trả về False nếu gặp xung đột.
+        """
+        value = self.value
+        clauses = self.clauses
+        watches = self.watches
+        trail = self.trail
+
+        while self.qhead < len(trail):
+            false_lit = -trail[self.qhead]
+            self.qhead += 1
+            watch_list = watches[false_lit]
+
+            i = j = 0
+            n = len(watch_list)
+            self.clauses_scanned += n
+            while i < n:
+                c_idx = watch_list[i]
+                i += 1
+                clause = clauses[c_idx]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+
+                first = clause[0]
+                first_val = value[first] if first > 0 else -value[-first]
+                if first_val == 1:
+                    watch_list[j] = c_idx
+                    j += 1
+                    continue
+
+                # Tìm literal khác chưa bị gán sai để theo dõi thay
+                for k in range(2, len(clause)):
+                    lit = clause[k]
+                    if (value[lit] if lit > 0 else -value[-lit]) != -1:
+                        clause[1], clause[k] = lit, false_lit
+                        watches[lit].append(c_idx)
+                        break
+                else:
+                    watch_list[j] = c_idx
+                    j += 1
+                    if first_val == -1:
+                        self.conflict_clause = clause
+                        # Xung đột: giữ lại các watch chưa duyệt
+                        while i < n:
+                            watch_list[j] = watch_list[i]
+                            j += 1
+                            i += 1
+                        del watch_list[j:]
+                        return False
+                    self.assign(first)
+                    self.propagations += 1
+            del watch_list[j:]
+
+        return True
+
+    def undo_level(self):
+        """Hủy toàn bộ phép gán của mức quyết định cuối cùng theo trail."""
+        start = self.trail_lim.pop()
+        value = self.value
+        unassign = self.heuristic.unassign
+        for lit in self.trail[start:]:
+            var = abs(lit)
+            value[var] = 0
+            unassign(var)
+        del self.trail[start:]
+        self.qhead = start
+
+    def backtrack(self, max_conflicts=None):
+        """
+        Tìm kiếm từ mức quyết định hiện tại. Trả về mô hình, None nếu vô nghiệm, hoặc
+        UNKNOWN khi đã gặp 'max_conflicts' xung đột (phép gán khi đó chưa được hủy).
+        """
+        # Mỗi phần tử: (literal quyết định, đã thử cả 2 giá trị hay chưa)
+        decisions = []
+        conflicts = 0
 
         while True:
-            unit_clause_found = False
-            for clause_idx in list(new_unsat):
-                clause = self.cnf[clause_idx]
-                unassigned = [lit for lit in clause if abs(lit) not in new_assignment]
-                if len(unassigned) == 0:
-                    if not any((lit > 0 and new_assignment.get(abs(lit), False)) or
-                            (lit < 0 and not new_assignment.get(abs(lit), True)) for lit in clause):
-                        return None, None  # conflict
-                elif len(unassigned) == 1:
-                    unit_clause_found = True
-                    lit = unassigned[0]
-                    var = abs(lit)
-                    val = lit > 0
-                    new_assignment[var] = val
-
-                    new_unsat = {idx for idx in new_unsat if not any(
-                        (l > 0 and new_assignment.get(abs(l), False)) or
-                        (l < 0 and not new_assignment.get(abs(l), True)) for l in self.cnf[idx]
-                    )}
-                    break  # Re-evaluate from beginning after update
-            if not unit_clause_found:
-                break
-        return new_assignment, new_unsat
+            if not self.unit_propagate():
+                self.conflicts += 1
+                conflicts += 1
+                self.heuristic.on_conflict(self.conflict_clause)
+                if max_conflicts is not None and conflicts >= max_conflicts:
+                    return UNKNOWN
+                while decisions and decisions[-1][1]:
+                    decisions.pop()
+                    self.undo_level()
+                if not decisions:
+                    return None
+
+                lit, _ = decisions.pop()
+                self.undo_level()
+                self.trail_lim.append(len(self.trail))
+                decisions.append((-lit, True))
+                self.assign(-lit)
+                continue
+
+            var = self.select_unassigned_variable()
+            if var is None:
+                return self._format_solution()
+
+            # Thử gán True trước, False sau
+            self.decisions += 1
+            if self.progress_callback is not None and self.decisions % self.progress_interval == 0:
+                self._report_progress()
+            self.trail_lim.append(len(self.trail))
+            decisions.append((var, False))
+            self.assign(var)
+
+    def select_unassigned_variable(self):
+        return self.heuristic.pick()
 
+    # ------------------------------------------------------------------
+    # Cube-and-conquer
 
-    def backtrack(self, assignment, unsat):
-        if not unsat:
-            return self._format_solution(assignment)
+    def _assume(self, cube):
+        """Gán các literal của cube thành một mức quyết định mới rồi lan truyền."""
+        self.trail_lim.append(len(self.trail))
+        for lit in cube:
+            val = self.lit_value(lit)
+            if val == -1:
+                return False
+            if val == 0:
+                self.assign(lit)
+        return self.unit_propagate()
 
-        var = self.select_unassigned_variable(assignment, unsat)
-        if var is None:
+    def _retract(self):
+        """Hủy mọi phép gán phía trên mức 0."""
+        while self.trail_lim:
+            self.undo_level()
+
+    def solve_cube(self, cube, max_conflicts=None):
+        """Giải dưới giả thiết 'cube'; trả về như backtrack() và luôn quay về mức 0."""
+        if not self.propagate_root():
             return None
+        try:
+            if not self._assume(cube):
+                self.conflicts += 1
+                return None
+            return self.backtrack(max_conflicts)
+        finally:
+            self._retract()
+
+    def _probe(self, lit):
+        """Số phép gán được suy ra khi gán thêm 'lit' (None nếu dẫn tới xung đột)."""
+        start = len(self.trail)
+        self.trail_lim.append(start)
+        self.assign(lit)
+        ok = self.unit_propagate()
+        count = len(self.trail) - start
+        self.undo_level()
+        return count if ok else None
+
+    def _lookahead_candidates(self):
+        if self.bridge_order is not None:
+            known = set(self.variables)
+            order = [var for var in self.bridge_order if var in known]
+        else:
+            order = frequency_order(self.variables, self.cnf)
+        return [var for var in order if self.value[var] == 0][:self.lookahead_vars]
+
+    def split_cube(self, cube):
+        """
+        Tách 'cube' bằng lookahead: thử gán True / False cho từng biến ứng viên, chọn
+        biến có tích (số phép gán suy ra khi True + 1) x (khi False + 1) lớn nhất. Biến
+        có một giá trị dẫn tới xung đột bị ép theo giá trị còn lại (failed literal).
+        Trả về danh sách cube con: rỗng nếu cube vô nghiệm, [cube] nếu không tách được.
+        """
+        if not self.propagate_root():
+            return []
+        try:
+            if not self._assume(cube):
+                return []
+            best, best_score, forced = None, -1, []
+            for var in self._lookahead_candidates():
+                if self.value[var] != 0:
+                    continue  # đã bị ép bởi một failed literal trước đó
+                pos, neg = self._probe(var), self._probe(-var)
+                if pos is None and neg is None:
+                    return []
+                if pos is None or neg is None:
+                    lit = -var if pos is None else var
+                    forced.append(lit)
+                    self.assign(lit)
+                    if not self.unit_propagate():
+                        return []
+                    continue
+                score = (pos + 1) * (neg + 1)
+                if score > best_score:
+                    best, best_score = var, score
+        finally:
+            self._retract()
+
+        cube = list(cube) + forced
+        if best is None:
+            return [cube]
+        return [cube + [best], cube + [-best]]
 
-        for value in [True, False]:
-            new_assignment = assignment.copy()
-            new_assignment[var] = value
-            new_unsat = set()
-            for c_idx in unsat:
-                cl = self.cnf[c_idx]
-                if not any((lit > 0 and new_assignment.get(abs(lit), False)) or 
-                           (lit < 0 and not new_assignment.get(abs(lit), True)) for lit in cl):
-                    new_unsat.add(c_idx)
-
-            propagated_assignment, propagated_unsat = self.unit_propagate(new_assignment, new_unsat)
-            if propagated_assignment is not None:
-                result = self.backtrack(propagated_assignment, propagated_unsat)
-                if result:
-                    return result
-
-        return None
-
-    def select_unassigned_variable(self, assignment, unsat):
-        var_scores = defaultdict(float)
-        bridge_vars = set()
-
-        for clause_idx in unsat:
-            clause = self.cnf[clause_idx]
-            if any(abs(lit) in self.freq and self.freq[abs(lit)] > 5 for lit in clause):
-                for lit in clause:
-                    var = abs(lit)
-                    if var not in assignment:
-                        var_scores[var] += 2.0
-                        bridge_vars.add(var)
-
-        if not var_scores:
-            for clause_idx in unsat:
-                clause = self.cnf[clause_idx]
-                for lit in clause:
-                    var = abs(lit)
-                    if var not in assignment:
-                        var_scores[var] += 1.0 / len(clause)
-
-        if not var_scores:
+    def make_cubes(self, depth):
+        """Tách đệ quy từ cube rỗng tới độ sâu 'depth'; bỏ các cube bị bác bỏ."""
+        cubes = [[]]
+        for _ in range(depth):
+            next_cubes = []
+            for cube in cubes:
+                next_cubes.extend(self.split_cube(cube))
+            if next_cubes == cubes:
+                break
+            cubes = next_cubes
+        return cubes
+
+    def _solve_cubes(self, poll_interval=0.05):
+        """
+        Phát các cube cho 'jobs' tiến trình qua một hàng đợi chung: tiến trình rảnh lấy
+        cube kế tiếp nên việc được cân bằng động. Chỉ tiến trình cha đưa cube vào hàng
+        đợi (kể cả các cube con được tách lại) nên số cube còn dở luôn chính xác. Khi
+        một tiến trình tìm được mô hình, mọi tiến trình khác bị dừng.
+        """
+        depth = self.cube_depth
+        if depth is None:
+            depth = math.ceil(math.log2(self.jobs)) + 3
+        cubes = self.make_cubes(depth)
+        if not cubes:
             return None
 
-        return max(var_scores.keys(), key=lambda x: var_scores[x])
+        solver_kwargs = {"heuristic": self.heuristic_name, "bridge_order": self.bridge_order, "jobs": 1,
+                         "lookahead_vars": self.lookahead_vars}
+        tasks = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+        for cube in cubes:
+            tasks.put(cube)
+        outstanding = len(cubes)
+        self.cubes = len(cubes)
+        worker_stats = {}
+
+        processes = [
+            multiprocessing.Process(
+                target=_cube_worker,
+                args=(self.cnf, solver_kwargs, self.cube_conflicts, tasks, results),
+                daemon=True,
+            )
+            for _ in range(min(self.jobs, len(cubes)))
+        ]
+        for process in processes:
+            process.start()
+        try:
+            while outstanding:
+                try:
+                    pid, status, cube, payload, stats = results.get(timeout=poll_interval)
+                except queue_module.Empty:
+                    if not any(p.is_alive() for p in processes) and results.empty():
+                        raise RuntimeError("Các tiến trình cube-and-conquer dừng bất thường")
+                    continue
+                worker_stats[pid] = stats
+                if status == "error":
+                    raise RuntimeError(f"Lỗi trong tiến trình cube-and-conquer: {payload}")
+                if status == "sat":
+                    return payload
+                outstanding -= 1
+                if status == "split":
+                    self.resplits += 1
+                    self.cubes += len(payload)
+                    outstanding += len(payload)
+                    for child in payload:
+                        tasks.put(child)
+            return None
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            # Cộng dồn thống kê của các tiến trình con vào thống kê của lookahead
+            for stats in worker_stats.values():
+                for name in ("decisions", "propagations", "conflicts", "clauses_scanned"):
+                    setattr(self, name, getattr(self, name) + stats.get(name, 0))
 
-    def _format_solution(self, assignment):
+    def _format_solution(self):
         solution = []
-        for var in sorted(assignment.keys()):
-            if assignment[var]:
+        for var in self.variables:
+            if self.value[var] == 1:
                 solution.append(var)
             else:
                 solution.append(-var)
@@ -0,0 +1,281 @@
+"""
+Chạy không tương tác trên cả thư mục đề bài, mỗi lần giải nằm trong một tiến trình riêng.
+
+Ví dụ:
+    python batch.py Inputs/ --solver pysat,backtracking --jobs 4 --timeout 10
+
+Mỗi kết quả được ghi ngay thành một dòng JSON vào file --results khi lần giải
+kết thúc; lời giải vẫn được hiển thị bằng solution_to_text và ghi ra thư mục
+Outputs/ bằng write_output_to_file như main.py, kèm một file JSON danh sách cạnh
+(output-XX.json) cho các công cụ phía sau.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from multiprocessing.connection import wait
+
+from cnf_cache import load_or_encode
+from heuristics import HEURISTICS
+from main import solver_entries, measure_solver, format_result, solver_stats
+from solution_cache import SolutionCache
+from utils import (
+    edges_to_text,
+    read_input_from_file,
+    solution_edge_list,
+    solution_to_json,
+    write_json_output,
+    write_output_to_file,
+)
+
+SOLVER_NAMES = ["astar", "pysat", "portfolio", "backtracking", "cube", "bruteforce", "cdcl", "bridge"]
+# Phần của --timeout mà lần giải lẫn lần đo bộ nhớ (tracemalloc) phải xong trong đó
+MEMORY_RUN_SHARE = 0.8
+
+
+def list_inputs(paths):
+    """Trả về danh sách file .txt từ các đường dẫn (file hoặc thư mục), đã sắp xếp."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".txt")
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def start_process_group():
+    """
+    Gọi đầu tiên trong tiến trình con: tách tiến trình ra một session (nhóm tiến trình)
+    riêng, để kill_process_group dừng được cả các tiến trình cháu mà nó tạo ra (backend
+    của portfolio, worker cube-and-conquer, pool Brute Force).
+    """
+    if hasattr(os, "setsid"):
+        os.setsid()
+
+
+def kill_process_group(process):
+    """
+    Dừng cưỡng bức 'process' cùng cả nhóm tiến trình của nó rồi join. Nếu tiến trình
+    chưa kịp tách nhóm (hoặc hệ điều hành không có killpg) thì chỉ dừng chính nó; khi
+    đó nó cũng chưa tạo tiến trình cháu nào.
+    """
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+    else:
+        process.terminate()
+    process.join()
+
+
+def _profile_path(profile_dir, input_path, solver_key):
+    """File .prof cho một cặp (đề, solver), ví dụ prof/input-01-pysat.prof."""
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(profile_dir, f"{base}-{solver_key}.prof")
+
+
+def _solve_job(conn, input_path, solver_key, preprocess=False, deduce=False, use_cache=False, profile_dir=None,
+               heuristic=None, solver_jobs=1, timeout=None):
+    """
+    Chạy trong tiến trình con: giải một đề bằng một solver và gửi kết quả về qua pipe.
+    'solver_jobs' là số tiến trình Brute Force / cube-and-conquer được dùng (None = tất cả CPU).
+    Bộ nhớ chỉ được đo (ở một lần chạy riêng) khi lần chạy đó còn kịp xong trong 'timeout' giây.
+    """
+    start_process_group()
+    job_start = time.perf_counter()
+    try:
+        grid = read_input_from_file(input_path)
+        solution_cache = SolutionCache() if use_cache else None
+        if solution_cache is not None:
+            start_time = time.perf_counter()
+            cached = solution_cache.get(grid)
+            if cached is not None:
+                # Đề (hoặc bản xoay / lật của nó) đã được giải: bỏ qua mã hóa và giải
+                edges, cached_by = cached
+                conn.send({
+                    "status": "solved",
+                    "time_ms": (time.perf_counter() - start_time) * 1000,
+                    "cached": True,
+                    "size": f"{len(grid)}x{len(grid[0])}",
+                    "lines": [f"=== Cached solution ({cached_by}) ==="] + edges_to_text(grid, edges) + [""],
+                    "bridges": edges,
+                })
+                return
+
+        hashi_cnf = load_or_encode(grid, deduce=deduce)
+        name, solver_cls, solver_input = solver_entries(
+            grid, hashi_cnf, jobs=solver_jobs, preprocess=preprocess, heuristic=heuristic
+        )[solver_key]
+        profile_path = _profile_path(profile_dir, input_path, solver_key) if profile_dir else None
+        solver, solution, duration_ms, mem_used_mb = measure_solver(
+            solver_cls, solver_input, profile_path,
+            memory_deadline=job_start + MEMORY_RUN_SHARE * timeout if timeout else None,
+        )
+        lines = format_result(name, solver, solution, duration_ms, mem_used_mb, grid, hashi_cnf)
+        bridges = solution_edge_list(solution, hashi_cnf.hash) if solution else None
+        if solution_cache is not None and bridges:
+            solution_cache.put(grid, bridges, solver_key)
+        conn.send({
+            "status": "solved" if solution else "no_solution",
+            "time_ms": duration_ms,
+            "memory_mb": mem_used_mb,
+            "refinements": getattr(solver, "refinements", None),
+            # Backend thắng trong chế độ portfolio, kèm kích thước để thống kê theo cỡ đề
+            "winner": getattr(solver, "winner", None),
+            "size": f"{len(grid)}x{len(grid[0])}",
+            # Số biến cầu đã được suy luận trước (0 nếu không bật --deduce)
+            "deduced_vars": len(hashi_cnf.fixed),
+            "cached": False,
+            # Bộ đếm của solver (nút, quyết định, xung đột, ...), xem instrumentation.py
+            "stats": solver_stats(solver),
+            "lines": lines,
+            "bridges": bridges,
+        })
+    except Exception:
+        conn.send({"status": "error", "error": traceback.format_exc(), "lines": []})
+    finally:
+        conn.close()
+
+
+def run_batch(inputs, solver_keys, jobs, timeout, results_path, output_folder="Outputs", preprocess=False,
+              deduce=False, use_cache=False, profile_dir=None, heuristic=None):
+    """
+    Lập lịch các cặp (đề, solver) lên tối đa 'jobs' tiến trình cùng lúc.
+    Tiến trình nào chạy quá 'timeout' giây bị dừng cưỡng bức cùng mọi tiến trình con của nó.
+    Nếu có 'profile_dir', mỗi lần giải được chạy dưới cProfile và ghi ra một file .prof.
+    Trả về danh sách các bản ghi kết quả theo thứ tự hoàn thành.
+    """
+    pending = [(path, key) for path in inputs for key in solver_keys]
+    pending.reverse()
+    running = {}
+    # Các dòng kết quả của từng đề, ghi ra file khi mọi solver của đề đó đã xong
+    per_input = {path: {} for path in inputs}
+    records = []
+
+    # Khi batch đã chạy song song, Brute Force và cube-and-conquer chỉ dùng một tiến trình;
+    # với --jobs 1 chúng được dùng mọi CPU
+    solver_jobs = 1 if jobs > 1 else None
+
+    results_dir = os.path.dirname(results_path)
+    if results_dir and not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+    if profile_dir and not os.path.exists(profile_dir):
+        os.makedirs(profile_dir)
+
+    with open(results_path, "a", encoding="utf-8") as results_file:
+
+        def finish(path, key, result):
+            record = {"input": path, "solver": key}
+            record.update({k: v for k, v in result.items() if k not in ("lines", "bridges")})
+            results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results_file.flush()
+            records.append(record)
+            print(f"[{record['status']}] {path} ({key})")
+
+            per_input[path][key] = result
+            if len(per_input[path]) == len(solver_keys):
+                output_lines = (line for solver_key in solver_keys for line in per_input[path][solver_key]["lines"])
+                write_output_to_file(path, output_lines, output_folder)
+                solutions = {solver_key: per_input[path][solver_key].get("bridges") for solver_key in solver_keys}
+                data = solution_to_json(read_input_from_file(path), solutions)
+                write_json_output(path, data, output_folder)
+
+        try:
+            while pending or running:
+                while pending and len(running) < jobs:
+                    path, key = pending.pop()
+                    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+                    process = multiprocessing.Process(
+                        target=_solve_job,
+                        args=(child_conn, path, key, preprocess, deduce, use_cache, profile_dir, heuristic, solver_jobs,
+                              timeout),
+                    )
+                    process.start()
+                    child_conn.close()
+                    running[parent_conn] = (process, path, key, time.monotonic() + timeout)
+
+                now = time.monotonic()
+                next_deadline = min(deadline for _, _, _, deadline in running.values())
+                ready = wait(list(running), timeout=max(0.0, next_deadline - now))
+
+                for conn in ready:
+                    process, path, key, _ = running.pop(conn)
+                    try:
+                        result = conn.recv()
+                    except EOFError:
+                        result = {"status": "error", "error": f"exit code {process.exitcode}", "lines": []}
+                    conn.close()
+                    process.join()
+                    if result["status"] == "error":
+                        result["lines"] = [f"Lỗi ({key}): {result['error'].strip().splitlines()[-1]}\n"]
+                    finish(path, key, result)
+
+                now = time.monotonic()
+                for conn in [c for c, (_, _, _, deadline) in running.items() if deadline <= now]:
+                    process, path, key, _ = running.pop(conn)
+                    kill_process_group(process)
+                    conn.close()
+                    finish(path, key, {
+                        "status": "timeout",
+                        "time_ms": timeout * 1000,
+                        "lines": [f"Hết thời gian ({key}) sau {timeout} s.\n"],
+                    })
+        finally:
+            # Ctrl-C hoặc lỗi khi ghi kết quả: các job nằm trong nhóm tiến trình riêng nên
+            # không nhận được SIGINT từ terminal, phải dừng hết (cả tiến trình cháu) ở đây
+            for conn, (process, _, _, _) in running.items():
+                kill_process_group(process)
+                conn.close()
+
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Giải hàng loạt đề Hashiwokakero không cần tương tác.")
+    parser.add_argument("inputs", nargs="+", help="Thư mục hoặc file đề bài (.txt)")
+    parser.add_argument("--solver", default="pysat",
+                        help=f"Danh sách solver, phân tách bằng dấu phẩy: {','.join(SOLVER_NAMES)}")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Số tiến trình chạy song song")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="Thời gian tối đa (giây) cho mỗi lần giải một đề")
+    parser.add_argument("--results", default=os.path.join("Outputs", "batch-results.jsonl"),
+                        help="File JSONL nhận kết quả")
+    parser.add_argument("--output-dir", default="Outputs",
+                        help="Thư mục ghi lời giải dạng lưới")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Tiền xử lý CNF (lan truyền, subsumption, khử biến) trước khi giải")
+    parser.add_argument("--deduce", action="store_true",
+                        help="Suy luận các cầu bị ép buộc trên lưới trước khi mã hóa")
+    parser.add_argument("--solution-cache", action="store_true",
+                        help="Dùng cache lời giải (bất biến khi xoay / lật lưới) trước mọi solver")
+    parser.add_argument("--profile", metavar="DIR", default=None,
+                        help="Chạy mỗi lần giải dưới cProfile và ghi file .prof vào thư mục này")
+    parser.add_argument("--heuristic", choices=HEURISTICS, default=None,
+                        help="Heuristic chọn biến cho A*, Backtracking và CDCL (mặc định: của từng solver)")
+    args = parser.parse_args(argv)
+
+    solver_keys = [key.strip() for key in args.solver.split(",") if key.strip()]
+    unknown = [key for key in solver_keys if key not in SOLVER_NAMES]
+    if unknown:
+        parser.error(f"Solver không hợp lệ: {', '.join(unknown)}")
+
+    inputs = list_inputs(args.inputs)
+    if not inputs:
+        print("Không tìm thấy file .txt nào.")
+        return
+
+    run_batch(inputs, solver_keys, max(1, args.jobs), args.timeout, args.results, args.output_dir,
+              args.preprocess, args.deduce, args.solution_cache, args.profile, args.heuristic)
+    print(f"Kết quả đã được ghi vào {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+Đo hiệu năng các solver một cách lặp lại được.
+
+    python benchmark.py run Inputs/ --solver astar,pysat,backtracking,bruteforce \
+        --warmup 1 --repeat 5 --output Outputs/baseline.json
+    python benchmark.py compare Outputs/baseline.json Outputs/current.json --threshold 0.10
+    python benchmark.py encodings Inputs/ --encoding seqcounter,table,totalizer,auto,native
+    python benchmark.py heuristics Inputs/ --solver astar,backtracking,cdcl --heuristic freq,bridge,vsids,domwdeg
+
+Mỗi cặp (đề, solver) được đo trong một tiến trình riêng (nhóm tiến trình riêng, bị dừng
+cả nhóm khi hết giờ) và chỉ dùng một tiến trình giải (jobs=1) để thời gian so sánh được:
+  - thời gian mã hóa CNF, khởi tạo solver và giải được đo riêng bằng perf_counter_ns,
+    sau 'warmup' lần chạy bỏ đi và 'repeat' lần chạy tính median / p95;
+  - bộ nhớ đỉnh đo bằng tracemalloc ở một lần chạy riêng để không làm sai lệch thời gian.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from batch import SOLVER_NAMES, kill_process_group, list_inputs, start_process_group
+from deduction import encode_deduced
+from hashiwokakero_cnf import HashiwokakeroCNF, CARD_ENCODINGS
+from heuristics import HEURISTICS
+from main import solver_entries, uses_subprocesses
+from pysat_solver import PySATSolver
+from utils import read_input_from_file
+
+DEFAULT_SOLVERS = ["astar", "pysat", "backtracking", "bruteforce"]
+# Các solver nhận tham số heuristic (xem heuristics.py)
+HEURISTIC_SOLVERS = ["astar", "backtracking", "cdcl"]
+
+
+def percentile(values, pct):
+    """Phân vị theo phương pháp nearest-rank."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _run_once(grid, solver_key, preprocess=False, deduce=False):
+    """Một lần chạy đầy đủ; trả về (encode_ns, setup_ns, solve_ns, solution)."""
+    t0 = time.perf_counter_ns()
+    hashi_cnf = encode_deduced(grid) if deduce else HashiwokakeroCNF(grid)
+    t1 = time.perf_counter_ns()
+    _, solver_cls, solver_input = solver_entries(grid, hashi_cnf, jobs=1, preprocess=preprocess)[solver_key]
+    solver = solver_cls(solver_input)
+    t2 = time.perf_counter_ns()
+    solution = solver.solve()
+    t3 = time.perf_counter_ns()
+    if isinstance(solution, tuple):
+        solution = solution[0]
+    return t1 - t0, t2 - t1, t3 - t2, solution
+
+
+def _peak_memory(grid, solver_key, preprocess=False, deduce=False):
+    """
+    Bộ nhớ đỉnh (byte) khi mã hóa và khi khởi tạo + giải, đo riêng bằng tracemalloc.
+    Bộ nhớ giải là None (không đo) với solver giải trong tiến trình con, vì tracemalloc
+    chỉ thấy tiến trình hiện tại.
+    """
+    tracemalloc.start()
+    try:
+        hashi_cnf = encode_deduced(grid) if deduce else HashiwokakeroCNF(grid)
+        _, encode_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _, solver_cls, solver_input = solver_entries(grid, hashi_cnf, jobs=1, preprocess=preprocess)[solver_key]
+        solver = solver_cls(solver_input)
+        if uses_subprocesses(solver):
+            return encode_peak, None
+        solver.solve()
+        _, solve_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return encode_peak, solve_peak
+
+
+def measure(input_path, solver_key, warmup, repeat, preprocess=False, deduce=False):
+    grid = read_input_from_file(input_path)
+    for _ in range(warmup):
+        _run_once(grid, solver_key, preprocess, deduce)
+
+    encode, setup, solve, total = [], [], [], []
+    solution = None
+    for _ in range(repeat):
+        encode_ns, setup_ns, solve_ns, solution = _run_once(grid, solver_key, preprocess, deduce)
+        encode.append(encode_ns / 1e6)
+        setup.append(setup_ns / 1e6)
+        solve.append(solve_ns / 1e6)
+        total.append((setup_ns + solve_ns) / 1e6)
+
+    encode_peak, solve_peak = _peak_memory(grid, solver_key, preprocess, deduce)
+    return {
+        "status": "solved" if solution else "no_solution",
+        "repeat": repeat,
+        "encode_ms_median": statistics.median(encode),
+        "setup_ms_median": statistics.median(setup),
+        "solve_ms_median": statistics.median(solve),
+        "solve_ms_p95": percentile(solve, 95),
+        "total_ms_median": statistics.median(total),
+        "total_ms_p95": percentile(total, 95),
+        "encode_peak_mb": encode_peak / (1024 * 1024),
+        "solve_peak_mb": solve_peak / (1024 * 1024) if solve_peak is not None else None,
+    }
+
+
+def _measure_job(conn, input_path, solver_key, warmup, repeat, preprocess=False, deduce=False):
+    start_process_group()
+    try:
+        conn.send(measure(input_path, solver_key, warmup, repeat, preprocess, deduce))
+    except Exception as exc:
+        conn.send({"status": "error", "error": repr(exc)})
+    finally:
+        conn.close()
+
+
+def run_benchmarks(inputs, solver_keys, warmup, repeat, timeout, preprocess=False, deduce=False):
+    """
+    Đo lần lượt từng cặp (đề, solver) trong tiến trình riêng (không chạy song song
+    để tránh nhiễu). Cặp nào vượt 'timeout' giây bị dừng và ghi nhận là timeout.
+    """
+    results = {}
+    for path in inputs:
+        for key in solver_keys:
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_measure_job, args=(child_conn, path, key, warmup, repeat, preprocess, deduce)
+            )
+            process.start()
+            child_conn.close()
+            if parent_conn.poll(timeout):
+                try:
+                    result = parent_conn.recv()
+                except EOFError:
+                    result = {"status": "error", "error": f"exit code {process.exitcode}"}
+            else:
+                kill_process_group(process)
+                result = {"status": "timeout"}
+            process.join()
+            parent_conn.close()
+
+            results[f"{os.path.basename(path)}|{key}"] = result
+            if "solve_ms_median" in result:
+                peak = result["solve_peak_mb"]
+                print(f"{path} ({key}): solve median {result['solve_ms_median']:.3f} ms, "
+                      f"p95 {result['solve_ms_p95']:.3f} ms, "
+                      f"peak {'không đo' if peak is None else f'{peak:.3f} MB'}")
+            else:
+                print(f"{path} ({key}): {result['status']}")
+    return results
+
+
+def compare(baseline, current, threshold, min_ms=0.05):
+    """
+    So sánh hai file kết quả. Một cặp bị coi là chậm đi (regression) nếu median
+    hoặc p95 thời gian giải, hoặc bộ nhớ đỉnh, tăng quá 'threshold' (tỉ lệ) và
+    chênh lệch thời gian lớn hơn 'min_ms' (để bỏ qua nhiễu ở các phép đo rất nhỏ).
+    Trả về danh sách các dòng mô tả regression.
+    """
+    regressions = []
+    for key, old in baseline["results"].items():
+        new = current["results"].get(key)
+        if new is None:
+            continue
+        if old.get("status") in ("solved", "no_solution") and new.get("status") not in ("solved", "no_solution"):
+            regressions.append(f"{key}: {old['status']} -> {new['status']}")
+            continue
+        if "solve_ms_median" not in old or "solve_ms_median" not in new:
+            continue
+
+        for metric in ("solve_ms_median", "solve_ms_p95"):
+            before, after = old[metric], new[metric]
+            if after - before > min_ms and after > before * (1 + threshold):
+                regressions.append(f"{key}: {metric} {before:.3f} -> {after:.3f} ms")
+        before, after = old.get("solve_peak_mb"), new.get("solve_peak_mb")
+        if before is None or after is None:
+            # Bộ nhớ không đo được (solver giải trong tiến trình con)
+            continue
+        if after > before * (1 + threshold) and after - before > 0.01:
+            regressions.append(f"{key}: solve_peak_mb {before:.3f} -> {after:.3f} MB")
+    return regressions
+
+
+def benchmark_encodings(inputs, encodings, repeat):
+    """
+    So sánh các cách mã hóa cardinality: số biến, số mệnh đề, thời gian mã hóa
+    và thời gian giải bằng PySATSolver (chế độ liên thông; "native" dùng Minicard).
+    """
+    results = {}
+    for path in inputs:
+        grid = read_input_from_file(path)
+        for encoding in encodings:
+            encode, solve = [], []
+            for _ in range(repeat):
+                t0 = time.perf_counter_ns()
+                hashi_cnf = HashiwokakeroCNF(grid, encoding)
+                t1 = time.perf_counter_ns()
+                solution = PySATSolver(hashi_cnf.get_cnf(), hashi_cnf=hashi_cnf).solve()
+                t2 = time.perf_counter_ns()
+                encode.append((t1 - t0) / 1e6)
+                solve.append((t2 - t1) / 1e6)
+            result = {
+                "status": "solved" if solution else "no_solution",
+                "variables": hashi_cnf.id - 1,
+                "clauses": len(hashi_cnf.get_cnf()),
+                "native_constraints": len(hashi_cnf.cardinality_constraints()) if encoding == "native" else 0,
+                "encode_ms_median": statistics.median(encode),
+                "solve_ms_median": statistics.median(solve),
+            }
+            results[f"{os.path.basename(path)}|{encoding}"] = result
+            print(f"{os.path.basename(path):<16} {encoding:<12} vars {result['variables']:>7} "
+                  f"clauses {result['clauses']:>7} encode {result['encode_ms_median']:>9.3f} ms "
+                  f"solve {result['solve_ms_median']:>9.3f} ms")
+    return results
+
+
+def measure_heuristic(input_path, solver_key, heuristic, repeat):
+    """
+    Giải một đề 'repeat' lần với một heuristic; trả về số nút (nodes với A*,
+    decisions với các solver khác), median thời gian giải và thời gian trung bình mỗi nút.
+    """
+    grid = read_input_from_file(input_path)
+    hashi_cnf = HashiwokakeroCNF(grid)
+    _, solver_cls, solver_input = solver_entries(grid, hashi_cnf, jobs=1, heuristic=heuristic)[solver_key]
+    solve = []
+    for _ in range(repeat):
+        solver = solver_cls(solver_input)
+        t0 = time.perf_counter_ns()
+        solution = solver.solve()
+        solve.append((time.perf_counter_ns() - t0) / 1e6)
+    stats = solver.get_stats()
+    nodes = stats.get("nodes", stats.get("decisions", 0))
+    solve_ms = statistics.median(solve)
+    return {
+        "status": "solved" if solution else "no_solution",
+        "nodes": nodes,
+        "conflicts": stats.get("conflicts", 0),
+        "solve_ms_median": solve_ms,
+        "us_per_node": solve_ms * 1000 / nodes if nodes else 0.0,
+    }
+
+
+def _measure_heuristic_job(conn, input_path, solver_key, heuristic, repeat):
+    start_process_group()
+    try:
+        conn.send(measure_heuristic(input_path, solver_key, heuristic, repeat))
+    except Exception as exc:
+        conn.send({"status": "error", "error": repr(exc)})
+    finally:
+        conn.close()
+
+
+def benchmark_heuristics(inputs, solver_keys, heuristics, repeat, timeout):
+    """So sánh các heuristic chọn biến: số nút, thời gian giải và thời gian mỗi nút."""
+    results = {}
+    for path in inputs:
+        for key in solver_keys:
+            for heuristic in heuristics:
+                parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=_measure_heuristic_job, args=(child_conn, path, key, heuristic, repeat)
+                )
+                process.start()
+                child_conn.close()
+                if parent_conn.poll(timeout):
+                    try:
+                        result = parent_conn.recv()
+                    except EOFError:
+                        result = {"status": "error", "error": f"exit code {process.exitcode}"}
+                else:
+                    kill_process_group(process)
+                    result = {"status": "timeout"}
+                process.join()
+                parent_conn.close()
+
+                results[f"{os.path.basename(path)}|{key}|{heuristic}"] = result
+                if "nodes" in result:
+                    print(f"{os.path.basename(path):<16} {key:<13} {heuristic:<8} nodes {result['nodes']:>9} "
+                          f"solve {result['solve_ms_median']:>10.3f} ms  {result['us_per_node']:>8.2f} us/node")
+                else:
+                    print(f"{os.path.basename(path):<16} {key:<13} {heuristic:<8} {result['status']}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark các solver Hashiwokakero.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Chạy benchmark và lưu kết quả JSON")
+    run_parser.add_argument("inputs", nargs="+", help="Thư mục hoặc file đề bài (.txt)")
+    run_parser.add_argument("--solver", default=",".join(DEFAULT_SOLVERS),
+                            help=f"Danh sách solver: {','.join(SOLVER_NAMES)}")
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--timeout", type=float, default=60.0,
+                            help="Thời gian tối đa (giây) cho mỗi cặp đề/solver, gồm cả warmup")
+    run_parser.add_argument("--output", default=os.path.join("Outputs", "benchmark.json"))
+    run_parser.add_argument("--preprocess", action="store_true",
+                            help="Tiền xử lý CNF trước khi giải (thời gian tiền xử lý tính vào setup)")
+    run_parser.add_argument("--deduce", action="store_true",
+                            help="Suy luận các cầu bị ép buộc trước khi mã hóa (tính vào thời gian mã hóa)")
+
+    compare_parser = sub.add_parser("compare", help="So sánh với baseline và báo regression")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Tỉ lệ tăng tối đa cho phép (0.10 = 10%%)")
+    compare_parser.add_argument("--min-ms", type=float, default=0.05)
+
+    encodings_parser = sub.add_parser("encodings", help="So sánh các cách mã hóa cardinality")
+    encodings_parser.add_argument("inputs", nargs="+", help="Thư mục hoặc file đề bài (.txt)")
+    encodings_parser.add_argument("--encoding", default="seqcounter,table,totalizer,auto,native",
+                                  help=f"Danh sách cách mã hóa: {','.join(CARD_ENCODINGS)}")
+    encodings_parser.add_argument("--repeat", type=int, default=5)
+    encodings_parser.add_argument("--output", default=None, help="File JSON lưu kết quả (tùy chọn)")
+
+    heuristics_parser = sub.add_parser("heuristics", help="So sánh các heuristic chọn biến")
+    heuristics_parser.add_argument("inputs", nargs="+", help="Thư mục hoặc file đề bài (.txt)")
+    heuristics_parser.add_argument("--solver", default=",".join(HEURISTIC_SOLVERS),
+                                   help=f"Danh sách solver: {','.join(HEURISTIC_SOLVERS)}")
+    heuristics_parser.add_argument("--heuristic", default=",".join(HEURISTICS),
+                                   help=f"Danh sách heuristic: {','.join(HEURISTICS)}")
+    heuristics_parser.add_argument("--repeat", type=int, default=3)
+    heuristics_parser.add_argument("--timeout", type=float, default=60.0,
+                                   help="Thời gian tối đa (giây) cho mỗi bộ (đề, solver, heuristic)")
+    heuristics_parser.add_argument("--output", default=None, help="File JSON lưu kết quả (tùy chọn)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "heuristics":
+        solver_keys = [key.strip() for key in args.solver.split(",") if key.strip()]
+        heuristics = [h.strip() for h in args.heuristic.split(",") if h.strip()]
+        unknown = [key for key in solver_keys if key not in HEURISTIC_SOLVERS]
+        unknown += [h for h in heuristics if h not in HEURISTICS]
+        if unknown:
+            parser.error(f"Solver / heuristic không hợp lệ: {', '.join(unknown)}")
+        results = benchmark_heuristics(list_inputs(args.inputs), solver_keys, heuristics,
+                                       max(1, args.repeat), args.timeout)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"results": results}, f, indent=2)
+        return 0
+
+    if args.command == "encodings":
+        encodings = [e.strip() for e in args.encoding.split(",") if e.strip()]
+        unknown = [e for e in encodings if e not in CARD_ENCODINGS]
+        if unknown:
+            parser.error(f"Cách mã hóa không hợp lệ: {', '.join(unknown)}")
+        results = benchmark_encodings(list_inputs(args.inputs), encodings, max(1, args.repeat))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"results": results}, f, indent=2)
+        return 0
+
+    if args.command == "run":
+        solver_keys = [key.strip() for key in args.solver.split(",") if key.strip()]
+        unknown = [key for key in solver_keys if key not in SOLVER_NAMES]
+        if unknown:
+            parser.error(f"Solver không hợp lệ: {', '.join(unknown)}")
+
+        results = run_benchmarks(list_inputs(args.inputs), solver_keys,
+                                 args.warmup, max(1, args.repeat), args.timeout, args.preprocess, args.deduce)
+        data = {
+            "meta": {
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "warmup": args.warmup,
+                "repeat": args.repeat,
+                "preprocess": args.preprocess,
+                "deduce": args.deduce,
+            },
+            "results": results,
+        }
+        output_dir = os.path.dirname(args.output)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print(f"Đã ghi kết quả benchmark vào {args.output}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold, args.min_ms)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("Không có regression nào vượt ngưỡng.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
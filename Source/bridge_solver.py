@@ -0,0 +1,227 @@
+from instrumentation import Instrumented
+
+
+class BridgeSolver(Instrumented):
+    """
+    Bộ giải lan truyền ràng buộc làm việc trực tiếp trên các đảo thay vì CNF.
+    Mỗi cầu ứng viên là một biến miền {0, 1, 2}, được lưu dưới dạng khoảng
+    [lo, hi]. Mọi thay đổi miền được ghi vào trail để hoàn tác khi quay lui.
+
+    Biến X1/X2 được đánh số giống hệt HashiwokakeroCNF nên lời giải trả về
+    có cùng định dạng với các bộ giải CNF và hiển thị được bằng solution_to_text.
+    """
+
+    STATS = ("nodes", "decisions", "propagations", "conflicts", "max_frontier")
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.reset_stats()
+        self.islands = []
+        self.island_index = {}
+        self.hash = {}
+        self.neighbors = {}
+
+        self.bridges = []      # (đảo a, đảo b) theo chỉ số đảo
+        self.bridge_var = []   # id của biến X1 tương ứng (X2 = X1 + 1)
+        self.incident = []     # các cầu nối với từng đảo
+        self.crossing = []     # các cầu cắt ngang với từng cầu
+        self.demand = []
+        self.lo = []
+        self.hi = []
+        self.trail = []
+
+        self._build_bridges()
+        self._build_crossings()
+
+    def _build_bridges(self):
+        directions = [(-1, 0), (1, 0), (0, 1), (0, -1)]
+        rows, cols = len(self.grid), len(self.grid[0])
+
+        for i in range(rows):
+            for j in range(cols):
+                if self.grid[i][j] > 0:
+                    self.island_index[(i, j)] = len(self.islands)
+                    self.islands.append((i, j))
+                    self.demand.append(self.grid[i][j])
+                    self.incident.append([])
+                    self.neighbors[(i, j)] = []
+
+        var_id = 1
+        for i, j in self.islands:
+            for dx, dy in directions:
+                nx, ny = i + dx, j + dy
+                while 0 <= nx < rows and 0 <= ny < cols:
+                    if self.grid[nx][ny] > 0:
+                        if ("X1", (i, j), (nx, ny)) not in self.hash:
+                            self.hash[("X1", (i, j), (nx, ny))] = self.hash[("X1", (nx, ny), (i, j))] = var_id
+                            self.hash[("X2", (i, j), (nx, ny))] = self.hash[("X2", (nx, ny), (i, j))] = var_id + 1
+                            self.neighbors[(i, j)].append((nx, ny))
+
+                            a = self.island_index[(i, j)]
+                            b = self.island_index[(nx, ny)]
+                            e = len(self.bridges)
+                            self.bridges.append((a, b))
+                            self.bridge_var.append(var_id)
+                            self.incident[a].append(e)
+                            self.incident[b].append(e)
+
+                            # Giống Constraint 3 của bộ mã hóa: đảo sát nhau thì không nối cầu
+                            if abs(nx - i) + abs(ny - j) == 1:
+                                self.hi.append(0)
+                            else:
+                                self.hi.append(min(2, self.grid[i][j], self.grid[nx][ny]))
+                            self.lo.append(0)
+                            var_id += 2
+                        break
+                    nx += dx
+                    ny += dy
+
+    def _build_crossings(self):
+        horizontal, vertical = [], []
+        for e, (a, b) in enumerate(self.bridges):
+            (r1, c1), (r2, c2) = self.islands[a], self.islands[b]
+            if r1 == r2:
+                horizontal.append((e, r1, min(c1, c2), max(c1, c2)))
+            else:
+                vertical.append((e, c1, min(r1, r2), max(r1, r2)))
+
+        self.crossing = [[] for _ in self.bridges]
+        for h, row, c_lo, c_hi in horizontal:
+            for v, col, r_lo, r_hi in vertical:
+                if r_lo < row < r_hi and c_lo < col < c_hi:
+                    self.crossing[h].append(v)
+                    self.crossing[v].append(h)
+
+    def set_bounds(self, e, new_lo, new_hi, queue):
+        """Thu hẹp miền của cầu e, ghi trail và đưa các đảo bị ảnh hưởng vào hàng đợi."""
+        old_lo, old_hi = self.lo[e], self.hi[e]
+        new_lo, new_hi = max(old_lo, new_lo), min(old_hi, new_hi)
+        if new_lo > new_hi:
+            return False
+        if new_lo == old_lo and new_hi == old_hi:
+            return True
+
+        self.trail.append((e, old_lo, old_hi))
+        self.propagations += 1
+        self.lo[e], self.hi[e] = new_lo, new_hi
+        queue.extend(self.bridges[e])
+
+        # Cầu chắc chắn được xây thì mọi cầu cắt ngang nó phải bằng 0
+        if new_lo >= 1 and old_lo == 0:
+            for f in self.crossing[e]:
+                if not self.set_bounds(f, 0, 0, queue):
+                    return False
+        return True
+
+    def propagate(self, queue):
+        """
+        Lan truyền sức chứa của đảo đến điểm bất động:
+        lo_e >= demand - tổng hi các cầu còn lại, hi_e <= demand - tổng lo các cầu còn lại.
+        """
+        lo, hi = self.lo, self.hi
+        while queue:
+            island = queue.pop()
+            edges = self.incident[island]
+            demand = self.demand[island]
+            sum_lo = sum(lo[e] for e in edges)
+            sum_hi = sum(hi[e] for e in edges)
+            if sum_lo > demand or sum_hi < demand:
+                return False
+            for e in edges:
+                if lo[e] == hi[e]:
+                    continue
+                if not self.set_bounds(e, demand - (sum_hi - hi[e]), demand - (sum_lo - lo[e]), queue):
+                    return False
+                sum_lo = sum(lo[e] for e in edges)
+                sum_hi = sum(hi[e] for e in edges)
+        return True
+
+    def undo(self, mark):
+        lo, hi = self.lo, self.hi
+        while len(self.trail) > mark:
+            e, old_lo, old_hi = self.trail.pop()
+            lo[e], hi[e] = old_lo, old_hi
+
+    def is_connectable(self):
+        """Các cầu còn có thể xây (hi >= 1) phải nối được tất cả các đảo."""
+        if not self.islands:
+            return True
+        parent = list(range(len(self.islands)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        components = len(self.islands)
+        for e, (a, b) in enumerate(self.bridges):
+            if self.hi[e] >= 1:
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[ra] = rb
+                    components -= 1
+        return components == 1
+
+    def select_bridge(self):
+        # Chọn cầu chưa cố định thuộc đảo có ít cầu tự do nhất
+        best, best_score = None, None
+        for island, edges in enumerate(self.incident):
+            free = [e for e in edges if self.lo[e] != self.hi[e]]
+            if free and (best_score is None or len(free) < best_score):
+                best, best_score = free[0], len(free)
+                if best_score == 1:
+                    break
+        return best
+
+    def solve(self):
+        if not self.propagate(list(range(len(self.islands)))):
+            return None
+        if self.search():
+            return self._format_solution()
+        return None
+
+    def search(self):
+        # Ngăn xếp tường minh thay cho đệ quy để không chạm giới hạn đệ quy trên lưới lớn.
+        # Mỗi phần tử: (cầu, các giá trị còn phải thử, vị trí trail trước khi gán)
+        stack = []
+        descend = True
+        while True:
+            if descend:
+                if not self.is_connectable():
+                    self.conflicts += 1
+                    descend = False
+                    continue
+                e = self.select_bridge()
+                if e is None:
+                    return True
+                self.nodes += 1
+                if self.progress_callback is not None and self.nodes % self.progress_interval == 0:
+                    self._report_progress()
+                stack.append((e, list(range(self.lo[e], self.hi[e] + 1)), len(self.trail)))
+                if len(stack) > self.max_frontier:
+                    self.max_frontier = len(stack)
+
+            if not stack:
+                return False
+            e, values, mark = stack[-1]
+            self.undo(mark)
+            if not values:
+                stack.pop()
+                descend = False
+                continue
+
+            # Thử giá trị lớn trước
+            value = values.pop()
+            queue = []
+            self.decisions += 1
+            descend = self.set_bounds(e, value, value, queue) and self.propagate(queue)
+            if not descend:
+                self.conflicts += 1
+
+    def _format_solution(self):
+        solution = []
+        for e, var in enumerate(self.bridge_var):
+            solution.append(var if self.lo[e] >= 1 else -var)
+            solution.append(var + 1 if self.lo[e] == 2 else -(var + 1))
+        return solution
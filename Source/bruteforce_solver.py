@@ -1,61 +1,255 @@
+import os
 import time
-import itertools
-from collections import defaultdict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from compact_cnf import as_compact
 from hashiwokakero_cnf import HashiwokakeroCNF
+from instrumentation import Instrumented
+
+# Mỗi khối gồm 2^BLOCK_BITS phép gán, được đánh giá cùng lúc bằng NumPy
+BLOCK_BITS = 16
+TIMEOUT = "timeout"
+CANCELLED = "cancelled"
+
+_worker_tables = None
+_worker_stop = None
+
+
+def _init_worker(tables, stop_shard):
+    global _worker_tables, _worker_stop
+    _worker_tables = tables
+    _worker_stop = stop_shard
+
+
+def _worker_search(shard, start_block, end_block, total, deadline):
+    # Dừng khi một đoạn đứng trước (chỉ số nhỏ hơn) đã tìm được mô hình
+    return _search_blocks(_worker_tables, start_block, end_block, total, deadline,
+                          cancelled=lambda: _worker_stop.value < shard)
+
+
+def _search_blocks(tables, start_block, end_block, total, deadline, cancelled=None, progress=None):
+    """
+    Duyệt các khối [start_block, end_block). Trong khối thứ h, các biến "cao"
+    cố định theo các bit của h, còn k biến "thấp" chạy qua mọi tổ hợp và được
+    biểu diễn bit-sliced: mỗi bit của một từ uint64 là một phép gán.
+
+    Trả về chỉ số (theo thứ tự itertools.product) của phép gán thỏa mãn đầu tiên
+    trong khoảng, None nếu không có, CANCELLED nếu 'cancelled()' trả về True,
+    TIMEOUT nếu hết thời gian.
+    'progress(h)' (nếu có) được gọi mỗi 64 khối với chỉ số khối đang duyệt.
+    """
+    block_bits, patterns, clauses = tables
+    block_size = 1 << block_bits
+    words = patterns.shape[1]
+
+    for h in range(start_block, end_block):
+        if (h - start_block) % 64 == 0:
+            if time.time() > deadline:
+                return TIMEOUT
+            if cancelled is not None and cancelled():
+                return CANCELLED
+            if progress is not None:
+                progress(h)
+
+        acc = None
+        for pos_high, neg_high, low_rows in clauses:
+            # Mệnh đề đã thỏa mãn nhờ các biến cao cố định của khối
+            if (pos_high & h) or (neg_high & ~h):
+                continue
+            if low_rows is None:
+                acc = False
+                break
+            sat = np.bitwise_or.reduce(patterns[low_rows], axis=0)
+            acc = sat if acc is None else acc & sat
+            if not acc.any():
+                acc = False
+                break
+
+        if acc is False:
+            continue
+        if acc is None:
+            acc = np.full(words, np.uint64(0xFFFFFFFFFFFFFFFF))
+
+        # Bỏ các phép gán vượt quá giới hạn (khối cuối hoặc khối nhỏ hơn 64 bit)
+        valid = min(block_size, total - h * block_size)
+        if valid < words * 64:
+            acc = acc.copy()
+            full, rest = divmod(valid, 64)
+            if full < words:
+                acc[full] &= np.uint64((1 << rest) - 1)
+                acc[full + 1:] = 0
+
+        nonzero = np.flatnonzero(acc)
+        if nonzero.size:
+            w = int(nonzero[0])
+            word = int(acc[w])
+            bit = (word & -word).bit_length() - 1
+            return h * block_size + w * 64 + bit
+    return None
+
+
+class BruteForceSolver(Instrumented):
+    STATS = ("attempts",)
+
+    def __init__(self, cnf, jobs=None, block_bits=BLOCK_BITS):
+        self.cnf = as_compact(cnf)
+        self.reset_stats()
+        self.variables = list(self.cnf.variables)
+
+        self.jobs = jobs or os.cpu_count() or 1
+        self.block_bits = min(block_bits, len(self.variables))
+        self.tables = self._compile()
+
+    def _compile(self):
+        """
+        Chuyển CNF sang dạng mặt nạ bit. Phép gán thứ t của itertools.product
+        gán cho biến self.variables[i] bit thứ (n - 1 - i) của t; k bit thấp
+        là các biến "thấp" chạy trong một khối, phần còn lại là chỉ số khối.
+
+        Mỗi mệnh đề gồm mặt nạ dương/âm trên các biến cao (số nguyên Python)
+        và chỉ số các hàng mẫu bit của literal thấp (None nếu không có).
+        """
+        n = len(self.variables)
+        k = self.block_bits
+        bit_of = {var: n - 1 - i for i, var in enumerate(self.variables)}
 
-class BruteForceSolver:
-    def __init__(self, cnf):
-        self.cnf = cnf
-        self.variables = sorted(set(abs(lit) for clause in self.cnf for lit in clause))
-        self.var_to_clauses = defaultdict(list)
-        for i, clause in enumerate(self.cnf):
+        positions = np.arange(1 << k, dtype=np.int64)
+        padded = max(64, 1 << k)
+        rows = []
+        for b in range(k):
+            bits = np.zeros(padded, dtype=np.uint8)
+            bits[:1 << k] = (positions >> b) & 1
+            rows.append(np.packbits(bits, bitorder="little").view("<u8"))
+        # Hàng b là literal dương của biến thấp b, hàng k + b là literal âm
+        if k:
+            low = np.array(rows, dtype=np.uint64)
+            patterns = np.concatenate([low, ~low])
+        else:
+            patterns = np.zeros((0, 1), dtype=np.uint64)
+
+        high_only, mixed = [], []
+        # Mệnh đề ngắn trước; sắp xếp chỉ số thay vì sắp xếp CNF dùng chung của người gọi
+        for idx in sorted(range(len(self.cnf)), key=self.cnf.clause_len):
+            clause = self.cnf[idx]
+            if any(-lit in clause for lit in clause):
+                continue  # mệnh đề luôn đúng
+            pos_high = neg_high = 0
+            low_rows = []
             for lit in clause:
-                self.var_to_clauses[abs(lit)].append(i)
-        
-        self.cnf.sort(key=len)
+                b = bit_of[abs(lit)]
+                if b >= k:
+                    if lit > 0:
+                        pos_high |= 1 << (b - k)
+                    else:
+                        neg_high |= 1 << (b - k)
+                else:
+                    low_rows.append(b if lit > 0 else k + b)
+            if low_rows:
+                mixed.append((pos_high, neg_high, np.array(sorted(set(low_rows)))))
+            else:
+                high_only.append((pos_high, neg_high, None))
+
+        # Mệnh đề chỉ chứa biến cao được kiểm tra trước để loại cả khối với chi phí O(1)
+        return k, patterns, high_only + mixed
 
     def solve(self, max_attempts=None, max_time=300):
         start_time = time.time()
-        attempts = 0
+        deadline = start_time + max_time
         num_vars = len(self.variables)
         
         total_combinations = 2 ** num_vars
-        
-        chunk_size = min(100000, total_combinations)
-        
-        for values in itertools.product([0, 1], repeat=num_vars):
-            # Kiểm tra giới hạn thời gian
-            if time.time() - start_time > max_time:
-                return None, (time.time() - start_time) * 1000
-            
-            attempts += 1
-            if max_attempts and attempts > max_attempts:
-                return None, (time.time() - start_time) * 1000
-            
-            # Chuyển đổi assignment từ binary (0, 1) sang dạng phù hợp cho CNF
-            assignment = {var: val for var, val in zip(self.variables, values)}
-            
-            if self._is_satisfiable(assignment):
-                solution = self._format_solution(assignment)
-                return solution
-        
-        return None
+        total = min(total_combinations, max_attempts) if max_attempts else total_combinations
+        block_size = 1 << self.block_bits
+        num_blocks = -(-total // block_size)
 
-    def _is_satisfiable(self, assignment):
-        for clause in self.cnf:
-            if not self._clause_satisfied(clause, assignment):
-                return False
-        return True
-    
-    def _clause_satisfied(self, clause, assignment):
-        for lit in clause:
-            var = abs(lit)
-            val = assignment[var]
-            
-            # Kiểm tra nếu literal thỏa mãn
-            if (lit > 0 and val == 1) or (lit < 0 and val == 0):
-                return True
-        return False
+        if self.jobs <= 1 or num_blocks < 2 * self.jobs:
+            found = _search_blocks(self.tables, 0, num_blocks, total, deadline, progress=self._on_block)
+        else:
+            found = self._solve_parallel(num_blocks, total, deadline)
+
+        # Số phép gán đã thử theo thứ tự duyệt (khi hết giờ: số đã biết chắc là đã duyệt)
+        if found is None:
+            self.attempts = total
+        elif found != TIMEOUT:
+            self.attempts = found + 1
+
+        if found is None and total == total_combinations:
+            return None
+        if found is None or found == TIMEOUT:
+            return None, (time.time() - start_time) * 1000
+
+        # Chuyển đổi chỉ số phép gán sang dạng phù hợp cho CNF
+        assignment = {var: (found >> (num_vars - 1 - i)) & 1 for i, var in enumerate(self.variables)}
+        solution = self._format_solution(assignment)
+        return solution
+
+    def _on_block(self, h):
+        self.attempts = h << self.block_bits
+        if self.progress_callback is not None:
+            self._report_progress()
+
+    def _solve_parallel(self, num_blocks, total, deadline):
+        """
+        Chia không gian phép gán thành nhiều đoạn khối cho ProcessPoolExecutor.
+        Khi một worker tìm được mô hình, mọi đoạn phía sau nó bị hủy (đang chạy
+        thì dừng sớm qua biến chia sẻ 'stop_shard'); các đoạn phía trước vẫn chạy
+        tiếp để kết quả luôn là mô hình đầu tiên như khi duyệt tuần tự.
+
+        'stop_shard' lưu chỉ số đoạn (tối đa khoảng jobs * 16), không phải chỉ số khối:
+        số khối là 2^(số biến - k) và vượt quá int64 khi có nhiều biến.
+        Kết quả có cùng dạng với đường tuần tự: chỉ số phép gán, None hoặc TIMEOUT.
+        """
+        chunk = max(1, num_blocks // (self.jobs * 16))
+        shards = [(start, min(start + chunk, num_blocks)) for start in range(0, num_blocks, chunk)]
+        stop_shard = multiprocessing.Value("q", len(shards), lock=False)
+        block_size = 1 << self.block_bits
+        executor = ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=_init_worker,
+            initargs=(self.tables, stop_shard),
+        )
+        best = None
+        best_shard = None
+        incomplete = False  # có đoạn chưa duyệt hết (hết giờ hoặc bị hủy)
+        try:
+            shard_of = {
+                executor.submit(_worker_search, shard, start, end, total, deadline): shard
+                for shard, (start, end) in enumerate(shards)
+            }
+            pending = set(shard_of)
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.time()),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    incomplete = True
+                    break
+                for future in done:
+                    shard = shard_of[future]
+                    result = future.result()
+                    if result is None:
+                        start, end = shards[shard]
+                        self.attempts += (end - start) * block_size
+                    elif result in (TIMEOUT, CANCELLED):
+                        incomplete = True
+                    elif best is None or result < best:
+                        best, best_shard = result, shard
+                        stop_shard.value = shard
+                if best is not None:
+                    for future in [f for f in pending if shard_of[f] > best_shard]:
+                        future.cancel()
+                        pending.discard(future)
+                elif incomplete:
+                    break
+        finally:
+            stop_shard.value = -1
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if best is None and incomplete:
+            return TIMEOUT
+        return best
 
     def _format_solution(self, assignment):
         solution = []
@@ -65,24 +259,6 @@ class BruteForceSolver:
             else:
                 solution.append(-var)
         return solution
-    
-    def pre_process(self):
-        unit_clauses = [clause[0] for clause in self.cnf if len(clause) == 1]
-        
-        # Xác định biến chỉ xuất hiện dạng dương hoặc âm
-        pos_vars = set()
-        neg_vars = set()
-        
-        for var in self.variables:
-            pos_count = sum(1 for clause in self.cnf if var in clause)
-            neg_count = sum(1 for clause in self.cnf if -var in clause)
-            
-            if pos_count > 0 and neg_count == 0:
-                pos_vars.add(var)
-            elif neg_count > 0 and pos_count == 0:
-                neg_vars.add(var)
-        
-        return unit_clauses, pos_vars, neg_vars
 
 def main():
     grid = [
@@ -95,7 +271,6 @@ def main():
     cnf = hashi_cnf.get_cnf()
     
     solver = BruteForceSolver(cnf)
-    solver.pre_process()
     
     solution, duration = solver.solve()
     
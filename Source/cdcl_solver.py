@@ -0,0 +1,326 @@
+from collections import defaultdict
+
+from compact_cnf import as_compact
+from heuristics import make_heuristic
+from instrumentation import Instrumented
+
+class CDCLSolver(Instrumented):
+    """
+    Bộ giải CDCL thuần Python: lan truyền bằng 2 literal theo dõi,
+    phân tích xung đột 1-UIP, học mệnh đề, nhảy lùi không theo thứ tự
+    thời gian (backjumping), khởi động lại theo dãy Luby và xóa bớt
+    mệnh đề học được dựa trên độ hoạt động (activity).
+    """
+
+    STATS = ("decisions", "propagations", "conflicts", "restarts", "clauses_scanned")
+
+    def __init__(self, cnf, restart_base=100, max_learnts=None, heuristic="vsids", bridge_order=None):
+        """
+        'heuristic': cách chọn biến rẽ nhánh (xem heuristics.py), mặc định VSIDS: các
+        biến gặp trong phân tích xung đột được tăng điểm. 'bridge_order' là thứ tự
+        biến cầu cho heuristic "bridge".
+        """
+        self.cnf = as_compact(cnf)
+        self.reset_stats()
+        self.variables = list(self.cnf.variables)
+        num_vars = self.variables[-1] if self.variables else 0
+
+        self.value = [0] * (num_vars + 1)
+        self.level = [0] * (num_vars + 1)
+        self.reason = [None] * (num_vars + 1)
+        self.phase = [1] * (num_vars + 1)
+        self.seen = [False] * (num_vars + 1)
+
+        self.clauses = []
+        self.learnt = set()
+        self.clause_activity = {}
+        self.watches = defaultdict(list)
+        self.units = []
+        self.empty_clause = False
+
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+
+        self.heuristic = make_heuristic(heuristic, self.variables, self.value, self.cnf, bridge_order)
+        self.cla_inc = 1.0
+        self.cla_decay = 0.999
+
+        self.restart_base = restart_base
+        self.max_learnts = max_learnts or max(1000, len(self.cnf) // 3)
+        self._init_watches()
+
+    def _init_watches(self):
+        for clause in self.cnf:
+            clause = list(dict.fromkeys(clause))
+            if not clause:
+                self.empty_clause = True
+            elif len(clause) == 1:
+                self.units.append(clause[0])
+            else:
+                self._attach(clause)
+
+    def _attach(self, clause, learnt=False):
+        idx = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches[clause[0]].append(idx)
+        self.watches[clause[1]].append(idx)
+        if learnt:
+            self.learnt.add(idx)
+            self.clause_activity[idx] = self.cla_inc
+        return idx
+
+    def lit_value(self, lit):
+        v = self.value[abs(lit)]
+        return v if lit > 0 else -v
+
+    def decision_level(self):
+        return len(self.trail_lim)
+
+    def assign(self, lit, reason):
+        var = abs(lit)
+        self.value[var] = 1 if lit > 0 else -1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def solve(self):
+        if self.empty_clause:
+            return None
+
+        for lit in self.units:
+            val = self.lit_value(lit)
+            if val == -1:
+                return None
+            if val == 0:
+                self.assign(lit, None)
+
+        luby_index = 0
+        while True:
+            budget = self.restart_base * self.luby(luby_index)
+            luby_index += 1
+            status = self.search(budget)
+            if status is not None:
+                return self._format_solution() if status else None
+            self.restarts += 1
+
+    def search(self, conflict_budget):
+        """
+        Tìm kiếm cho đến khi có lời giải (True), chứng minh vô nghiệm (False)
+        hoặc hết ngân sách xung đột để khởi động lại (None).
+        """
+        conflicts = 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                conflicts += 1
+                if self.decision_level() == 0:
+                    return False
+
+                learnt_clause, back_level = self.analyze(conflict)
+                self.cancel_until(back_level)
+                if len(learnt_clause) == 1:
+                    self.assign(learnt_clause[0], None)
+                else:
+                    idx = self._attach(learnt_clause, learnt=True)
+                    self.assign(learnt_clause[0], idx)
+
+                self.heuristic.decay()
+                self.cla_inc /= self.cla_decay
+                continue
+
+            if conflicts >= conflict_budget:
+                self.cancel_until(0)
+                return None
+
+            if len(self.learnt) - len(self.trail) >= self.max_learnts:
+                self.reduce_db()
+
+            var = self.pick_branch_variable()
+            if var is None:
+                return True
+
+            self.decisions += 1
+            if self.progress_callback is not None and self.decisions % self.progress_interval == 0:
+                self._report_progress()
+            self.trail_lim.append(len(self.trail))
+            self.assign(var if self.phase[var] > 0 else -var, None)
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["learnts"] = len(self.learnt)
+        return stats
+
+    def propagate(self):
+        """Trả về chỉ số mệnh đề xung đột, hoặc None nếu không có xung đột."""
+        value = self.value
+        clauses = self.clauses
+        watches = self.watches
+        trail = self.trail
+
+        while self.qhead < len(trail):
+            false_lit = -trail[self.qhead]
+            self.qhead += 1
+            watch_list = watches[false_lit]
+
+            i = j = 0
+            n = len(watch_list)
+            self.clauses_scanned += n
+            while i < n:
+                c_idx = watch_list[i]
+                i += 1
+                clause = clauses[c_idx]
+                if clause is None:
+                    # Mệnh đề học đã bị xóa: bỏ watch
+                    continue
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+
+                first = clause[0]
+                first_val = value[first] if first > 0 else -value[-first]
+                if first_val == 1:
+                    watch_list[j] = c_idx
+                    j += 1
+                    continue
+
+                for k in range(2, len(clause)):
+                    lit = clause[k]
+                    if (value[lit] if lit > 0 else -value[-lit]) != -1:
+                        clause[1], clause[k] = lit, false_lit
+                        watches[lit].append(c_idx)
+                        break
+                else:
+                    watch_list[j] = c_idx
+                    j += 1
+                    if first_val == -1:
+                        while i < n:
+                            watch_list[j] = watch_list[i]
+                            j += 1
+                            i += 1
+                        del watch_list[j:]
+                        self.qhead = len(trail)
+                        return c_idx
+                    self.assign(first, c_idx)
+                    self.propagations += 1
+            del watch_list[j:]
+
+        return None
+
+    def analyze(self, conflict):
+        """
+        Phân tích xung đột theo lược đồ 1-UIP. Trả về mệnh đề học được
+        (literal UIP đứng đầu, literal có mức cao nhất còn lại đứng thứ hai)
+        và mức quyết định cần nhảy lùi về.
+        """
+        seen = self.seen
+        level = self.level
+        current_level = self.decision_level()
+
+        learnt_clause = [0]
+        counter = 0
+        lit = 0
+        index = len(self.trail) - 1
+        c_idx = conflict
+
+        while True:
+            self._bump_clause(c_idx)
+            for q in self.clauses[c_idx]:
+                if q == lit:
+                    continue
+                var = abs(q)
+                if not seen[var] and level[var] > 0:
+                    seen[var] = True
+                    self.heuristic.bump(var)
+                    if level[var] >= current_level:
+                        counter += 1
+                    else:
+                        learnt_clause.append(q)
+
+            # Tìm literal tiếp theo trên trail thuộc mức hiện tại đã được đánh dấu
+            while not seen[abs(self.trail[index])]:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            var = abs(lit)
+            seen[var] = False
+            counter -= 1
+            if counter == 0:
+                break
+            c_idx = self.reason[var]
+
+        learnt_clause[0] = -lit
+        for q in learnt_clause[1:]:
+            seen[abs(q)] = False
+
+        if len(learnt_clause) == 1:
+            return learnt_clause, 0
+
+        max_i = max(range(1, len(learnt_clause)), key=lambda k: level[abs(learnt_clause[k])])
+        learnt_clause[1], learnt_clause[max_i] = learnt_clause[max_i], learnt_clause[1]
+        return learnt_clause, level[abs(learnt_clause[1])]
+
+    def cancel_until(self, target_level):
+        if self.decision_level() <= target_level:
+            return
+        start = self.trail_lim[target_level]
+        unassign = self.heuristic.unassign
+        for lit in self.trail[start:]:
+            var = abs(lit)
+            self.phase[var] = self.value[var]
+            self.value[var] = 0
+            self.reason[var] = None
+            unassign(var)
+        del self.trail[start:]
+        del self.trail_lim[target_level:]
+        self.qhead = start
+
+    def pick_branch_variable(self):
+        return self.heuristic.pick()
+
+    def _bump_clause(self, c_idx):
+        if c_idx not in self.learnt:
+            return
+        self.clause_activity[c_idx] += self.cla_inc
+        if self.clause_activity[c_idx] > 1e20:
+            for idx in self.learnt:
+                self.clause_activity[idx] *= 1e-20
+            self.cla_inc *= 1e-20
+
+    def reduce_db(self):
+        """
+        Xóa một nửa số mệnh đề học có activity thấp nhất. Giữ lại mệnh đề
+        nhị phân và mệnh đề đang là lý do (reason) của một phép gán.
+        """
+        locked = {self.reason[abs(lit)] for lit in self.trail}
+        candidates = sorted(
+            (idx for idx in self.learnt if len(self.clauses[idx]) > 2 and idx not in locked),
+            key=lambda idx: self.clause_activity[idx],
+        )
+        for idx in candidates[:len(candidates) // 2]:
+            self.clauses[idx] = None
+            self.learnt.discard(idx)
+            del self.clause_activity[idx]
+        self.max_learnts = int(self.max_learnts * 1.1)
+
+    @staticmethod
+    def luby(i):
+        """Phần tử thứ i (bắt đầu từ 0) của dãy Luby: 1 1 2 1 1 2 4 ..."""
+        size, seq = 1, 0
+        while size < i + 1:
+            seq += 1
+            size = 2 * size + 1
+        while size - 1 != i:
+            size = (size - 1) // 2
+            seq -= 1
+            i = i % size
+        return 2 ** seq
+
+    def _format_solution(self):
+        solution = []
+        for var in self.variables:
+            if self.value[var] == 1:
+                solution.append(var)
+            else:
+                solution.append(-var)
+        return solution
@@ -0,0 +1,200 @@
+"""
+Cache CNF đã mã hóa trên đĩa, khóa theo nội dung lưới + ENCODER_VERSION.
+
+Mỗi mục là một file nhị phân gồm các số int32 little-endian liên tiếp:
+
+    header      : MAGIC, FORMAT_VERSION, next_id, rows, cols,
+                  số mệnh đề, số literal, số đảo, số cầu, num_vars, số phần tử occ_clauses,
+                  số literal cố định
+    grid        : rows * cols giá trị của lưới
+    offsets     : (số mệnh đề + 1) vị trí bắt đầu của từng mệnh đề trong 'literals'
+    literals    : tất cả literal nối liền nhau
+    pos_counts  : (num_vars + 1) số lần xuất hiện của literal dương
+    neg_counts  : (num_vars + 1) số lần xuất hiện của literal âm
+    occ_offsets : (num_vars + 2) vị trí bắt đầu danh sách xuất hiện của từng biến
+    occ_clauses : danh sách xuất hiện nối liền nhau (dạng CSR, như CompactCNF)
+    islands     : (hàng, cột) của từng đảo
+    bridges     : (hàng1, cột1, hàng2, cột2, id X1) theo thứ tự phát hiện
+    fixed       : các literal cầu đã suy luận trước (hashi_cnf.fixed), tăng dần theo biến
+
+File được đọc bằng numpy.memmap; sáu mảng của CompactCNF được bọc thẳng bằng
+memoryview trên memmap, nên lúc nạp không phải phân tích, sao chép hay dựng lại chỉ mục.
+Dung lượng thư mục cache bị giới hạn; khi vượt quá, các mục ít được dùng gần đây
+nhất (theo mtime, được cập nhật mỗi lần đọc) bị xóa trước.
+"""
+import hashlib
+import os
+import sys
+import tempfile
+from array import array
+
+import numpy as np
+
+from compact_cnf import CompactCNF
+from deduction import encode_deduced
+from hashiwokakero_cnf import HashiwokakeroCNF, ENCODER_VERSION
+from utils import evict_lru
+
+MAGIC = 0x48434E46  # "HCNF"
+FORMAT_VERSION = 3
+HEADER_SIZE = 12
+DEFAULT_CACHE_DIR = ".cnf_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def grid_key(grid, card_encoding="seqcounter", deduce=False):
+    """
+    Khóa của một lưới: sha256 trên phiên bản bộ mã hóa, cách mã hóa cardinality,
+    việc có suy luận trước hay không, kích thước và nội dung.
+    """
+    digest = hashlib.sha256()
+    mode = "|deduced" if deduce else ""
+    digest.update(f"v{ENCODER_VERSION}|{card_encoding}{mode}|{len(grid)}x{len(grid[0])}|".encode())
+    digest.update(",".join(str(v) for row in grid for v in row).encode())
+    return digest.hexdigest()
+
+
+def _bridges(hashi_cnf):
+    """Các cầu (đảo sở hữu, đảo hàng xóm, id X1) theo thứ tự phát hiện của bộ mã hóa."""
+    result = []
+    for owner in hashi_cnf.islands:
+        for other in hashi_cnf.neighbors[owner]:
+            result.append((owner, other, hashi_cnf.hash[("X1", owner, other)]))
+    return result
+
+
+def serialize(hashi_cnf):
+    grid = hashi_cnf.grid
+    cnf = hashi_cnf.get_cnf()
+    bridges = _bridges(hashi_cnf)
+    fixed = sorted(hashi_cnf.fixed, key=abs)
+
+    # CompactCNF đã có đúng bố cục các mảng của file
+    cnf_arrays = [np.frombuffer(a, dtype=np.intc).astype("<i4") for a in cnf.arrays()]
+
+    header = np.array([
+        MAGIC, FORMAT_VERSION, hashi_cnf.id, len(grid), len(grid[0]),
+        len(cnf), len(cnf.literals), len(hashi_cnf.islands), len(bridges),
+        cnf.num_vars, len(cnf.occ_clauses), len(fixed),
+    ], dtype="<i4")
+    islands = np.array(hashi_cnf.islands, dtype="<i4").reshape(-1)
+    bridge_rows = np.array(
+        [(a[0], a[1], b[0], b[1], var) for a, b, var in bridges], dtype="<i4"
+    ).reshape(-1)
+    grid_values = np.array(grid, dtype="<i4").reshape(-1)
+    fixed_lits = np.array(fixed, dtype="<i4")
+    literals, offsets, *index = cnf_arrays
+    return np.concatenate([header, grid_values, offsets, literals, *index, islands, bridge_rows, fixed_lits])
+
+
+def _int_view(part):
+    """Bọc một đoạn int32 little-endian của memmap thành memoryview 'i', không sao chép."""
+    if sys.byteorder != "little" or np.dtype(np.intc).itemsize != 4:
+        return array("i", part.astype(np.intc).tobytes())
+    return memoryview(part).cast("B").cast("i")
+
+
+def deserialize(data, card_encoding="seqcounter"):
+    """
+    Dựng lại HashiwokakeroCNF từ mảng int32 (thường là numpy.memmap). Tập 'fixed' được
+    đọc từ file chứ không suy ra từ các mệnh đề đơn của CNF, vì CNF còn có mệnh đề đơn
+    của Constraint 3 (đảo sát nhau).
+    """
+    header = data[:HEADER_SIZE].tolist()
+    magic, version, next_id, rows, cols, n_clauses, n_lits, n_islands, n_bridges, n_vars, n_occ, n_fixed = header
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Định dạng cache không hợp lệ")
+
+    pos = HEADER_SIZE
+    flat_grid = data[pos:pos + rows * cols].tolist()
+    pos += rows * cols
+    parts = []
+    for size in (n_clauses + 1, n_lits, n_vars + 1, n_vars + 1, n_vars + 2, n_occ):
+        parts.append(data[pos:pos + size])
+        pos += size
+    flat_islands = data[pos:pos + 2 * n_islands].tolist()
+    pos += 2 * n_islands
+    flat_bridges = data[pos:pos + 5 * n_bridges].tolist()
+    pos += 5 * n_bridges
+    fixed = data[pos:pos + n_fixed].tolist()
+
+    if len(fixed) != n_fixed:
+        raise ValueError("File cache bị cắt cụt")
+
+    grid = [flat_grid[r * cols:(r + 1) * cols] for r in range(rows)]
+    offsets, literals = parts[0], parts[1]
+    cnf = CompactCNF.from_arrays(*(_int_view(part) for part in (literals, offsets, *parts[2:])))
+    islands = [(flat_islands[2 * k], flat_islands[2 * k + 1]) for k in range(n_islands)]
+    bridges = []
+    for k in range(n_bridges):
+        r1, c1, r2, c2, var = flat_bridges[5 * k:5 * k + 5]
+        bridges.append(((r1, c1), (r2, c2), var))
+    return HashiwokakeroCNF.from_parts(grid, cnf, bridges, islands, next_id, card_encoding, fixed)
+
+
+class CNFCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.cnf")
+
+    def get(self, grid, card_encoding="seqcounter", deduce=False):
+        """Trả về HashiwokakeroCNF từ cache, hoặc None nếu chưa có / file hỏng."""
+        path = self._path(grid_key(grid, card_encoding, deduce))
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.memmap(path, dtype="<i4", mode="r")
+            hashi_cnf = deserialize(data, card_encoding)
+        except (OSError, ValueError):
+            return None
+        if hashi_cnf.grid != [list(row) for row in grid]:
+            return None
+        # Cập nhật mtime để đánh dấu mục vừa được dùng (LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return hashi_cnf
+
+    def put(self, grid, hashi_cnf, deduce=False):
+        """Lưu CNF đã mã hóa; khóa gồm cả hashi_cnf.card_encoding và 'deduce'."""
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        data = serialize(hashi_cnf)
+        # Ghi ra file tạm rồi đổi tên để các tiến trình khác không đọc phải file ghi dở
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.tobytes())
+        os.replace(tmp_path, self._path(grid_key(grid, hashi_cnf.card_encoding, deduce)))
+        self.evict()
+
+    def evict(self):
+        """Xóa các mục cũ nhất cho đến khi tổng dung lượng không vượt quá max_bytes."""
+        evict_lru(self.cache_dir, self.max_bytes, ".cnf")
+
+    def load_or_encode(self, grid, card_encoding="seqcounter", deduce=False):
+        hashi_cnf = self.get(grid, card_encoding, deduce)
+        if hashi_cnf is not None:
+            self.hits += 1
+            return hashi_cnf
+        self.misses += 1
+        if deduce:
+            hashi_cnf = encode_deduced(grid, card_encoding)
+        else:
+            hashi_cnf = HashiwokakeroCNF(grid, card_encoding)
+        self.put(grid, hashi_cnf, deduce)
+        return hashi_cnf
+
+
+def load_or_encode(grid, card_encoding="seqcounter", cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                   deduce=False):
+    """
+    Nạp CNF của lưới từ cache trên đĩa, hoặc mã hóa rồi lưu vào cache.
+    Nếu 'deduce' bật, các cầu bị ép buộc được suy luận trước (deduction.py).
+    """
+    return CNFCache(cache_dir, max_bytes).load_or_encode(grid, card_encoding, deduce)
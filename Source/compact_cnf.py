@@ -0,0 +1,147 @@
+"""
+CNF dạng gọn, chỉ đọc, được HashiwokakeroCNF dựng một lần và dùng chung cho mọi solver.
+
+Mọi literal nằm liền nhau trong một array('i') 'literals' (4 byte mỗi literal, thay vì
+một list cho mỗi mệnh đề và một đối tượng int cho mỗi literal lớn hơn 256); mệnh đề
+thứ c là literals[offsets[c]:offsets[c + 1]] - cùng bố cục với file của cnf_cache.
+Lúc dựng tính sẵn:
+
+    variables            các biến xuất hiện, tăng dần
+    pos_counts[v]        số lần literal v xuất hiện
+    neg_counts[v]        số lần literal -v xuất hiện
+    occurrences(v)       chỉ số các mệnh đề chứa v hoặc -v (lưu kiểu CSR:
+                         occ_clauses[occ_offsets[v]:occ_offsets[v + 1]])
+
+nên solver không phải tự duyệt lại CNF để dựng dict biến / tần suất của riêng mình.
+Các mảng là array('i'), hoặc memoryview định dạng 'i' khi được nạp từ cnf_cache
+(bọc thẳng numpy.memmap của file, không sao chép và không dựng lại chỉ mục).
+Đối tượng dùng được như một danh sách mệnh đề chỉ đọc: len(cnf), cnf[c] (trả về tuple)
+và vòng lặp 'for clause in cnf'; nó không có phương thức sửa đổi nào, nên solver nào
+cần sắp xếp hay đổi chỗ literal phải tự sao chép mệnh đề.
+"""
+from array import array
+
+
+class CompactCNF:
+    def __init__(self, clauses=()):
+        literals = array("i")
+        offsets = array("i", [0])
+        for clause in clauses:
+            literals.extend(clause)
+            offsets.append(len(literals))
+        self._build(literals, offsets)
+
+    @classmethod
+    def from_arrays(cls, literals, offsets, pos_counts=None, neg_counts=None, occ_offsets=None, occ_clauses=None):
+        """
+        Dựng từ mảng literal phẳng và (số mệnh đề + 1) vị trí bắt đầu, ví dụ đọc từ cache.
+        Nếu có đủ bốn mảng chỉ mục đã tính sẵn (cùng bố cục với thuộc tính cùng tên),
+        chúng được dùng nguyên như vậy, kể cả memoryview, thay vì dựng lại.
+        """
+        obj = cls.__new__(cls)
+        index = (pos_counts, neg_counts, occ_offsets, occ_clauses)
+        if any(a is None for a in index):
+            obj._build(array("i", literals), array("i", offsets))
+        else:
+            obj._set(literals, offsets, *index)
+        return obj
+
+    def _set(self, literals, offsets, pos_counts, neg_counts, occ_offsets, occ_clauses):
+        self.literals = literals
+        self.offsets = offsets
+        self.num_vars = len(pos_counts) - 1
+        self.pos_counts = pos_counts
+        self.neg_counts = neg_counts
+        self.variables = tuple(v for v in range(1, self.num_vars + 1) if pos_counts[v] or neg_counts[v])
+        self.occ_offsets = occ_offsets
+        self.occ_clauses = occ_clauses
+
+    def _build(self, literals, offsets):
+        num_vars = max(map(abs, literals), default=0)
+
+        pos_counts = array("i", [0]) * (num_vars + 1)
+        neg_counts = array("i", [0]) * (num_vars + 1)
+        for lit in literals:
+            if lit > 0:
+                pos_counts[lit] += 1
+            else:
+                neg_counts[-lit] += 1
+
+        # Danh sách xuất hiện: mỗi mệnh đề được ghi một lần cho mỗi biến của nó
+        clause_vars = [
+            set(map(abs, literals[offsets[c]:offsets[c + 1]])) for c in range(len(offsets) - 1)
+        ]
+        occ_offsets = array("i", [0]) * (num_vars + 2)
+        for vars_of_clause in clause_vars:
+            for var in vars_of_clause:
+                occ_offsets[var + 1] += 1
+        for var in range(1, num_vars + 2):
+            occ_offsets[var] += occ_offsets[var - 1]
+        occ_clauses = array("i", [0]) * occ_offsets[num_vars + 1]
+        fill = occ_offsets[:]
+        for c, vars_of_clause in enumerate(clause_vars):
+            for var in vars_of_clause:
+                occ_clauses[fill[var]] = c
+                fill[var] += 1
+        self._set(literals, offsets, pos_counts, neg_counts, occ_offsets, occ_clauses)
+
+    def arrays(self):
+        """(literals, offsets, pos_counts, neg_counts, occ_offsets, occ_clauses), theo thứ tự của from_arrays."""
+        return self.literals, self.offsets, self.pos_counts, self.neg_counts, self.occ_offsets, self.occ_clauses
+
+    def __reduce__(self):
+        # memoryview không pickle được: gửi sang tiến trình khác bản sao array('i')
+        return CompactCNF.from_arrays, tuple(a if isinstance(a, array) else array("i", a.tobytes()) for a in self.arrays())
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("chỉ số mệnh đề ngoài phạm vi")
+        return tuple(self.literals[self.offsets[idx]:self.offsets[idx + 1]])
+
+    def __iter__(self):
+        literals, offsets = self.literals, self.offsets
+        for idx in range(len(offsets) - 1):
+            yield tuple(literals[offsets[idx]:offsets[idx + 1]])
+
+    def __repr__(self):
+        return f"CompactCNF({len(self)} mệnh đề, {len(self.variables)} biến, {len(self.literals)} literal)"
+
+    def clause_len(self, idx):
+        return self.offsets[idx + 1] - self.offsets[idx]
+
+    def occurrences(self, var):
+        """Chỉ số (tăng dần) các mệnh đề chứa biến 'var' ở một trong hai dấu."""
+        if not 0 < var <= self.num_vars:
+            return array("i")
+        return self.occ_clauses[self.occ_offsets[var]:self.occ_offsets[var + 1]]
+
+    def count(self, lit):
+        """Số lần literal 'lit' xuất hiện trong CNF."""
+        var = abs(lit)
+        if var > self.num_vars:
+            return 0
+        return self.pos_counts[var] if lit > 0 else self.neg_counts[var]
+
+    def frequency(self, var):
+        """Số lần biến 'var' xuất hiện (cả hai dấu)."""
+        return self.count(var) + self.count(-var)
+
+    def nbytes(self):
+        """Dung lượng các mảng (byte), không tính phần đầu của đối tượng Python."""
+        return sum(len(a) * a.itemsize for a in self.arrays())
+
+    def to_lists(self):
+        """Bản sao dạng list of lists, cho nơi cần sửa mệnh đề."""
+        return [list(clause) for clause in self]
+
+
+def as_compact(cnf):
+    """Trả về 'cnf' nếu đã là CompactCNF, ngược lại dựng CompactCNF từ danh sách mệnh đề."""
+    if isinstance(cnf, CompactCNF):
+        return cnf
+    return CompactCNF(cnf)
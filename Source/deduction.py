@@ -0,0 +1,62 @@
+"""
+Suy luận trên lưới trước khi mã hóa: cố định các cầu bị ép buộc và loại các cầu
+không thể có bằng luật đơn giản, lặp đến điểm bất động.
+
+  - sức chứa của đảo (lan truyền của BridgeSolver): 4 ở góc, 6 ở cạnh, 8 ở giữa,
+    hay tổng quát là số trên đảo trừ sức chứa tối đa của các cầu còn lại;
+  - cầu chắc chắn có thì các cầu cắt ngang nó bị loại;
+  - hai đảo sát nhau không nối được, cầu không vượt quá số trên đảo nhỏ hơn;
+  - khi có hơn hai đảo: hai đảo "1" không nối với nhau và hai đảo "2" không nối
+    bằng cầu đôi, vì như thế cặp đảo bị tách khỏi phần còn lại.
+
+Kết quả là tập literal của các biến X1/X2 (cùng cách đánh số với HashiwokakeroCNF)
+để truyền vào HashiwokakeroCNF(grid, fixed=...).
+"""
+from bridge_solver import BridgeSolver
+from hashiwokakero_cnf import HashiwokakeroCNF
+
+
+def deduce_bridges(grid):
+    """
+    Trả về tập literal của các biến cầu đã xác định, hoặc None nếu các luật
+    dẫn tới mâu thuẫn (đề không có lời giải).
+    """
+    solver = BridgeSolver(grid)
+    queue = list(range(len(solver.islands)))
+
+    if len(solver.islands) > 2:
+        for e, (a, b) in enumerate(solver.bridges):
+            if solver.demand[a] == solver.demand[b] == 1:
+                cap = 0
+            elif solver.demand[a] == solver.demand[b] == 2:
+                cap = 1
+            else:
+                continue
+            if not solver.set_bounds(e, 0, cap, queue):
+                return None
+
+    if not solver.propagate(queue) or not solver.is_connectable():
+        return None
+
+    fixed = set()
+    for e, var in enumerate(solver.bridge_var):
+        lo, hi = solver.lo[e], solver.hi[e]
+        if lo >= 1:
+            fixed.add(var)
+        elif hi == 0:
+            fixed.add(-var)
+        if lo == 2:
+            fixed.add(var + 1)
+        elif hi <= 1:
+            fixed.add(-(var + 1))
+    return fixed
+
+
+def encode_deduced(grid, card_encoding="seqcounter"):
+    """
+    Mã hóa phần còn lại của đề sau khi suy luận. Nếu suy luận gặp mâu thuẫn thì mã
+    hóa đầy đủ như bình thường, để solver tự chứng minh đề vô nghiệm.
+    Số biến cầu đã bị loại khỏi tìm kiếm là len(hashi_cnf.fixed).
+    """
+    fixed = deduce_bridges(grid)
+    return HashiwokakeroCNF(grid, card_encoding, fixed=fixed or ())
@@ -0,0 +1,243 @@
+"""
+Phiên chỉnh sửa đề với một solver PySAT sống suốt phiên, cho trình soạn đề: mỗi lần
+sửa số trên một đảo (hay thêm / xóa đảo) chỉ cập nhật phần ràng buộc bị ảnh hưởng rồi
+giải lại bằng solve(assumptions=...), giữ nguyên các mệnh đề solver đã học.
+
+  - Ràng buộc tổng của mỗi đảo được canh bởi một literal chọn (selector) s:
+    mỗi mệnh đề C được thêm dưới dạng (-s v C) và s được đưa vào assumptions.
+    Khi đảo bị sửa, selector cũ bị rút lại vĩnh viễn bằng mệnh đề đơn [-s] và
+    ràng buộc mới được thêm với selector mới.
+  - Thêm / xóa đảo chỉ đổi các cầu bị ảnh hưởng: cầu không còn hợp lệ (đầu mút bị
+    xóa, hoặc bị đảo mới chắn ngang) bị cố định bằng [-X1]; cầu mới được cấp biến
+    X1/X2 mới cùng mệnh đề X2 => X1, cầu sát nhau và các mệnh đề cắt nhau với các cầu
+    đang có. Chỉ các đảo có tập cầu thay đổi mới được mã hóa lại ràng buộc tổng.
+  - Mệnh đề cắt liên thông (như PySATSolver) đúng với mọi lời giải liên thông khi
+    tập đảo không đổi, nên chỉ bị canh bởi selector "hình dạng" - selector này
+    được thay mới khi thêm / xóa đảo, còn sửa số thì giữ lại các mệnh đề cắt.
+
+Biến cầu được lưu trong self.hash theo cùng dạng với HashiwokakeroCNF.hash, nên
+lời giải hiển thị được bằng solution_to_text(session.grid, model, session.hash).
+"""
+from pysat.card import CardEnc, EncType
+from pysat.solvers import Solver
+
+from hashiwokakero_cnf import HashiwokakeroCNF
+from instrumentation import Instrumented
+from pysat_solver import PySATSolver
+from utils import solution_edge_list
+
+DIRECTIONS = [(-1, 0), (1, 0), (0, 1), (0, -1)]
+
+
+def _crosses(bridge1, bridge2):
+    """Hai cầu (đảo, đảo) cắt nhau: một cầu ngang và một cầu dọc giao nhau ở một ô trống."""
+    (a1, b1), (a2, b2) = bridge1, bridge2
+    if a1[0] == b1[0] and a2[1] == b2[1]:
+        horizontal, vertical = (a1, b1), (a2, b2)
+    elif a1[1] == b1[1] and a2[0] == b2[0]:
+        horizontal, vertical = (a2, b2), (a1, b1)
+    else:
+        return False
+    row = horizontal[0][0]
+    col = vertical[0][1]
+    col_low, col_high = sorted((horizontal[0][1], horizontal[1][1]))
+    row_low, row_high = sorted((vertical[0][0], vertical[1][0]))
+    return col_low < col < col_high and row_low < row < row_high
+
+
+class EditSession(Instrumented):
+    STATS = ("solves", "refinements", "retracted")
+
+    def __init__(self, grid, card_encoding="seqcounter", solver_name="g3"):
+        """
+        'card_encoding': "table" hoặc một cách mã hóa CardEnc của PySAT ("seqcounter",
+        "totalizer", ...). "auto" và "native" không dùng được vì ràng buộc tổng phải
+        nằm trong mệnh đề để canh được bằng selector.
+        """
+        if card_encoding in ("auto", "native"):
+            raise ValueError(f"EditSession không hỗ trợ cách mã hóa {card_encoding}")
+        self.reset_stats()
+        self.card_encoding = card_encoding
+        self.grid = [list(row) for row in grid]
+        self.solver = Solver(name=solver_name)
+        self.top = 0
+        self.bridges = {}  # (đảo, đảo) với đảo nhỏ hơn đứng trước -> biến X1
+        self.hash = {}
+        self.selectors = {}  # đảo -> selector của ràng buộc tổng
+        self.shape_selector = self._new_var()
+        self.model = None
+        self.sat_stats = {}
+        self._update(set(self._islands()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.solver is not None:
+            self.sat_stats = dict(self.solver.accum_stats() or {})
+            self.solver.delete()
+            self.solver = None
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update((self.solver.accum_stats() or {}) if self.solver is not None else self.sat_stats)
+        return stats
+
+    # ------------------------------------------------------------------
+    # Chỉnh sửa
+
+    def set_island(self, cell, number):
+        """
+        Đặt số trên ô 'cell' = (hàng, cột): sửa số của đảo, thêm đảo mới, hoặc xóa
+        đảo nếu 'number' = 0. Lời giải cũ (self.model) bị bỏ.
+        """
+        r, c = cell
+        old = self.grid[r][c]
+        if old == number:
+            return
+        self.grid[r][c] = number
+        self.model = None
+        if old > 0 and number > 0:
+            # Chỉ đổi số: tập cầu giữ nguyên, chỉ thay ràng buộc tổng của đảo này
+            self._encode_island(cell)
+            return
+        # Thêm / xóa đảo: các mệnh đề cắt liên thông cũ không còn đúng
+        self._retract(self.shape_selector)
+        self.shape_selector = self._new_var()
+        affected = {cell}
+        if number == 0:
+            self._retract(self.selectors.pop(cell))
+        self._update(affected)
+
+    def remove_island(self, cell):
+        self.set_island(cell, 0)
+
+    def _islands(self):
+        return [
+            (i, j) for i in range(len(self.grid)) for j in range(len(self.grid[0])) if self.grid[i][j] > 0
+        ]
+
+    def _current_bridges(self):
+        """Mọi cặp đảo nối được bằng cầu trên lưới hiện tại (đảo nhỏ hơn đứng trước)."""
+        pairs = set()
+        rows, cols = len(self.grid), len(self.grid[0])
+        for i, j in self._islands():
+            for dx, dy in DIRECTIONS[1:3]:  # xuống dưới và sang phải là đủ
+                nx, ny = i + dx, j + dy
+                while 0 <= nx < rows and 0 <= ny < cols:
+                    if self.grid[nx][ny] > 0:
+                        pairs.add(((i, j), (nx, ny)))
+                        break
+                    nx += dx
+                    ny += dy
+        return pairs
+
+    def _update(self, affected):
+        """Đồng bộ tập cầu với lưới, rồi mã hóa lại ràng buộc tổng của các đảo bị ảnh hưởng."""
+        current = self._current_bridges()
+        for pair in [pair for pair in self.bridges if pair not in current]:
+            var = self.bridges.pop(pair)
+            self.solver.add_clause([-var])
+            a, b = pair
+            for kind in ("X1", "X2"):
+                del self.hash[(kind, a, b)], self.hash[(kind, b, a)]
+            affected.update(pair)
+
+        for pair in sorted(current - set(self.bridges)):
+            a, b = pair
+            var = self._new_var()
+            self._new_var()
+            self.solver.add_clause([-(var + 1), var])
+            if abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1:
+                self.solver.add_clause([-var])
+            for other, other_var in self.bridges.items():
+                if _crosses(pair, other):
+                    self.solver.add_clause([-var, -other_var])
+            self.bridges[pair] = var
+            self.hash[("X1", a, b)] = self.hash[("X1", b, a)] = var
+            self.hash[("X2", a, b)] = self.hash[("X2", b, a)] = var + 1
+            affected.update(pair)
+
+        for island in affected:
+            if self.grid[island[0]][island[1]] > 0:
+                self._encode_island(island)
+
+    def _island_vars(self, island):
+        groups = []
+        for pair, var in self.bridges.items():
+            if island in pair:
+                groups.append((var, var + 1))
+        return groups
+
+    def _encode_island(self, island):
+        if island in self.selectors:
+            self._retract(self.selectors[island])
+        selector = self._new_var()
+        self.selectors[island] = selector
+        groups = self._island_vars(island)
+        lits = [var for group in groups for var in group]
+        bound = self.grid[island[0]][island[1]]
+        for clause in self._encode_cardinality(lits, bound, groups):
+            self.solver.add_clause([-selector] + clause)
+
+    def _encode_cardinality(self, lits, bound, groups):
+        if bound > len(lits):
+            return [[]]
+        if not lits:
+            return []
+        if self.card_encoding == "table":
+            return HashiwokakeroCNF._table_encoding(groups, bound)
+        cnf_card = CardEnc.equals(lits=lits, bound=bound, top_id=self.top,
+                                  encoding=getattr(EncType, self.card_encoding))
+        self.top = max(self.top, cnf_card.nv)
+        return cnf_card.clauses
+
+    def _new_var(self):
+        self.top += 1
+        return self.top
+
+    def _retract(self, selector):
+        self.solver.add_clause([-selector])
+        self.retracted += 1
+
+    # ------------------------------------------------------------------
+    # Giải
+
+    def assumptions(self):
+        return [self.shape_selector] + list(self.selectors.values())
+
+    def solve(self):
+        """
+        Giải lại trên solver đang sống với các selector hiện hành làm assumptions, tinh
+        chỉnh liên thông bằng mệnh đề cắt (canh bởi selector hình dạng). Trả về mô hình
+        hoặc None nếu đề sau khi sửa vô nghiệm.
+        """
+        self.solves += 1
+        islands = self._islands()
+        edges = [(a, b, var) for (a, b), var in self.bridges.items()]
+        assumptions = self.assumptions()
+        while self.solver.solve(assumptions=assumptions):
+            model = self.solver.get_model()
+            true_vars = {lit for lit in model if lit > 0}
+            components = PySATSolver._components(islands, edges, true_vars)
+            if len(components) <= 1:
+                self.model = model
+                return model
+            self.refinements += 1
+            for component in components:
+                cut = [var for a, b, var in edges if (a in component) != (b in component)]
+                if not cut:
+                    self.model = None
+                    return None
+                self.solver.add_clause([-self.shape_selector] + cut)
+        self.model = None
+        return None
+
+    def solution_edges(self):
+        """Danh sách cạnh [hàng1, cột1, hàng2, cột2, số cầu] của lời giải gần nhất."""
+        if self.model is None:
+            return None
+        return solution_edge_list(self.model, self.hash)
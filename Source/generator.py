@@ -0,0 +1,142 @@
+"""
+Sinh đề Hashiwokakero hợp lệ để kiểm thử tải và đo khả năng mở rộng.
+
+    python generator.py --size 30x30 --density 0.15 --double-ratio 0.3 --seed 1 \
+        --count 10 --out-dir Inputs/generated [--unique]
+
+Đề được sinh bằng cách dựng trước một lời giải liên thông (cây cầu mọc dần từ
+một đảo, thỉnh thoảng nối thêm chu trình), sau đó chỉ giữ lại số trên các đảo.
+Đề luôn có ít nhất một lời giải; tùy chọn --unique kiểm tra tính duy nhất bằng PySAT.
+"""
+import argparse
+import os
+import random
+
+from hashiwokakero_cnf import HashiwokakeroCNF
+from pysat_solver import PySATSolver
+
+DIRECTIONS = [(-1, 0), (1, 0), (0, 1), (0, -1)]
+
+
+def generate_puzzle(rows, cols, density=0.15, double_ratio=0.3, seed=None, rng=None):
+    """
+    Trả về lưới (list các hàng) với khoảng density * rows * cols đảo.
+    double_ratio là xác suất một cầu được xây đôi. Cầu luôn dài ít nhất 2 ô
+    vì bộ mã hóa không cho nối hai đảo sát nhau.
+    """
+    rng = rng or random.Random(seed)
+    target = max(2, int(density * rows * cols))
+
+    grid = [[0] * cols for _ in range(rows)]
+    occupied = [[False] * cols for _ in range(rows)]  # ô có cầu đi qua
+    bridges = {}  # (đảo a, đảo b) -> số cầu
+    degrees = {}
+    islands = [(rng.randrange(rows), rng.randrange(cols))]
+    grid[islands[0][0]][islands[0][1]] = -1  # đánh dấu đảo, số sẽ được tính sau
+
+    def degree(island):
+        return degrees.get(island, 0)
+
+    def build(a, b, path):
+        key = (min(a, b), max(a, b))
+        count = 2 if rng.random() < double_ratio else 1
+        count = min(count, 8 - degree(a), 8 - degree(b), 2 - bridges.get(key, 0))
+        if count <= 0:
+            return False
+        bridges[key] = bridges.get(key, 0) + count
+        degrees[a] = degree(a) + count
+        degrees[b] = degree(b) + count
+        for x, y in path:
+            occupied[x][y] = True
+        return True
+
+    attempts = 0
+    max_attempts = 200 * target
+    while len(islands) < target and attempts < max_attempts:
+        attempts += 1
+        start = rng.choice(islands)
+        if degree(start) >= 8:
+            continue
+        dx, dy = rng.choice(DIRECTIONS)
+
+        # Đi theo hướng đã chọn, gom các ô trống chưa có cầu
+        path = []
+        x, y = start[0] + dx, start[1] + dy
+        while 0 <= x < rows and 0 <= y < cols and grid[x][y] == 0 and not occupied[x][y]:
+            path.append((x, y))
+            x, y = x + dx, y + dy
+
+        hit_island = 0 <= x < rows and 0 <= y < cols and grid[x][y] != 0
+        if hit_island and len(path) >= 1 and rng.random() < 0.3:
+            # Nối thêm cầu tới đảo có sẵn (tạo chu trình hoặc cầu đôi)
+            if degree((x, y)) < 8:
+                build(start, (x, y), path)
+            continue
+
+        # Đặt đảo mới cách đảo xuất phát ít nhất 2 ô
+        if len(path) < 2:
+            continue
+        end = rng.randrange(1, len(path))
+        new_island = path[end]
+        grid[new_island[0]][new_island[1]] = -1
+        islands.append(new_island)
+        build(start, new_island, path[:end])
+
+    for (a, b), count in bridges.items():
+        grid[a[0]][a[1]] += count
+        grid[b[0]][b[1]] += count
+    # Bỏ dấu -1 ban đầu: số trên đảo = tổng số cầu
+    for x, y in islands:
+        grid[x][y] += 1
+    return grid
+
+
+def is_unique(grid):
+    """Kiểm tra đề có đúng một lời giải liên thông bằng PySAT (dừng ở lời giải thứ hai)."""
+    hashi_cnf = HashiwokakeroCNF(grid)
+    return PySATSolver(hashi_cnf.get_cnf(), hashi_cnf=hashi_cnf).is_unique()
+
+
+def write_puzzle(grid, path):
+    """Ghi lưới theo đúng định dạng mà read_input_from_file đọc được."""
+    with open(path, "w", encoding="utf-8") as f:
+        for row in grid:
+            f.write(", ".join(str(v) for v in row) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh đề Hashiwokakero.")
+    parser.add_argument("--size", default="10x10", help="Kích thước dạng HÀNGxCỘT, tối đa 100x100")
+    parser.add_argument("--density", type=float, default=0.15, help="Tỉ lệ ô là đảo")
+    parser.add_argument("--double-ratio", type=float, default=0.3, help="Xác suất cầu đôi")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--unique", action="store_true", help="Chỉ giữ đề có lời giải duy nhất")
+    parser.add_argument("--max-tries", type=int, default=100,
+                        help="Số lần thử tối đa cho mỗi đề khi dùng --unique")
+    parser.add_argument("--out-dir", default=os.path.join("Inputs", "generated"))
+    args = parser.parse_args(argv)
+
+    rows, cols = (int(v) for v in args.size.lower().split("x"))
+    if not (2 <= rows <= 100 and 2 <= cols <= 100):
+        parser.error("Kích thước phải nằm trong khoảng 2x2 đến 100x100")
+
+    if not os.path.exists(args.out_dir):
+        os.makedirs(args.out_dir)
+
+    rng = random.Random(args.seed)
+    for idx in range(1, args.count + 1):
+        for _ in range(args.max_tries):
+            grid = generate_puzzle(rows, cols, args.density, args.double_ratio, rng=rng)
+            if not args.unique or is_unique(grid):
+                break
+        else:
+            print(f"Không sinh được đề duy nhất sau {args.max_tries} lần thử, giữ đề cuối cùng.")
+
+        path = os.path.join(args.out_dir, f"input-{rows}x{cols}-s{args.seed}-{idx:03d}.txt")
+        write_puzzle(grid, path)
+        print(f"Đã ghi đề vào file: {path}")
+
+
+if __name__ == "__main__":
+    main()
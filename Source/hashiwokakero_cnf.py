@@ -1,9 +1,36 @@
-from pysat.card import CardEnc
+from pysat.card import CardEnc, EncType
+from bisect import bisect_left
 from collections import defaultdict
+from itertools import product
+
+from compact_cnf import CompactCNF, as_compact
+
+# Tăng số này mỗi khi cách mã hóa thay đổi để cache CNF trên đĩa tự mất hiệu lực
+ENCODER_VERSION = 2
+
+# Các cách mã hóa ràng buộc tổng của đảo (Constraint 5):
+#   "table"      : liệt kê trực tiếp các tổ hợp bị cấm, không có biến phụ
+#   "seqcounter", "sortnetwrk", "cardnetwrk", "totalizer", "mtotalizer", "kmtotalizer": CardEnc của PySAT
+#   "auto"       : chọn cách ít mệnh đề nhất cho từng đảo
+#   "native"     : không đưa vào CNF; PySATSolver chuyển thẳng cho Minicard/Gluecard
+CARD_ENCODINGS = (
+    "table", "seqcounter", "sortnetwrk", "cardnetwrk",
+    "totalizer", "mtotalizer", "kmtotalizer", "auto", "native",
+)
 
 class HashiwokakeroCNF:
-    def __init__(self, grid):
+    def __init__(self, grid, card_encoding="seqcounter", fixed=()):
+        """
+        'fixed' là tập literal của các biến cầu X1/X2 đã được suy luận trước
+        (xem deduction.py). Các biến này chỉ còn lại dưới dạng mệnh đề đơn: không
+        có mệnh đề X2 => X1 hay mệnh đề cắt nhau nào chứa chúng, và ràng buộc tổng
+        của đảo chỉ còn trên các biến tự do với số cầu còn thiếu.
+        """
+        if card_encoding not in CARD_ENCODINGS:
+            raise ValueError(f"Cách mã hóa cardinality không hợp lệ: {card_encoding}")
         self.id = 1
+        self.card_encoding = card_encoding
+        self.fixed = set(fixed)
         self.grid = grid
         self.islands = []
         self.cnf = []
@@ -12,6 +39,8 @@ class HashiwokakeroCNF:
             (i, j): [] for i in range(len(grid)) for j in range(len(grid[0]))
         }
         self.encode_constraints()
+        # Các mệnh đề được gom vào list trong lúc mã hóa rồi đóng gói một lần
+        self.cnf = CompactCNF(self.cnf)
 
     def encode_constraints(self):
         """Encodes all necessary constraints into CNF."""
@@ -31,7 +60,8 @@ class HashiwokakeroCNF:
                                     self.hash[("X2", (i, j), (nx, ny))] = self.hash[("X2", (nx, ny), (i, j))] = (self.id + 1)
 
                                     # Thêm mệnh đề (¬X2 ∨ X1), tương đương X2 => X1
-                                    self.cnf.append([-(self.id + 1), self.id])
+                                    if not self._is_fixed(self.id) and not self._is_fixed(self.id + 1):
+                                        self.cnf.append([-(self.id + 1), self.id])
                                     self.neighbors[(i, j)].append((nx, ny))
 
                                     self.id += 2
@@ -43,44 +73,56 @@ class HashiwokakeroCNF:
         for i, j in self.islands:
             for nx, ny in self.neighbors[(i, j)]:
                 # Nếu khoảng cách chỉ 1 ô (liền kề), không được xây cầu
-                if abs(nx - i) == 1 or abs(ny - j) == 1:
+                if (abs(nx - i) == 1 or abs(ny - j) == 1) and not self._is_fixed(self.hash[("X1", (i, j), (nx, ny))]):
                     self.cnf.append([-self.hash[("X1", (i, j), (nx, ny))]])
 
         # Constraint 4: Không cho phép cầu cắt nhau
-        added = set()
-        for i, j in self.islands:
-            for z, k in self.islands:
-                for x1 in self.neighbors[(i, j)]:
-                    for x2 in self.neighbors[(z, k)]:
-                        vector1 = (x1[0] - i, x1[1] - j)  # Hướng cầu (i,j)->x1
-                        vector2 = (x2[0] - z, x2[1] - k)  # Hướng cầu (z,k)->x2
-
-                        # Kiểm tra 1 cầu ngang, 1 cầu dọc => có thể cắt nhau
-                        if not (vector1[0] == 0 and vector2[0] == 0) and not (vector1[1] == 0 and vector2[1] == 0):
-                            # TH cầu (i,j)->x1 là ngang => vector1[0] == 0
-                            if vector1[0] == 0:
-                                # Kiểm tra xem (z,k)->x2 cắt với (i,j)->x1
-                                if (x2[0] - i) * (z - i) < 0 and (j - k) * (x1[1] - k) < 0:
-                                    sorted_cross = tuple(sorted([(i, j), (z, k), (x1[0], x1[1]), (x2[0], x2[1])]))
-                                    if sorted_cross not in added:
-                                        added.add(sorted_cross)
-                                        self.cnf.append([
-                                            -self.hash[("X1", (i, j), (x1[0], x1[1]))],
-                                            -self.hash[("X1", (z, k), (x2[0], x2[1]))]
-                                        ])
-                            # TH cầu (i,j)->x1 là dọc => vector1[1] == 0
-                            else:
-                                if (i - z) * (x1[0] - z) < 0 and (k - j) * (x2[1] - j) < 0:
-                                    sorted_cross = tuple(sorted([(i, j), (z, k), (x1[0], x1[1]), (x2[0], x2[1])]))
-                                    if sorted_cross not in added:
-                                        added.add(sorted_cross)
-                                        self.cnf.append([
-                                            -self.hash[("X1", (i, j), (x1[0], x1[1]))],
-                                            -self.hash[("X1", (z, k), (x2[0], x2[1]))]
-                                        ])
+        for bridge1, bridge2 in self.crossing_pairs():
+            var1, var2 = self.hash[("X1",) + bridge1], self.hash[("X1",) + bridge2]
+            if not self._is_fixed(var1) and not self._is_fixed(var2):
+                self.cnf.append([-var1, -var2])
 
         # Constraint 5: Tổng số cầu phải bằng số trên đảo
+        if self.card_encoding != "native":
+            for bridge_vars, bound, groups in self._island_cardinality():
+                self.cnf.extend(self.encode_cardinality(bridge_vars, bound, groups))
+
+        # Các biến cầu đã được suy luận trước
+        for lit in sorted(self.fixed, key=abs):
+            self.cnf.append([lit])
+
+    def _is_fixed(self, var):
+        return var in self.fixed or -var in self.fixed
+
+    def _island_cardinality(self):
+        """
+        Với mỗi đảo có cầu tự do: (các biến tự do, số cầu còn thiếu, nhóm biến theo cầu).
+        Mỗi nhóm là (X1, X2) của một cầu, bỏ đi các biến đã cố định; nhóm bằng None
+        khi không có biến nào bị cố định (mã hóa y hệt như trước).
+        """
+        for (i, j), bridge_vars in zip(self.islands, self.island_bridge_vars()):
+            bound = self.grid[i][j]
+            if not self.fixed:
+                if bridge_vars:
+                    yield bridge_vars, bound, None
+                continue
+            groups = []
+            for k in range(0, len(bridge_vars), 2):
+                group = []
+                for var in bridge_vars[k:k + 2]:
+                    if var in self.fixed:
+                        bound -= 1
+                    elif -var not in self.fixed:
+                        group.append(var)
+                if group:
+                    groups.append(tuple(group))
+            if groups:
+                yield [var for group in groups for var in group], bound, groups
+
+    def island_bridge_vars(self):
+        """Với mỗi đảo (theo thứ tự self.islands): danh sách [X1, X2, X1, X2, ...] của các cầu nối với nó."""
         directions = [(-1, 0), (1, 0), (0, 1), (0, -1)]
+        result = []
         for i, j in self.islands:
             bridge_vars = []
             for dx, dy in directions:
@@ -93,17 +135,141 @@ class HashiwokakeroCNF:
                         break
                     nx += dx
                     ny += dy
+            result.append(bridge_vars)
+        return result
+
+    def cardinality_constraints(self):
+        """Các ràng buộc tổng (literal, bound) của từng đảo, dùng cho solver hỗ trợ cardinality gốc."""
+        return [(bridge_vars, bound) for bridge_vars, bound, _ in self._island_cardinality()]
+
+    def encode_cardinality(self, bridge_vars, bound, groups=None):
+        """
+        Mã hóa "tổng bridge_vars = bound" theo self.card_encoding. Với "auto",
+        sinh thử bảng trực tiếp, sequential counter và totalizer rồi chọn bản
+        ít mệnh đề nhất (hòa thì ít biến phụ hơn). Cập nhật self.id theo biến phụ.
+        """
+        if self.card_encoding == "auto":
+            candidates = []
+            for name in ("table", "seqcounter", "totalizer"):
+                try:
+                    clauses, top = self._encode_cardinality_with(name, bridge_vars, bound, groups)
+                except ValueError:
+                    continue
+                candidates.append((len(clauses), top, clauses))
+            _, top, clauses = min(candidates, key=lambda c: (c[0], c[1]))
+        else:
+            clauses, top = self._encode_cardinality_with(self.card_encoding, bridge_vars, bound, groups)
+        self.id = max(self.id, top + 1)
+        return clauses
 
-            if bridge_vars:
-                cnf_card = CardEnc.equals(
-                    lits=bridge_vars,
-                    bound=self.grid[i][j],
-                    top_id=self.id + 1,
-                    encoding=1,
-                )
-                max_id = max(abs(lit) for clause in cnf_card for lit in clause)
-                self.id = max(max_id + 2, self.id)
-                self.cnf.extend(cnf_card)
+    def _encode_cardinality_with(self, name, bridge_vars, bound, groups=None):
+        """Trả về (danh sách mệnh đề, id biến lớn nhất đã dùng)."""
+        if name == "table":
+            if groups is None:
+                groups = [tuple(bridge_vars[k:k + 2]) for k in range(0, len(bridge_vars), 2)]
+            return self._table_encoding(groups, bound), self.id - 1
+        cnf_card = CardEnc.equals(
+            lits=bridge_vars,
+            bound=bound,
+            top_id=self.id - 1,
+            encoding=getattr(EncType, name),
+        )
+        return cnf_card.clauses, max(cnf_card.nv, self.id - 1)
+
+    @staticmethod
+    def _table_encoding(groups, bound):
+        """
+        Mã hóa trực tiếp không dùng biến phụ: mỗi cầu (X1, X2) nhận giá trị 0/1/2
+        (X2 => X1 đã được mã hóa riêng), và mỗi tổ hợp có tổng khác 'bound' bị cấm
+        bằng một mệnh đề. Một đảo có tối đa 4 cầu nên có tối đa 3^4 = 81 tổ hợp.
+        Cầu chỉ còn một biến tự do (biến kia đã cố định) nhận giá trị 0/1.
+        """
+        # Mệnh đề "cầu không nhận giá trị v" với v = 0, 1, 2
+        not_value_pair = [
+            lambda x1, x2: [x1],
+            lambda x1, x2: [-x1, x2],
+            lambda x1, x2: [-x2],
+        ]
+        clauses = []
+        for values in product(*(range(len(group) + 1) for group in groups)):
+            if sum(values) != bound:
+                clause = []
+                for group, v in zip(groups, values):
+                    if len(group) == 2:
+                        clause.extend(not_value_pair[v](*group))
+                    else:
+                        clause.append(group[0] if v == 0 else -group[0])
+                clauses.append(clause)
+        return clauses
+
+    def crossing_pairs(self):
+        """
+        Liệt kê các cặp cầu (ngang, dọc) cắt nhau bằng cách quét theo hàng.
+        Cầu ngang của mỗi hàng không chồng lên nhau nên được sắp theo cột;
+        với mỗi cầu dọc chỉ cần tìm nhị phân trên các hàng nó đi qua.
+
+        Mỗi cầu được đánh dấu (đảo sở hữu, vị trí trong neighbors) - đảo sở hữu là
+        đảo được duyệt trước. Các cặp được trả về theo đúng thứ tự mà vòng lặp
+        cũ (duyệt mọi cặp đảo và mọi cặp hàng xóm) sinh ra, cầu của đảo đứng
+        trước nằm trước, để tập mệnh đề và thứ tự của chúng không thay đổi.
+        """
+        island_order = {island: idx for idx, island in enumerate(self.islands)}
+        rows = defaultdict(list)
+        verticals = []
+        for owner in self.islands:
+            for pos, other in enumerate(self.neighbors[owner]):
+                tag = (island_order[owner], pos, owner, other)
+                if owner[0] == other[0]:
+                    low, high = sorted((owner[1], other[1]))
+                    rows[owner[0]].append((low, high, tag))
+                else:
+                    low, high = sorted((owner[0], other[0]))
+                    verticals.append((owner[1], low, high, tag))
+
+        starts = {}
+        for row, segments in rows.items():
+            segments.sort()
+            starts[row] = [low for low, _, _ in segments]
+
+        pairs = []
+        for col, row_low, row_high, v_tag in verticals:
+            for row in range(row_low + 1, row_high):
+                if row not in rows:
+                    continue
+                k = bisect_left(starts[row], col) - 1
+                if k < 0:
+                    continue
+                low, high, h_tag = rows[row][k]
+                if low < col < high:
+                    first, second = sorted((h_tag, v_tag))
+                    pairs.append((first, second))
+
+        pairs.sort(key=lambda pair: (pair[0][0], pair[1][0], pair[0][1], pair[1][1]))
+        return [((a[2], a[3]), (b[2], b[3])) for a, b in pairs]
+
+    @classmethod
+    def from_parts(cls, grid, cnf, bridges, islands, next_id, card_encoding="seqcounter", fixed=()):
+        """
+        Dựng lại đối tượng đã mã hóa (ví dụ từ cache) mà không chạy lại encode_constraints.
+        'bridges' là danh sách (đảo sở hữu, đảo hàng xóm, id biến X1) theo thứ tự phát hiện.
+        """
+        obj = cls.__new__(cls)
+        obj.id = next_id
+        obj.card_encoding = card_encoding
+        obj.fixed = set(fixed)
+        obj.grid = grid
+        obj.islands = list(islands)
+        obj.cnf = as_compact(cnf)
+        obj.hash = {}
+        obj.neighbors = {
+            (i, j): [] for i in range(len(grid)) for j in range(len(grid[0]))
+        }
+        for owner, other, var in bridges:
+            obj.hash[("X1", owner, other)] = obj.hash[("X1", other, owner)] = var
+            obj.hash[("X2", owner, other)] = obj.hash[("X2", other, owner)] = var + 1
+            obj.neighbors[owner].append(other)
+        return obj
 
     def get_cnf(self):
+        """CNF dạng CompactCNF, chỉ đọc, dùng chung cho mọi solver."""
         return self.cnf
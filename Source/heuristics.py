@@ -0,0 +1,198 @@
+"""
+Heuristic chọn biến rẽ nhánh dùng chung cho Backtracking, A* và CDCL.
+
+Điểm của biến được cập nhật tăng dần khi có xung đột, thay vì tính lại từ các mệnh đề
+ở mỗi nút; biến chưa gán có điểm cao nhất được lấy ra từ một heap lười (có thể chứa
+phần tử cũ hoặc biến đã gán, bỏ qua khi lấy ra) như trong CDCL.
+
+  "freq"    : thứ tự tĩnh theo số lần xuất hiện trong CNF
+  "bridge"  : thứ tự tĩnh theo cấu trúc đề (bridge_var_order): biến cầu X1/X2 của các
+              đảo bị ràng buộc chặt nhất trước, các biến phụ của mã hóa cardinality sau
+  "vsids"   : cộng 'inc' cho các biến của mệnh đề xung đột, 'inc' tăng theo hệ số
+              1/decay sau mỗi xung đột nên xung đột gần đây có trọng số lớn hơn
+  "domwdeg" : mỗi mệnh đề có trọng số (ban đầu 1) tăng 1 khi gây xung đột; wdeg của
+              biến là tổng trọng số các mệnh đề chứa nó. Biến Boolean chưa gán luôn có
+              dom = 2 nên chọn dom/wdeg nhỏ nhất chính là chọn wdeg lớn nhất. Trọng số
+              được cộng thẳng vào điểm của biến, không trừ đi các mệnh đề đã thỏa.
+
+Solver truyền vào mảng giá trị của nó ('value', 0 = chưa gán) và gọi pick() khi rẽ
+nhánh, unassign(var) khi hủy phép gán, on_conflict(mệnh đề) hoặc bump(var) + decay()
+khi gặp xung đột. A* không có trail nên dùng best(ứng viên): biến có điểm cao nhất
+trong vài biến tự do của một mệnh đề, chỉ tra điểm chứ không sắp xếp lại.
+"""
+import heapq
+from collections import defaultdict
+
+from compact_cnf import as_compact
+
+HEURISTICS = ("freq", "bridge", "vsids", "domwdeg")
+
+
+class BranchingHeuristic:
+    def __init__(self, variables, value=None):
+        self.variables = list(variables)
+        size = max(self.variables) + 1 if self.variables else 1
+        self.score = [0.0] * size
+        self.value = value
+        self.heap = []
+
+    def _build_heap(self):
+        if self.value is None:
+            return
+        value = self.value
+        self.heap = [(-self.score[v], v) for v in self.variables if value[v] == 0]
+        heapq.heapify(self.heap)
+
+    def pick(self):
+        """Lấy biến chưa gán có điểm cao nhất ra khỏi heap; None nếu mọi biến đã được gán."""
+        heap = self.heap
+        value = self.value
+        while heap:
+            _, var = heapq.heappop(heap)
+            if value[var] == 0:
+                return var
+        return None
+
+    def unassign(self, var):
+        heapq.heappush(self.heap, (-self.score[var], var))
+
+    def bump(self, var):
+        pass
+
+    def decay(self):
+        pass
+
+    def on_conflict(self, clause):
+        for lit in clause:
+            self.bump(abs(lit))
+        self.decay()
+
+    def best(self, candidates):
+        """Biến có điểm cao nhất trong 'candidates' (bằng nhau thì biến nhỏ trước)."""
+        score = self.score
+        return max(candidates, key=lambda v: (score[v], -v))
+
+
+class StaticOrder(BranchingHeuristic):
+    """
+    Thứ tự cố định: con trỏ 'pos' chỉ tiến lên khi chọn biến và lùi về khi một biến
+    đứng trước nó bị hủy gán, nên mỗi lần chọn có chi phí khấu hao O(1).
+    """
+
+    def __init__(self, variables, value=None, order=()):
+        super().__init__(variables, value)
+        self.order = list(order)
+        self.rank = [0] * len(self.score)
+        for idx, var in enumerate(self.order):
+            self.rank[var] = idx
+            self.score[var] = -idx
+        self.pos = 0
+
+    def pick(self):
+        value = self.value
+        order = self.order
+        while self.pos < len(order):
+            var = order[self.pos]
+            if value[var] == 0:
+                return var
+            self.pos += 1
+        return None
+
+    def unassign(self, var):
+        if self.rank[var] < self.pos:
+            self.pos = self.rank[var]
+
+    def on_conflict(self, clause):
+        pass
+
+
+class VSIDS(BranchingHeuristic):
+    def __init__(self, variables, value=None, decay=0.95):
+        super().__init__(variables, value)
+        self.inc = 1.0
+        self.decay_factor = decay
+        self._build_heap()
+
+    def bump(self, var):
+        score = self.score
+        score[var] += self.inc
+        if score[var] > 1e100:
+            for v in self.variables:
+                score[v] *= 1e-100
+            self.inc *= 1e-100
+            self._build_heap()
+        elif self.value is not None and self.value[var] == 0:
+            heapq.heappush(self.heap, (-score[var], var))
+
+    def decay(self):
+        self.inc /= self.decay_factor
+
+
+class DomWdeg(BranchingHeuristic):
+    def __init__(self, variables, value=None, cnf=()):
+        super().__init__(variables, value)
+        # Mọi mệnh đề có trọng số 1: wdeg ban đầu là bậc của biến
+        cnf = as_compact(cnf)
+        for var in self.variables:
+            self.score[var] += cnf.frequency(var)
+        self._build_heap()
+
+    def bump(self, var):
+        self.score[var] += 1
+        if self.value is not None and self.value[var] == 0:
+            heapq.heappush(self.heap, (-self.score[var], var))
+
+
+def frequency_order(variables, cnf):
+    """Các biến theo số lần xuất hiện giảm dần (bằng nhau thì biến nhỏ trước)."""
+    cnf = as_compact(cnf)
+    return sorted(variables, key=lambda v: (-cnf.frequency(v), v))
+
+
+def bridge_var_order(hashi_cnf):
+    """
+    Thứ tự tĩnh của các biến cầu: cầu nối các đảo ít "dư địa" nhất trước. Dư địa của
+    đảo là sức chứa tối đa (2 x số cầu có thể) trừ số trên đảo; đảo có dư địa 0 thì
+    mọi cầu đều bị ép buộc. Với mỗi cầu, X1 đứng ngay trước X2.
+    """
+    grid = hashi_cnf.grid
+    bridges = {}
+    degree = defaultdict(int)
+    for (kind, a, b), var in hashi_cnf.hash.items():
+        if kind == "X1" and a < b:
+            bridges[(a, b)] = var
+            degree[a] += 1
+            degree[b] += 1
+    slack = {island: 2 * degree[island] - grid[island[0]][island[1]] for island in degree}
+
+    ordered = sorted(
+        bridges.items(),
+        key=lambda item: (min(slack[item[0][0]], slack[item[0][1]]), slack[item[0][0]] + slack[item[0][1]], item[1]),
+    )
+    order = []
+    for _, var in ordered:
+        order.extend((var, var + 1))
+    return order
+
+
+def make_heuristic(name, variables, value=None, cnf=(), bridge_order=None):
+    """
+    Tạo heuristic theo tên (một trong HEURISTICS) cho danh sách biến 'variables'.
+    'bridge_order' (bridge_var_order) bắt buộc với "bridge"; các biến không có trong đó
+    (biến phụ, hoặc biến cầu đã bị tiền xử lý loại) xếp sau theo tần suất.
+    """
+    if name == "freq":
+        return StaticOrder(variables, value, frequency_order(variables, cnf))
+    if name == "bridge":
+        if bridge_order is None:
+            raise ValueError("Heuristic 'bridge' cần thứ tự biến cầu (bridge_var_order)")
+        known = set(variables)
+        head = [var for var in dict.fromkeys(bridge_order) if var in known]
+        placed = set(head)
+        rest = [var for var in frequency_order(variables, cnf) if var not in placed]
+        return StaticOrder(variables, value, head + rest)
+    if name == "vsids":
+        return VSIDS(variables, value)
+    if name == "domwdeg":
+        return DomWdeg(variables, value, cnf)
+    raise ValueError(f"Heuristic không hợp lệ: {name}")
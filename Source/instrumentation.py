@@ -0,0 +1,63 @@
+"""
+Giao diện thống kê dùng chung cho các solver.
+
+Mỗi solver kế thừa Instrumented và khai báo STATS: tên các bộ đếm (thuộc tính số
+nguyên) mà nó cập nhật trong lúc giải, chọn trong các tên chung sau để dễ so sánh:
+
+    nodes            số nút được mở rộng (A*, Bridge CP)
+    decisions        số lần chọn giá trị cho một biến
+    propagations     số phép gán được suy ra bởi lan truyền
+    conflicts        số lần gặp xung đột / quay lui
+    restarts         số lần khởi động lại (CDCL)
+    max_frontier     kích thước lớn nhất của heap / ngăn xếp
+    visited          số trạng thái trong bảng visited
+    clauses_scanned  số mệnh đề được duyệt khi lan truyền / tính heuristic
+    attempts         số phép gán được thử (Brute Force)
+
+get_stats() trả về dict các bộ đếm này (solver có thể bổ sung thêm khóa riêng).
+set_progress_callback(callback, interval) đăng ký hàm callback(stats) được gọi
+định kỳ, sau mỗi 'interval' đơn vị công việc chính của solver (nút, quyết định,
+vòng tinh chỉnh); Brute Force báo sau mỗi 64 khối phép gán.
+"""
+import cProfile
+import io
+import pstats
+
+
+class Instrumented:
+    STATS = ()
+    progress_callback = None
+    progress_interval = 1000
+
+    def reset_stats(self):
+        for name in self.STATS:
+            setattr(self, name, 0)
+
+    def get_stats(self):
+        return {name: getattr(self, name, 0) for name in self.STATS}
+
+    def set_progress_callback(self, callback, interval=1000):
+        self.progress_callback = callback
+        self.progress_interval = max(1, int(interval))
+
+    def _report_progress(self):
+        self.progress_callback(self.get_stats())
+
+
+def profile_call(func, profile_path=None, top=20):
+    """
+    Chạy func() dưới cProfile. Nếu có 'profile_path', dữ liệu thô được ghi ra file
+    (đọc lại bằng pstats hoặc snakeviz). Trả về (kết quả của func, bảng 'top' hàm
+    tốn thời gian nhất theo cumulative time dưới dạng chuỗi).
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = func()
+    finally:
+        profiler.disable()
+    if profile_path:
+        profiler.dump_stats(profile_path)
+    buffer = io.StringIO()
+    pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(top)
+    return result, buffer.getvalue()
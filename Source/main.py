@@ -1,54 +1,212 @@
 import time
-import psutil
+import tracemalloc
+from functools import partial
 
-from hashiwokakero_cnf import HashiwokakeroCNF
-from pysat_solver import PySATSolver
+from cnf_cache import load_or_encode
+from heuristics import bridge_var_order
+from instrumentation import profile_call
+from pysat_solver import PySATSolver, DEFAULT_PORTFOLIO
 from astar_solver import AStarSolver
 from backtracking_solver import BacktrackingSolver
 from bruteforce_solver import BruteForceSolver
+from cdcl_solver import CDCLSolver
+from bridge_solver import BridgeSolver
+from preprocess import PreprocessedSolver
+from solution_cache import SolutionCache
 
 # Import các hàm từ utils.py
 from utils import (
     choose_input_file,
+    edges_to_text,
     read_input_from_file,
+    solution_edge_list,
+    solution_to_json,
     solution_to_text,
+    write_json_output,
     write_output_to_file
 )
 
-def run_solver(name, solver_cls, cnf, grid, hashi_cnf):
+# Giới hạn thời gian (giây) khi tính backbone cho gợi ý
+HINT_TIME_BUDGET = 30
+# Lần chạy dưới tracemalloc chậm hơn lần chạy đo thời gian khoảng chừng này lần
+TRACEMALLOC_SLOWDOWN = 4
+
+def solver_entries(grid, hashi_cnf, jobs=None, preprocess=False, heuristic=None):
     """
-    Hàm tiện ích để chạy solver theo class (solver_cls) truyền vào,
-    đo thời gian, bộ nhớ và trả về kết quả + thống kê để ghi ra file.
+    Danh sách các solver theo tên ngắn (dùng cho dòng lệnh / chế độ batch).
+    Mỗi mục gồm (tên hiển thị, solver_cls, dữ liệu đầu vào của solver).
+    'jobs' là số tiến trình Brute Force / cube-and-conquer được phép dùng (None = tất cả CPU).
+    Nếu 'preprocess' bật, các solver CNF chạy trên CNF đã tiền xử lý (preprocess.py);
+    các biến cầu được đóng băng để mô hình trả về vẫn đọc được qua hashi_cnf.hash.
+    'heuristic' (xem heuristics.py) thay heuristic chọn biến mặc định của A*,
+    Backtracking và CDCL.
     """
-    process = psutil.Process()
-    start_time = time.time()
-    start_mem = process.memory_info().rss
+    cnf = hashi_cnf.get_cnf()
+    entries = {
+        "astar": ("A*", AStarSolver, cnf),
+        # pySAT chạy ở chế độ lười để đảm bảo mạng cầu liên thông
+        "pysat": ("pySAT", partial(PySATSolver, hashi_cnf=hashi_cnf), cnf),
+        # Nhiều backend pySAT chạy đua song song, lấy câu trả lời đầu tiên
+        "portfolio": ("pySAT portfolio", partial(PySATSolver, hashi_cnf=hashi_cnf, portfolio=DEFAULT_PORTFOLIO), cnf),
+        "backtracking": ("Backtracking", BacktrackingSolver, cnf),
+        # Backtracking song song: lookahead chia cube trên các biến cầu, giải bằng nhiều tiến trình
+        "cube": ("Backtracking cube-and-conquer",
+                 partial(BacktrackingSolver, jobs=jobs, bridge_order=bridge_var_order(hashi_cnf)), cnf),
+        "bruteforce": ("Brute Force", partial(BruteForceSolver, jobs=jobs), cnf),
+        "cdcl": ("CDCL", CDCLSolver, cnf),
+        "bridge": ("Bridge CP", BridgeSolver, grid),
+    }
+    if heuristic:
+        bridge_order = bridge_var_order(hashi_cnf)
+        for key in ("astar", "backtracking", "cube", "cdcl"):
+            name, solver_cls, solver_input = entries[key]
+            entries[key] = (name, partial(solver_cls, heuristic=heuristic, bridge_order=bridge_order), solver_input)
+    if preprocess:
+        frozen = set(hashi_cnf.hash.values())
+        for key, (name, solver_cls, solver_input) in entries.items():
+            if solver_input is cnf:
+                entries[key] = (name, partial(PreprocessedSolver, solver_cls=solver_cls, frozen=frozen), cnf)
+    return entries
 
-    solver = solver_cls(cnf)
-    solution = solver.solve()
 
-    end_time = time.time()
-    end_mem = process.memory_info().rss
+def uses_subprocesses(solver):
+    """True nếu solver giải trong các tiến trình con (portfolio, cube-and-conquer, pool Brute Force)."""
+    return bool(getattr(solver, "portfolio", None)) or (getattr(solver, "jobs", 1) or 1) > 1
+
+
+def peak_memory_mb(solver_cls, cnf):
+    """Bộ nhớ đỉnh (MB) của một lần khởi tạo + giải riêng, đo bằng tracemalloc."""
+    tracemalloc.start()
+    try:
+        solver_cls(cnf).solve()
+        _, peak_mem = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak_mem / (1024 * 1024)
+
+
+def measure_solver(solver_cls, cnf, profile_path=None, memory=True, memory_deadline=None):
+    """
+    Khởi tạo và chạy solver, đo thời gian bằng perf_counter. Bộ nhớ đỉnh được đo ở
+    một lần chạy riêng dưới tracemalloc (như benchmark.py) để không làm sai lệch thời gian.
+    Trả về (solver, solution, duration_ms, mem_used_mb).
+
+    mem_used_mb là None khi không đo: 'memory' = False, solver hết giờ, solver chạy
+    trong tiến trình con (tracemalloc không thấy bộ nhớ của chúng), hoặc lần chạy đo bộ
+    nhớ (chậm hơn vài lần) không kịp xong trước 'memory_deadline' (mốc perf_counter).
+    Đây là số đo của một lần chạy; dùng benchmark.py để có số liệu lặp lại, median/p95.
+    Nếu có 'profile_path', lần chạy được đo bằng cProfile và ghi ra file đó (thời gian
+    đo được khi đó bao gồm cả chi phí của profiler).
+    """
+    start_time = time.perf_counter()
+
+    solver = solver_cls(cnf)
+    if profile_path:
+        solution, _ = profile_call(solver.solve, profile_path)
+    else:
+        solution = solver.solve()
 
+    end_time = time.perf_counter()
     duration_ms = (end_time - start_time) * 1000
-    mem_used_mb = (end_mem - start_mem) / (1024 * 1024)
 
+    # Brute Force trả về (None, thời gian) khi hết giới hạn thời gian / số lần thử
+    timed_out = isinstance(solution, tuple)
+    if timed_out:
+        solution = solution[0]
+
+    mem_used_mb = None
+    fits = memory_deadline is None or end_time + TRACEMALLOC_SLOWDOWN * (end_time - start_time) <= memory_deadline
+    if memory and fits and not timed_out and not uses_subprocesses(solver):
+        mem_used_mb = peak_memory_mb(solver_cls, cnf)
+    return solver, solution, duration_ms, mem_used_mb
+
+
+def solver_stats(solver):
+    """Bộ đếm của solver (get_stats), hoặc dict rỗng nếu solver không hỗ trợ."""
+    get_stats = getattr(solver, "get_stats", None)
+    return get_stats() if get_stats is not None else {}
+
+
+def format_stats(name, solver):
+    stats = solver_stats(solver)
+    if not stats:
+        return []
+    parts = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            value = "{" + ", ".join(f"{k}={v}" for k, v in value.items()) + "}"
+        parts.append(f"{key}={value}")
+    return [f"Thống kê ({name}): " + ", ".join(parts)]
+
+
+def format_result(name, solver, solution, duration_ms, mem_used_mb, grid, hashi_cnf):
+    """Trả về các dòng kết quả + thống kê của một solver để ghi ra file."""
     output_lines = []
     if solution:
         output_lines.append(f"=== {name} solution ===")
         map_lines = solution_to_text(grid, solution, hashi_cnf.hash)
         output_lines.extend(map_lines)
+        if getattr(solver, "refinements", 0):
+            output_lines.append(f"Số vòng tinh chỉnh liên thông ({name}): {solver.refinements}")
+        if getattr(solver, "winner", None):
+            output_lines.append(f"Backend thắng ({name}): {solver.winner}")
+        output_lines.extend(format_stats(name, solver))
         output_lines.append(f"Thời gian ({name}): {duration_ms:.4f} ms")
-        output_lines.append(f"Memory usage ({name}): {mem_used_mb:.4f} MB\n")
+        output_lines.append(_memory_line(name, mem_used_mb))
     else:
         msg = f"No solution found ({name})."
         output_lines.append(msg)
+        output_lines.extend(format_stats(name, solver))
         output_lines.append(f"Thời gian ({name}): {duration_ms:.4f} ms")
-        output_lines.append(f"Memory usage ({name}): {mem_used_mb:.4f} MB\n")
+        output_lines.append(_memory_line(name, mem_used_mb))
 
     return output_lines
 
 
+def _memory_line(name, mem_used_mb):
+    if mem_used_mb is None:
+        return f"Memory usage ({name}): không đo\n"
+    return f"Memory usage ({name}): {mem_used_mb:.4f} MB\n"
+
+
+def run_solver(name, solver_cls, cnf, grid, hashi_cnf, solutions=None, profile_path=None):
+    """
+    Hàm tiện ích để chạy solver theo class (solver_cls) truyền vào,
+    đo thời gian, bộ nhớ và trả về kết quả + thống kê để ghi ra file.
+    'cnf' là dữ liệu đầu vào của solver: danh sách mệnh đề với các bộ giải CNF,
+    hoặc chính lưới với BridgeSolver.
+    Nếu truyền dict 'solutions', danh sách cạnh của lời giải được lưu vào solutions[name].
+    Nếu có 'profile_path', dữ liệu cProfile của lần giải được ghi ra file đó.
+    """
+    solver, solution, duration_ms, mem_used_mb = measure_solver(solver_cls, cnf, profile_path)
+    if solutions is not None:
+        solutions[name] = solution_edge_list(solution, hashi_cnf.hash) if solution else None
+    return format_result(name, solver, solution, duration_ms, mem_used_mb, grid, hashi_cnf)
+
+
+def run_hints(cnf, grid, hashi_cnf, time_budget=HINT_TIME_BUDGET):
+    """
+    Gợi ý nước đi: tính backbone (các giá trị biến cầu giống nhau ở mọi lời giải) bằng
+    PySATSolver.backbone và vẽ các cầu bắt buộc. Tỉ lệ biến cầu bị ép buộc là thước
+    đo độ khó: đề có lời giải duy nhất luôn có tỉ lệ 100%.
+    """
+    solver = PySATSolver(cnf, hashi_cnf=hashi_cnf)
+    start = time.perf_counter()
+    result = solver.backbone(time_budget=time_budget)
+    duration_ms = (time.perf_counter() - start) * 1000
+    if result is None:
+        return ["No solution found (Backbone).", f"Thời gian (Backbone): {duration_ms:.4f} ms\n"]
+    forced, complete = result
+    bridge_var_count = len(set(hashi_cnf.hash.values()))
+    output_lines = ["=== Backbone: các cầu bắt buộc ==="]
+    output_lines.extend(solution_to_text(grid, forced, hashi_cnf.hash))
+    output_lines.append(f"Biến cầu bị ép buộc: {len(forced)}/{bridge_var_count}"
+                        + ("" if complete else " (hết thời gian, kết quả một phần)"))
+    output_lines.extend(format_stats("Backbone", solver))
+    output_lines.append(f"Thời gian (Backbone): {duration_ms:.4f} ms\n")
+    return output_lines
+
+
 def main():
     # Bước 1: Cho người dùng chọn file input
     input_file = choose_input_file()
@@ -58,9 +216,27 @@ def main():
     # Bước 2: Đọc dữ liệu từ file
     grid = read_input_from_file(input_file)
 
-    # Bước 3: Xây dựng CNF
-    hashi_cnf = HashiwokakeroCNF(grid)
+    # Đề (hoặc một bản xoay / lật của nó) đã được giải trước đó: lấy lời giải từ cache,
+    # không cần mã hóa CNF hay chạy solver
+    solution_cache = SolutionCache()
+    cached = solution_cache.get(grid)
+    if cached is not None:
+        edges, cached_by = cached
+        print(f"Đề đã có lời giải trong cache (giải bởi {cached_by}), bỏ qua mã hóa và giải.")
+        output_lines = [f"=== Cached solution ({cached_by}) ==="] + edges_to_text(grid, edges)
+        write_output_to_file(input_file, output_lines)
+        write_json_output(input_file, solution_to_json(grid, {"cache": edges}))
+        return
+
+    # Bước 3: Suy luận các cầu bị ép buộc rồi xây dựng CNF cho phần còn lại
+    # (hoặc nạp từ cache trên đĩa nếu lưới đã từng được mã hóa)
+    hashi_cnf = load_or_encode(grid, deduce=True)
     cnf = hashi_cnf.get_cnf()
+    bridge_var_count = len(set(hashi_cnf.hash.values()))
+    print(f"Suy luận trước đã cố định {len(hashi_cnf.fixed)}/{bridge_var_count} biến cầu.\n")
+
+    # pySAT chạy ở chế độ lười để đảm bảo mạng cầu liên thông
+    pysat_connected = partial(PySATSolver, hashi_cnf=hashi_cnf)
 
     # Menu để người dùng chọn thuật toán
     while True:
@@ -69,40 +245,61 @@ def main():
         print("2. pySAT")
         print("3. Backtracking")
         print("4. Brute Force")
-        print("5. Giải tất cả (A*, pySAT, Backtracking, Brute Force)")
+        print("5. CDCL")
+        print("6. Bridge CP (lan truyền ràng buộc trên đảo)")
+        print("7. Giải tất cả (A*, pySAT, Backtracking, Brute Force, CDCL, Bridge CP)")
+        print("8. Gợi ý: các cầu bắt buộc (backbone)")
         print("0. Thoát")
 
         choice = input("Lựa chọn của bạn: ")
 
         # Chuỗi output để ghi ra file
         output_lines = []
+        solutions = {}
 
         if choice == '1':
             # Giải bằng A*
-            output_lines = run_solver("A*", AStarSolver, cnf, grid, hashi_cnf)
+            output_lines = run_solver("A*", AStarSolver, cnf, grid, hashi_cnf, solutions)
             break
 
         elif choice == '2':
             # Giải bằng pySAT
-            output_lines = run_solver("pySAT", PySATSolver, cnf, grid, hashi_cnf)
+            output_lines = run_solver("pySAT", pysat_connected, cnf, grid, hashi_cnf, solutions)
             break
 
         elif choice == '3':
             # Giải bằng Backtracking
-            output_lines = run_solver("Backtracking", BacktrackingSolver, cnf, grid, hashi_cnf)
+            output_lines = run_solver("Backtracking", BacktrackingSolver, cnf, grid, hashi_cnf, solutions)
             break
 
         elif choice == '4':
             # Giải bằng Brute Force
-            output_lines = run_solver("Brute Force", BruteForceSolver, cnf, grid, hashi_cnf)
+            output_lines = run_solver("Brute Force", BruteForceSolver, cnf, grid, hashi_cnf, solutions)
             break
 
         elif choice == '5':
+            # Giải bằng CDCL
+            output_lines = run_solver("CDCL", CDCLSolver, cnf, grid, hashi_cnf, solutions)
+            break
+
+        elif choice == '6':
+            # Giải bằng lan truyền ràng buộc trên đảo, không dùng CNF
+            output_lines = run_solver("Bridge CP", BridgeSolver, grid, grid, hashi_cnf, solutions)
+            break
+
+        elif choice == '7':
             # Giải tất cả
-            output_lines.extend(run_solver("A*", AStarSolver, cnf, grid, hashi_cnf))
-            output_lines.extend(run_solver("pySAT", PySATSolver, cnf, grid, hashi_cnf))
-            output_lines.extend(run_solver("Backtracking", BacktrackingSolver, cnf, grid, hashi_cnf))
-            output_lines.extend(run_solver("Brute Force", BruteForceSolver, cnf, grid, hashi_cnf))
+            output_lines.extend(run_solver("A*", AStarSolver, cnf, grid, hashi_cnf, solutions))
+            output_lines.extend(run_solver("pySAT", pysat_connected, cnf, grid, hashi_cnf, solutions))
+            output_lines.extend(run_solver("Backtracking", BacktrackingSolver, cnf, grid, hashi_cnf, solutions))
+            output_lines.extend(run_solver("Brute Force", BruteForceSolver, cnf, grid, hashi_cnf, solutions))
+            output_lines.extend(run_solver("CDCL", CDCLSolver, cnf, grid, hashi_cnf, solutions))
+            output_lines.extend(run_solver("Bridge CP", BridgeSolver, grid, grid, hashi_cnf, solutions))
+            break
+
+        elif choice == '8':
+            # Các cầu có cùng giá trị trong mọi lời giải
+            output_lines = run_hints(cnf, grid, hashi_cnf)
             break
 
         elif choice == '0':
@@ -113,8 +310,12 @@ def main():
             continue
 
     # ------------ Ghi kết quả ra file ------------
-    final_content = "\n".join(output_lines) + "\n"
-    write_output_to_file(input_file, final_content)
+    write_output_to_file(input_file, output_lines)
+    write_json_output(input_file, solution_to_json(grid, solutions))
+    # Lưu lời giải hợp lệ đầu tiên (liên thông, đủ số cầu) để dùng lại cho đề này và các bản xoay / lật
+    for name, edges in solutions.items():
+        if edges and solution_cache.put(grid, edges, name):
+            break
     print("Kết quả đã được ghi ra file output tương ứng.")
 
 
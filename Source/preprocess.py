@@ -0,0 +1,280 @@
+"""
+Tiền xử lý CNF dùng chung cho mọi solver, đặt giữa HashiwokakeroCNF.get_cnf() và solver:
+
+  - lan truyền mệnh đề đơn (unit propagation) dựa trên danh sách xuất hiện,
+  - loại literal thuần (pure literal),
+  - loại mệnh đề bị bao hàm (subsumption) và rút gọn mệnh đề (self-subsumption),
+  - khử biến có giới hạn (bounded variable elimination, BVE).
+
+Các biến "đóng băng" (frozen, thường là biến cầu X1/X2) không bị khử và không bị
+loại như literal thuần, để các ràng buộc nằm ngoài CNF (mệnh đề cắt liên thông của
+PySATSolver, ràng buộc cardinality gốc) vẫn dùng được chúng.
+
+Mỗi bước làm mất thông tin về mô hình được ghi vào ngăn xếp tái dựng (pivot, mệnh đề);
+extend_model() duyệt ngược ngăn xếp để mở rộng mô hình của CNF đã rút gọn thành mô hình
+đầy đủ của CNF gốc.
+"""
+from collections import defaultdict
+
+
+class CNFPreprocessor:
+    def __init__(self, cnf, frozen=(), max_resolvent=16, max_occurrences=10):
+        """
+        'max_resolvent': độ dài tối đa của một mệnh đề giải (resolvent) khi khử biến.
+        'max_occurrences': chỉ thử khử biến xuất hiện ở mỗi dấu không quá số lần này.
+        """
+        self.frozen = set(frozen)
+        self.max_resolvent = max_resolvent
+        self.max_occurrences = max_occurrences
+
+        self.variables = sorted({abs(lit) for clause in cnf for lit in clause})
+        self.clauses = []  # None = mệnh đề đã bị xóa
+        self.occ = defaultdict(set)
+        self.fixed = {}  # biến -> literal đã được gán ở mức 0
+        self.stack = []  # ngăn xếp tái dựng: (pivot, mệnh đề)
+        self.units = []
+        self.unsat = False
+        self.stats = {
+            "units": 0, "pure": 0, "subsumed": 0,
+            "strengthened": 0, "eliminated": 0,
+        }
+
+        for clause in cnf:
+            clause = set(clause)
+            if any(-lit in clause for lit in clause):
+                continue  # mệnh đề luôn đúng
+            self._add_clause(clause)
+
+    # ------------------------------------------------------------------
+    # Quản lý mệnh đề và danh sách xuất hiện
+
+    def _add_clause(self, clause):
+        if not clause:
+            self.unsat = True
+            return None
+        if len(clause) == 1:
+            self.units.append(next(iter(clause)))
+        idx = len(self.clauses)
+        self.clauses.append(clause)
+        for lit in clause:
+            self.occ[lit].add(idx)
+        return idx
+
+    def _remove_clause(self, idx):
+        for lit in self.clauses[idx]:
+            self.occ[lit].discard(idx)
+        self.clauses[idx] = None
+
+    def _strengthen(self, idx, lit):
+        """Bỏ literal 'lit' khỏi mệnh đề idx."""
+        clause = self.clauses[idx]
+        clause.discard(lit)
+        self.occ[lit].discard(idx)
+        if not clause:
+            self.unsat = True
+        elif len(clause) == 1:
+            self.units.append(next(iter(clause)))
+
+    # ------------------------------------------------------------------
+    # Các bước tiền xử lý
+
+    def propagate(self):
+        """Lan truyền các mệnh đề đơn; trả về False nếu gặp mâu thuẫn."""
+        while self.units and not self.unsat:
+            lit = self.units.pop()
+            var = abs(lit)
+            if var in self.fixed:
+                if self.fixed[var] != lit:
+                    self.unsat = True
+                continue
+            self.fixed[var] = lit
+            self.stack.append((lit, (lit,)))
+            self.stats["units"] += 1
+            for idx in list(self.occ[lit]):
+                self._remove_clause(idx)
+            for idx in list(self.occ[-lit]):
+                self._strengthen(idx, -lit)
+        return not self.unsat
+
+    def eliminate_pure_literals(self):
+        changed = False
+        for var in self.variables:
+            if var in self.frozen or var in self.fixed:
+                continue
+            pos, neg = self.occ[var], self.occ[-var]
+            if pos and not neg:
+                lit = var
+            elif neg and not pos:
+                lit = -var
+            else:
+                continue
+            self.stack.append((lit, (lit,)))
+            for idx in list(self.occ[lit]):
+                self._remove_clause(idx)
+            self.stats["pure"] += 1
+            changed = True
+        return changed
+
+    def subsume(self):
+        """
+        Với mỗi mệnh đề C (ngắn trước): xóa các mệnh đề chứa C, và với mỗi literal l
+        của C, bỏ -l khỏi các mệnh đề D mà C \\ {l} ⊆ D (self-subsumption).
+        """
+        changed = False
+        order = sorted(
+            (idx for idx, clause in enumerate(self.clauses) if clause is not None),
+            key=lambda idx: len(self.clauses[idx]),
+        )
+        for idx in order:
+            clause = self.clauses[idx]
+            if clause is None:
+                continue
+            # Ứng viên bị bao hàm phải chứa literal ít xuất hiện nhất của C
+            lit = min(clause, key=lambda l: len(self.occ[l]))
+            for other in list(self.occ[lit]):
+                if other != idx and len(self.clauses[other]) >= len(clause) and clause <= self.clauses[other]:
+                    self._remove_clause(other)
+                    self.stats["subsumed"] += 1
+                    changed = True
+            for lit in list(clause):
+                for other in list(self.occ[-lit]):
+                    target = self.clauses[other]
+                    if target is None or len(target) < len(clause):
+                        continue
+                    if all(l == lit or l in target for l in clause):
+                        self._strengthen(other, -lit)
+                        self.stats["strengthened"] += 1
+                        changed = True
+            if self.unsat:
+                break
+        return changed
+
+    def eliminate_variables(self):
+        """
+        Khử biến v bằng phép giải (resolution) nếu số mệnh đề giải không vượt quá số
+        mệnh đề chứa v. Các mệnh đề chứa v được đẩy vào ngăn xếp tái dựng.
+        """
+        changed = False
+        candidates = sorted(
+            (var for var in self.variables if var not in self.frozen and var not in self.fixed),
+            key=lambda var: len(self.occ[var]) * len(self.occ[-var]),
+        )
+        for var in candidates:
+            pos, neg = self.occ[var], self.occ[-var]
+            if not pos or not neg:
+                continue
+            if len(pos) > self.max_occurrences or len(neg) > self.max_occurrences:
+                continue
+
+            limit = len(pos) + len(neg)
+            resolvents = []
+            for p in pos:
+                for n in neg:
+                    resolvent = (self.clauses[p] | self.clauses[n]) - {var, -var}
+                    if any(-lit in resolvent for lit in resolvent):
+                        continue
+                    resolvents.append(resolvent)
+                    if len(resolvents) > limit or len(resolvent) > self.max_resolvent:
+                        break
+                else:
+                    continue
+                break
+            else:
+                # Lưu các mệnh đề của dấu ít xuất hiện hơn, rồi một mệnh đề đơn cho
+                # dấu còn lại: khi duyệt ngược, mệnh đề đơn đặt giá trị mặc định trước
+                if len(pos) <= len(neg):
+                    saved, pivot = pos, var
+                else:
+                    saved, pivot = neg, -var
+                for idx in saved:
+                    self.stack.append((pivot, tuple(self.clauses[idx])))
+                self.stack.append((-pivot, (-pivot,)))
+                for idx in list(pos | neg):
+                    self._remove_clause(idx)
+                for resolvent in resolvents:
+                    self._add_clause(set(resolvent))
+                self.stats["eliminated"] += 1
+                changed = True
+                if self.unsat or not self.propagate():
+                    break
+        return changed
+
+    def run(self, max_rounds=10):
+        """Lặp các bước cho đến khi không còn thay đổi; trả về CNF đã rút gọn (None nếu UNSAT)."""
+        for _ in range(max_rounds):
+            if not self.propagate():
+                return None
+            changed = self.eliminate_pure_literals()
+            changed |= self.subsume()
+            if not self.propagate():
+                return None
+            changed |= self.eliminate_variables()
+            if self.unsat:
+                return None
+            if not changed:
+                break
+        if not self.propagate():
+            return None
+        return self.simplified_cnf()
+
+    def simplified_cnf(self):
+        """
+        Các mệnh đề còn lại theo thứ tự ban đầu. Biến đóng băng đã bị gán được giữ lại
+        dưới dạng mệnh đề đơn để solver (và các ràng buộc bên ngoài) vẫn thấy chúng.
+        """
+        cnf = [sorted(clause, key=abs) for clause in self.clauses if clause is not None]
+        cnf.extend([lit] for var, lit in sorted(self.fixed.items()) if var in self.frozen)
+        return cnf
+
+    def extend_model(self, model):
+        """
+        Mở rộng mô hình của CNF rút gọn thành mô hình của CNF gốc: duyệt ngược ngăn xếp,
+        pivot được bật khi mệnh đề tương ứng chưa được các literal khác thỏa.
+        Trả về danh sách literal theo thứ tự biến tăng dần.
+        """
+        value = {abs(lit): lit > 0 for lit in model}
+        for pivot, clause in reversed(self.stack):
+            if not any(value.get(abs(lit), False) == (lit > 0) for lit in clause if lit != pivot):
+                value[abs(pivot)] = pivot > 0
+        variables = sorted(set(self.variables) | set(value))
+        return [var if value.get(var, False) else -var for var in variables]
+
+
+class PreprocessedSolver:
+    """
+    Bọc một solver CNF bất kỳ: tiền xử lý CNF, chạy solver trên CNF đã rút gọn rồi
+    tái dựng mô hình đầy đủ. Các thuộc tính khác (refinements, winner,
+    set_progress_callback, ...) được lấy từ solver bên trong.
+    """
+
+    def __init__(self, cnf, solver_cls, frozen=()):
+        self.preprocessor = CNFPreprocessor(cnf, frozen)
+        self.simplified = self.preprocessor.run()
+        self.solver = None
+        if self.simplified:
+            self.solver = solver_cls(self.simplified)
+
+    def __getattr__(self, name):
+        solver = self.__dict__.get("solver")
+        if solver is None:
+            raise AttributeError(name)
+        return getattr(solver, name)
+
+    def get_stats(self):
+        """Thống kê của solver bên trong, kèm số liệu của bước tiền xử lý."""
+        stats = self.solver.get_stats() if self.solver is not None else {}
+        stats["preprocess"] = dict(self.preprocessor.stats)
+        return stats
+
+    def solve(self):
+        if self.simplified is None:
+            return None
+        if self.solver is None:
+            # Mọi mệnh đề đã được thỏa trong lúc tiền xử lý
+            return self.preprocessor.extend_model([])
+
+        result = self.solver.solve()
+        # Brute Force trả về (None, thời gian) khi hết giới hạn; giữ nguyên dạng đó
+        if result is None or isinstance(result, tuple):
+            return result
+        return self.preprocessor.extend_model(result)
@@ -1,13 +1,327 @@
-from pysat.solvers import Solver
+import multiprocessing
+import queue as queue_module
+import time
 
-class PySATSolver:
-    def __init__(self, cnf):
+from pysat.solvers import Solver, SolverNames
+
+from instrumentation import Instrumented
+
+# Các backend PySAT nhận ràng buộc cardinality gốc (add_atmost)
+NATIVE_CARD_SOLVERS = ("mc", "gc3", "gc4")
+DEFAULT_NATIVE_SOLVER = "mc"
+# Các backend chạy đua trong chế độ portfolio: CaDiCaL, Glucose 4, MapleChrono, Lingeling, MiniSat
+DEFAULT_PORTFOLIO = ("cd19", "g4", "mcb", "lgl", "m22")
+
+
+def available_backends(names):
+    """Lọc ra các tên backend mà bản PySAT đang cài hỗ trợ (giữ nguyên thứ tự)."""
+    known = set()
+    for attr, aliases in vars(SolverNames).items():
+        if not attr.startswith("_"):
+            known.update(aliases)
+    return [name for name in names if name in known]
+
+
+def _portfolio_worker(results, cnf, hashi_cnf, solver_name):
+    """Chạy trong tiến trình con: giải bằng một backend và gửi (tên, model, thống kê, lỗi)."""
+    try:
+        solver = PySATSolver(cnf, hashi_cnf=hashi_cnf)
+        model = solver.solve(solver_name)
+        results.put((solver_name, model, solver.get_stats(), None))
+    except Exception as exc:
+        results.put((solver_name, None, {}, repr(exc)))
+
+
+class PySATSolver(Instrumented):
+    STATS = ("refinements", "backbone_checks")
+
+    def __init__(self, cnf, hashi_cnf=None, portfolio=None):
+        """
+        Nếu truyền 'hashi_cnf' (đối tượng HashiwokakeroCNF), solver chạy ở chế độ
+        lười: ràng buộc liên thông được thêm dần bằng các mệnh đề cắt.
+        Nếu hashi_cnf được mã hóa với card_encoding="native", ràng buộc tổng của
+        các đảo được đưa thẳng vào Minicard/Gluecard thay vì mệnh đề.
+        Nếu truyền 'portfolio' (danh sách tên backend), solve() cho các backend chạy
+        đua trong các tiến trình riêng; backend trả lời đầu tiên được lưu trong self.winner.
+        """
         self.cnf = cnf
+        self.hashi_cnf = hashi_cnf
+        self.portfolio = portfolio
+        self.refinements = 0
+        self.backbone_checks = 0
+        self.winner = None
+        # Thống kê của backend (accum_stats): restarts, conflicts, decisions, propagations
+        self.sat_stats = {}
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update(self.sat_stats)
+        return stats
+
+    def _collect_sat_stats(self, solver):
+        try:
+            self.sat_stats = dict(solver.accum_stats() or {})
+        except (AttributeError, NotImplementedError):
+            self.sat_stats = {}
+
+    def solve(self, solver_name=None):
+        if self.portfolio and solver_name is None:
+            return self.solve_portfolio(self.portfolio)
+
+        if self.hashi_cnf is not None:
+            return self.solve_connected(solver_name)
+
+        solver_name = solver_name or "g3"
 
-    def solve(self, solver_name="g3"):
         solver = Solver(name=solver_name)
-        for clause in self.cnf:
-            solver.add_clause(clause)
-        if solver.solve():
-            return solver.get_model()
+        try:
+            for clause in self.cnf:
+                solver.add_clause(clause)
+            if solver.solve():
+                return solver.get_model()
+            return None
+        finally:
+            self._collect_sat_stats(solver)
+            solver.delete()
+
+    def solve_connected(self, solver_name=None):
+        """
+        Giữ một solver tăng dần (incremental) duy nhất và tinh chỉnh bằng mệnh đề
+        cắt (xem _next_connected) mà không dựng lại solver.
+        Số vòng tinh chỉnh được lưu trong self.refinements.
+        """
+        edges = self._bridge_edges()
+        self.refinements = 0
+
+        solver = self._create_solver(solver_name)
+        try:
+            return self._next_connected(solver, edges)
+        finally:
+            self._collect_sat_stats(solver)
+            solver.delete()
+
+    def iter_solutions(self, limit=None, solver_name=None):
+        """
+        Sinh lần lượt các lời giải (liên thông nếu có hashi_cnf) trên cùng một solver
+        tăng dần. Sau mỗi lời giải, một mệnh đề chặn chỉ trên các biến cầu X1/X2 của
+        hashi_cnf.hash được thêm vào, nên hai lời giải chỉ khác nhau ở biến phụ của
+        ràng buộc cardinality không bị đếm hai lần. Dừng sau 'limit' lời giải nếu có.
+        """
+        if self.hashi_cnf is not None:
+            edges = self._bridge_edges()
+            block_vars = sorted(set(self.hashi_cnf.hash.values()))
+        else:
+            edges = None
+            block_vars = None
+        self.refinements = 0
+
+        solver = self._create_solver(solver_name)
+        try:
+            count = 0
+            while limit is None or count < limit:
+                if edges is not None:
+                    model = self._next_connected(solver, edges)
+                else:
+                    model = solver.get_model() if solver.solve() else None
+                if model is None:
+                    return
+                count += 1
+                yield model
+
+                true_lits = set(model)
+                variables = block_vars if block_vars is not None else [abs(lit) for lit in model]
+                solver.add_clause([-var if var in true_lits else var for var in variables])
+        finally:
+            self._collect_sat_stats(solver)
+            solver.delete()
+
+    def is_unique(self, solver_name=None):
+        """True nếu đề có đúng một lời giải; dừng ngay khi tìm thấy lời giải thứ hai."""
+        return sum(1 for _ in self.iter_solutions(limit=2, solver_name=solver_name)) == 1
+
+    def backbone(self, time_budget=None, chunk_size=16, solver_name=None):
+        """
+        Backbone trên các biến cầu X1/X2 của hashi_cnf.hash: các literal có cùng giá trị
+        trong mọi lời giải liên thông, dùng cho gợi ý nước đi và chấm độ khó. Chỉ dùng
+        một solver tăng dần:
+          - mỗi mô hình tìm được loại khỏi tập ứng viên mọi literal mà nó làm sai;
+          - ứng viên được kiểm tra theo khối 'chunk_size' literal với assumptions là phủ
+            định của cả khối. SAT thì cả khối bị loại. UNSAT thì core cho biết những
+            phủ định nào gây mâu thuẫn: core một phần tử là literal backbone (được thêm
+            vào solver làm mệnh đề đơn), core lớn hơn được bỏ khỏi khối và kiểm tra
+            riêng từng literal sau.
+        'time_budget' (giây) được kiểm tra giữa các lần gọi solver; hết giờ thì dừng với
+        kết quả một phần. Trả về (danh sách literal backbone, True nếu đã kiểm tra hết
+        ứng viên), hoặc None nếu đề vô nghiệm.
+        """
+        if self.hashi_cnf is None:
+            raise ValueError("backbone cần hashi_cnf (các biến cầu X1/X2)")
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        edges = self._bridge_edges()
+        self.refinements = 0
+        self.backbone_checks = 0
+
+        solver = self._create_solver(solver_name)
+        try:
+            model = self._next_connected(solver, edges)
+            if model is None:
+                return None
+            true_lits = set(model)
+            queue = [var if var in true_lits else -var for var in sorted(set(self.hashi_cnf.hash.values()))]
+            candidates = set(queue)
+            retry = []
+            forced = []
+            while queue or retry:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return sorted(forced, key=abs), False
+                if queue:
+                    chunk = [lit for lit in queue[:chunk_size] if lit in candidates]
+                    del queue[:chunk_size]
+                else:
+                    chunk = [lit for lit in retry[-1:] if lit in candidates]
+                    del retry[-1:]
+
+                while chunk:
+                    self.backbone_checks += 1
+                    model = self._next_connected(solver, edges, [-lit for lit in chunk])
+                    if model is not None:
+                        true_lits = set(model)
+                        candidates = {lit for lit in candidates if lit in true_lits}
+                        break
+                    core = set(solver.get_core() or ())
+                    failed = [lit for lit in chunk if -lit in core]
+                    if len(chunk) == 1 or len(failed) == 1:
+                        lit = chunk[0] if len(chunk) == 1 else failed[0]
+                        forced.append(lit)
+                        candidates.discard(lit)
+                        solver.add_clause([lit])
+                        chunk.remove(lit)
+                    else:
+                        failed = failed or chunk
+                        retry.extend(failed)
+                        chunk = [lit for lit in chunk if lit not in failed]
+            return sorted(forced, key=abs), True
+        finally:
+            self._collect_sat_stats(solver)
+            solver.delete()
+
+    def _next_connected(self, solver, edges, assumptions=()):
+        """
+        Giải, tìm các thành phần liên thông của mạng cầu bằng union-find, thêm một
+        mệnh đề cắt cho mỗi thành phần bị tách rời rồi giải lại cho đến khi được một
+        lời giải liên thông. Mệnh đề cắt đúng với mọi lời giải liên thông nên có thể
+        giữ lại trong solver giữa các lần gọi (kể cả khi giải với 'assumptions').
+        Trả về None nếu không còn lời giải.
+        """
+        islands = self.hashi_cnf.islands
+        while solver.solve(assumptions=assumptions):
+            model = solver.get_model()
+            true_vars = {lit for lit in model if lit > 0}
+            components = self._components(islands, edges, true_vars)
+            if len(components) <= 1:
+                return model
+
+            self.refinements += 1
+            if self.progress_callback is not None and self.refinements % self.progress_interval == 0:
+                self._report_progress()
+            for component in components:
+                # Ít nhất một cầu phải nối thành phần này ra bên ngoài
+                cut = [var for a, b, var in edges if (a in component) != (b in component)]
+                if not cut:
+                    return None
+                solver.add_clause(cut)
         return None
+
+    def solve_portfolio(self, names=DEFAULT_PORTFOLIO, poll_interval=0.05):
+        """
+        Chạy mỗi backend trong một tiến trình riêng trên cùng CNF (mỗi tiến trình tự
+        tinh chỉnh liên thông nếu có hashi_cnf). Câu trả lời đầu tiên (có lời giải
+        hoặc UNSAT) được dùng, các tiến trình còn lại bị dừng ngay.
+        Backend thắng được lưu trong self.winner. Backend lỗi (ví dụ không có trong
+        bản PySAT đang cài) bị bỏ qua; nếu tất cả đều lỗi thì ném RuntimeError.
+        """
+        if getattr(self.hashi_cnf, "card_encoding", None) == "native":
+            # Chỉ các backend hỗ trợ add_atmost mới dùng được, tránh chạy trùng Minicard
+            names = [name for name in names if name in NATIVE_CARD_SOLVERS] or list(NATIVE_CARD_SOLVERS)
+        names = available_backends(names)
+        if not names:
+            raise RuntimeError("Không có backend PySAT nào khả dụng cho portfolio")
+
+        self.winner = None
+        self.refinements = 0
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=_portfolio_worker, args=(results, self.cnf, self.hashi_cnf, name), daemon=True
+            )
+            for name in names
+        ]
+        for process in processes:
+            process.start()
+
+        errors = []
+        try:
+            while len(errors) < len(processes):
+                try:
+                    name, model, stats, error = results.get(timeout=poll_interval)
+                except queue_module.Empty:
+                    # Tiến trình chết bất thường (ví dụ lỗi trong thư viện C) sẽ không gửi gì về
+                    if not any(p.is_alive() for p in processes) and results.empty():
+                        break
+                    continue
+                if error is not None:
+                    errors.append(f"{name}: {error}")
+                    continue
+                self.winner = name
+                self.refinements = stats.get("refinements", 0)
+                self.sat_stats = {k: v for k, v in stats.items() if k != "refinements"}
+                return model
+            raise RuntimeError("Mọi backend trong portfolio đều lỗi: " + "; ".join(errors))
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+            results.close()
+
+    def _create_solver(self, solver_name=None):
+        native = getattr(self.hashi_cnf, "card_encoding", None) == "native"
+        if native:
+            if solver_name not in NATIVE_CARD_SOLVERS:
+                solver_name = DEFAULT_NATIVE_SOLVER
+        solver = Solver(name=solver_name or "g3", bootstrap_with=self.cnf)
+        if native:
+            for lits, bound in self.hashi_cnf.cardinality_constraints():
+                # tổng = bound  <=>  tổng <= bound  và  tổng các phủ định <= len - bound
+                solver.add_atmost(lits, bound)
+                solver.add_atmost([-lit for lit in lits], len(lits) - bound)
+        return solver
+
+    def _bridge_edges(self):
+        edges = []
+        for (kind, a, b), var in self.hashi_cnf.hash.items():
+            if kind == "X1" and a < b:
+                edges.append((a, b, var))
+        return edges
+
+    @staticmethod
+    def _components(islands, edges, true_vars):
+        parent = {island: island for island in islands}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b, var in edges:
+            if var in true_vars:
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[ra] = rb
+
+        groups = {}
+        for island in islands:
+            groups.setdefault(find(island), set()).add(island)
+        return list(groups.values())
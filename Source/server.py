@@ -0,0 +1,384 @@
+"""
+Dịch vụ giải chạy lâu dài (asyncio), nhận yêu cầu dạng JSON theo dòng (JSON lines)
+qua Unix socket hoặc TCP, để frontend không phải gọi main.py cho mỗi đề.
+
+    python server.py --socket /tmp/hashi.sock --workers 4
+    python server.py --host 127.0.0.1 --port 8765
+
+Mỗi dòng gửi lên là một yêu cầu, mỗi dòng trả về là một kết quả (cùng "id"):
+
+    {"id": 1, "grid": "2, 0, 2\\n0, 0, 0\\n1, 0, 1", "solver": "pysat", "deadline": 5}
+    {"id": 1, "status": "solved", "bridges": [[0, 0, 0, 2, 1], ...], "lines": [...],
+     "solver": "pysat", "time_ms": 1.2, "latency_ms": 3.4, "coalesced": false, "stats": {...}}
+
+"grid" theo định dạng file đề (chuỗi nhiều dòng) hoặc danh sách các hàng; "solver"
+là một trong batch.SOLVER_NAMES (mặc định pysat); "deadline" tính bằng giây.
+Trạng thái: solved, no_solution, timeout, busy (quá giới hạn tải), error.
+Yêu cầu {"op": "metrics"} trả về số liệu độ trễ / thông lượng của dịch vụ.
+
+  - Các tiến trình giải được khởi động sẵn (đã import PySAT và giải thử một đề nhỏ)
+    và dùng lại cho mọi yêu cầu; tiến trình quá hạn bị dừng và thay bằng tiến trình mới.
+  - Các yêu cầu giống nhau (cùng lưới, solver) đang chạy được gộp thành một lần giải.
+    Lần giải bị hủy khi không còn yêu cầu nào chờ nó.
+  - Số lần giải đang chờ hoặc đang chạy bị giới hạn bởi --max-pending; yêu cầu vượt
+    quá được trả lời "busy" ngay thay vì xếp hàng vô hạn.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import statistics
+import time
+import traceback
+from collections import Counter, deque
+
+from batch import SOLVER_NAMES, kill_process_group, start_process_group
+from cnf_cache import load_or_encode
+from main import format_result, measure_solver, solver_entries, solver_stats
+from utils import parse_grid, solution_edge_list
+
+DEFAULT_DEADLINE = 10.0
+# Đề nhỏ dùng để làm nóng tiến trình giải (import PySAT, khởi tạo các solver)
+WARMUP_GRID = [[1, 0, 1]]
+
+
+def _solve_grid(grid, solver_key, deduce):
+    """Giải một đề trong tiến trình giải; trả về dict kết quả gửi cho client."""
+    hashi_cnf = load_or_encode(grid, deduce=deduce)
+    # Dịch vụ đã chạy nhiều tiến trình giải nên mỗi lần giải chỉ dùng một tiến trình
+    name, solver_cls, solver_input = solver_entries(grid, hashi_cnf, jobs=1)[solver_key]
+    solver, solution, duration_ms, mem_used_mb = measure_solver(solver_cls, solver_input, memory=False)
+    return {
+        "status": "solved" if solution else "no_solution",
+        "bridges": solution_edge_list(solution, hashi_cnf.hash) if solution else None,
+        "lines": format_result(name, solver, solution, duration_ms, mem_used_mb, grid, hashi_cnf),
+        "time_ms": duration_ms,
+        "stats": solver_stats(solver),
+    }
+
+
+def _worker_main(conn, deduce):
+    """Vòng lặp của tiến trình giải: nhận (lưới, solver) qua pipe, gửi kết quả về."""
+    start_process_group()
+    try:
+        _solve_grid(WARMUP_GRID, "pysat", deduce)
+    except Exception:
+        pass
+    while True:
+        try:
+            grid, solver_key = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = _solve_grid(grid, solver_key, deduce)
+        except Exception:
+            result = {"status": "error", "error": traceback.format_exc().strip().splitlines()[-1]}
+        conn.send(result)
+
+
+class _Worker:
+    """
+    Tiến trình giải không phải daemon (portfolio cần tạo tiến trình con) và nằm trong
+    nhóm tiến trình riêng: kill() dừng cả các backend / worker mà lần giải đang chạy
+    đã tạo ra; shutdown() đóng pipe để tiến trình tự thoát rồi join.
+    """
+
+    def __init__(self, deduce):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn, deduce))
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        kill_process_group(self.process)
+        self.conn.close()
+
+    def shutdown(self, timeout=1.0):
+        self.conn.close()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            kill_process_group(self.process)
+
+
+class WorkerPool:
+    """
+    Các tiến trình giải khởi động sẵn. run() chờ một tiến trình rảnh, gửi đề qua pipe
+    và chờ kết quả bằng add_reader (không chặn vòng lặp sự kiện). Nếu bị hủy hoặc
+    quá 'timeout', tiến trình bị dừng và thay bằng một tiến trình mới.
+    """
+
+    def __init__(self, size, deduce=False):
+        self.deduce = deduce
+        self.closed = False
+        self.workers = [_Worker(deduce) for _ in range(size)]
+        self.idle = asyncio.Queue()
+        for worker in self.workers:
+            self.idle.put_nowait(worker)
+
+    async def run(self, grid, solver_key, timeout):
+        loop = asyncio.get_running_loop()
+        worker = await self.idle.get()
+        future = loop.create_future()
+
+        def on_readable():
+            if future.done():
+                return
+            try:
+                future.set_result(worker.conn.recv())
+            except (EOFError, OSError) as exc:
+                future.set_exception(exc)
+
+        fd = worker.conn.fileno()
+        try:
+            worker.conn.send((grid, solver_key))
+            loop.add_reader(fd, on_readable)
+            result = await asyncio.wait_for(future, timeout)
+        except BaseException:
+            loop.remove_reader(fd)
+            self._replace(worker)
+            raise
+        loop.remove_reader(fd)
+        self.idle.put_nowait(worker)
+        return result
+
+    def _replace(self, worker):
+        worker.kill()
+        self.workers.remove(worker)
+        if self.closed:
+            # Lần giải bị hủy lúc dịch vụ đang tắt: không khởi động tiến trình thay thế
+            return
+        replacement = _Worker(self.deduce)
+        self.workers.append(replacement)
+        self.idle.put_nowait(replacement)
+
+    def close(self):
+        self.closed = True
+        for worker in self.workers:
+            worker.shutdown()
+
+
+class Metrics:
+    """Số yêu cầu theo trạng thái, độ trễ (p50/p95/p99 trên 'window' yêu cầu gần nhất) và thông lượng."""
+
+    def __init__(self, window=1000):
+        self.started = time.monotonic()
+        self.status = Counter()
+        self.coalesced = 0
+        self.latencies = deque(maxlen=window)
+        self.finished = deque(maxlen=window)
+
+    def record(self, status, latency_ms, coalesced):
+        self.status[status] += 1
+        if coalesced:
+            self.coalesced += 1
+        self.latencies.append(latency_ms)
+        self.finished.append(time.monotonic())
+
+    def snapshot(self, in_flight, pending):
+        now = time.monotonic()
+        latencies = sorted(self.latencies)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] if latencies else 0.0
+
+        last_minute = sum(1 for t in self.finished if now - t <= 60)
+        total = sum(self.status.values())
+        return {
+            "uptime_s": now - self.started,
+            "requests": total,
+            "status": dict(self.status),
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+            "pending": pending,
+            "latency_ms": {
+                "mean": statistics.fmean(latencies) if latencies else 0.0,
+                "p50": pct(50), "p95": pct(95), "p99": pct(99),
+            },
+            "throughput_rps": total / max(now - self.started, 1e-9),
+            "throughput_rps_1m": last_minute / min(60.0, max(now - self.started, 1e-9)),
+        }
+
+
+class SolveService:
+    def __init__(self, workers, max_pending=None, default_deadline=DEFAULT_DEADLINE, max_deadline=60.0,
+                 deduce=False):
+        self.pool = WorkerPool(workers, deduce)
+        self.max_pending = max_pending or workers * 4
+        self.default_deadline = default_deadline
+        self.max_deadline = max_deadline
+        self.metrics = Metrics()
+        # (solver, lưới) -> [task giải, số yêu cầu đang chờ]
+        self.in_flight = {}
+
+    async def solve(self, grid, solver_key, deadline):
+        key = (solver_key, tuple(tuple(row) for row in grid))
+        entry = self.in_flight.get(key)
+        coalesced = entry is not None
+        if entry is None:
+            if len(self.in_flight) >= self.max_pending:
+                return {"status": "busy"}, False
+            task = asyncio.ensure_future(self.pool.run(grid, solver_key, self.max_deadline))
+            entry = self.in_flight[key] = [task, 0]
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None) if self.in_flight.get(key) is entry else None)
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), deadline)
+        except asyncio.TimeoutError:
+            result = {"status": "timeout"}
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # Chính yêu cầu này bị hủy (ví dụ mất kết nối)
+                raise
+            # Lần giải dùng chung đã bị hủy; CancelledError là BaseException nên phải bắt riêng
+            result = {"status": "error", "error": "Lần giải đã bị hủy"}
+        except Exception as exc:
+            result = {"status": "error", "error": repr(exc)}
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                # Không còn ai chờ: hủy lần giải để giải phóng tiến trình. Gỡ khỏi in_flight
+                # ngay lúc đó để yêu cầu trùng đến sau bắt đầu lần giải mới thay vì chờ task đã hủy
+                if self.in_flight.get(key) is entry:
+                    del self.in_flight[key]
+                task.cancel()
+        return dict(result), coalesced
+
+    async def handle_request(self, request):
+        if request.get("op") == "metrics":
+            return {"id": request.get("id"), "metrics": self.metrics.snapshot(
+                sum(entry[1] for entry in self.in_flight.values()), len(self.in_flight))}
+
+        start = time.perf_counter()
+        solver_key = request.get("solver", "pysat")
+        coalesced = False
+        try:
+            if solver_key not in SOLVER_NAMES:
+                raise ValueError(f"Solver không hợp lệ: {solver_key}")
+            grid = request["grid"]
+            if isinstance(grid, str):
+                grid = parse_grid(grid)
+            if not grid or not grid[0] or any(len(row) != len(grid[0]) for row in grid):
+                raise ValueError("Lưới rỗng hoặc các hàng không cùng độ dài")
+            deadline = min(float(request.get("deadline", self.default_deadline)), self.max_deadline)
+            response, coalesced = await self.solve(grid, solver_key, deadline)
+        except (KeyError, TypeError, ValueError) as exc:
+            response = {"status": "error", "error": repr(exc)}
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.metrics.record(response["status"], latency_ms, coalesced)
+        response.update({"id": request.get("id"), "solver": solver_key, "latency_ms": latency_ms,
+                         "coalesced": coalesced})
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """Mỗi dòng là một yêu cầu; các yêu cầu trên cùng kết nối được xử lý đồng thời."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            try:
+                request = json.loads(line)
+            except ValueError as exc:
+                response = {"status": "error", "error": f"JSON không hợp lệ: {exc}"}
+            else:
+                if not isinstance(request, dict):
+                    response = {"status": "error", "error": "Yêu cầu phải là một đối tượng JSON"}
+                else:
+                    try:
+                        response = await self.handle_request(request)
+                    except Exception as exc:
+                        # Lỗi ngoài dự kiến vẫn phải có dòng trả lời, nếu không client sẽ chờ mãi
+                        response = {"status": "error", "id": request.get("id"), "error": repr(exc)}
+            async with write_lock:
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Dòng dài hơn giới hạn của StreamReader
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.CancelledError):
+            for task in tasks:
+                task.cancel()
+        finally:
+            writer.close()
+
+    def close(self):
+        for task, _ in list(self.in_flight.values()):
+            task.cancel()
+        self.pool.close()
+
+
+async def serve(args):
+    service = SolveService(args.workers, args.max_pending, args.deadline, args.max_deadline, args.deduce)
+    limit = args.max_request_bytes
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = await asyncio.start_unix_server(service.handle_connection, path=args.socket, limit=limit)
+        where = args.socket
+    else:
+        server = await asyncio.start_server(service.handle_connection, args.host, args.port, limit=limit)
+        where = f"{args.host}:{args.port}"
+    print(f"Dịch vụ giải đang chạy tại {where} với {args.workers} tiến trình giải.")
+    # SIGINT / SIGTERM dừng vòng phục vụ để khối finally tắt và join các tiến trình giải
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, main_task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dịch vụ giải Hashiwokakero (JSON lines qua Unix socket / TCP).")
+    parser.add_argument("--socket", default=None, help="Đường dẫn Unix socket (mặc định dùng TCP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Số tiến trình giải khởi động sẵn")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Số lần giải tối đa đang chờ / đang chạy (mặc định 4 x workers)")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE,
+                        help="Thời hạn mặc định (giây) của một yêu cầu")
+    parser.add_argument("--max-deadline", type=float, default=60.0,
+                        help="Thời hạn tối đa (giây) client được yêu cầu")
+    parser.add_argument("--max-request-bytes", type=int, default=4 * 1024 * 1024,
+                        help="Độ dài tối đa của một dòng yêu cầu")
+    parser.add_argument("--deduce", action="store_true",
+                        help="Suy luận các cầu bị ép buộc trên lưới trước khi mã hóa")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Cache lời giải trên đĩa, dùng chung cho mọi solver, bất biến theo 8 phép biến đổi
+của bàn cờ (nhóm nhị diện: 4 phép quay và 4 phép lật).
+
+Lưới được đưa về dạng chính tắc - phép biến đổi cho (kích thước, các giá trị theo
+hàng) nhỏ nhất theo thứ tự từ điển - nên một đề và mọi bản xoay / lật của nó dùng
+chung một mục. Lời giải được lưu dưới dạng danh sách cạnh [hàng1, cột1, hàng2, cột2,
+số cầu] trong tọa độ chính tắc và được đưa về tọa độ của đề bằng phép biến đổi ngược.
+
+Mỗi mục là một file JSON nhỏ; dung lượng thư mục bị giới hạn và các mục ít được dùng
+gần đây nhất (theo mtime, cập nhật mỗi lần đọc) bị xóa trước, giống cnf_cache.
+Chỉ lời giải hợp lệ (đủ số cầu, không cắt nhau, liên thông) mới được lưu.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from utils import evict_lru
+
+DEFAULT_CACHE_DIR = ".solution_cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Phép biến đổi ngược: quay 90 <-> quay 270, các phép còn lại tự nghịch đảo
+INVERSE = [0, 3, 2, 1, 4, 5, 6, 7]
+
+
+def transform_point(k, r, c, rows, cols):
+    """Ảnh của ô (r, c) trên lưới rows x cols qua phép biến đổi thứ k."""
+    if k == 0:
+        return r, c
+    if k == 1:  # quay 90 độ theo chiều kim đồng hồ
+        return c, rows - 1 - r
+    if k == 2:  # quay 180 độ
+        return rows - 1 - r, cols - 1 - c
+    if k == 3:  # quay 270 độ
+        return cols - 1 - c, r
+    if k == 4:  # lật trái - phải
+        return r, cols - 1 - c
+    if k == 5:  # lật trên - dưới
+        return rows - 1 - r, c
+    if k == 6:  # chuyển vị
+        return c, r
+    return cols - 1 - c, rows - 1 - r  # chuyển vị theo đường chéo phụ
+
+
+def transform_grid(grid, k):
+    rows, cols = len(grid), len(grid[0])
+    new_rows, new_cols = (rows, cols) if k in (0, 2, 4, 5) else (cols, rows)
+    result = [[0] * new_cols for _ in range(new_rows)]
+    for r in range(rows):
+        for c in range(cols):
+            nr, nc = transform_point(k, r, c, rows, cols)
+            result[nr][nc] = grid[r][c]
+    return result
+
+
+def transform_bridges(bridges, k, rows, cols):
+    """Biến đổi danh sách cạnh của lưới rows x cols; đầu nhỏ hơn luôn đứng trước."""
+    result = []
+    for r1, c1, r2, c2, count in bridges:
+        a = transform_point(k, r1, c1, rows, cols)
+        b = transform_point(k, r2, c2, rows, cols)
+        a, b = min(a, b), max(a, b)
+        result.append([a[0], a[1], b[0], b[1], count])
+    result.sort()
+    return result
+
+
+def canonical_form(grid):
+    """Trả về (lưới chính tắc, k) với k là phép biến đổi đưa 'grid' về dạng chính tắc."""
+    best, best_k, best_key = None, 0, None
+    for k in range(8):
+        candidate = transform_grid(grid, k)
+        key = (len(candidate), len(candidate[0]), candidate)
+        if best_key is None or key < best_key:
+            best, best_k, best_key = candidate, k, key
+    return best, best_k
+
+
+def canonical_key(canonical):
+    digest = hashlib.sha256()
+    digest.update(f"{len(canonical)}x{len(canonical[0])}|".encode())
+    digest.update(",".join(str(v) for row in canonical for v in row).encode())
+    return digest.hexdigest()
+
+
+def is_valid_solution(grid, bridges):
+    """
+    Kiểm tra danh sách cạnh là một lời giải đúng của đề: cầu thẳng hàng giữa hai đảo,
+    không đi qua đảo hay cắt nhau, 1-2 cầu mỗi cặp, tổng cầu bằng số trên đảo và
+    mạng cầu liên thông.
+    """
+    rows, cols = len(grid), len(grid[0])
+    islands = [(r, c) for r in range(rows) for c in range(cols) if grid[r][c] > 0]
+    degree = {island: 0 for island in islands}
+    used = set()  # các ô đã có cầu đi qua
+    parent = {island: island for island in islands}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    seen = set()
+    for r1, c1, r2, c2, count in bridges:
+        a, b = (r1, c1), (r2, c2)
+        if a not in degree or b not in degree or a == b or count not in (1, 2):
+            return False
+        if (min(a, b), max(a, b)) in seen:
+            return False
+        seen.add((min(a, b), max(a, b)))
+        if r1 == r2:
+            cells = [(r1, c) for c in range(min(c1, c2) + 1, max(c1, c2))]
+        elif c1 == c2:
+            cells = [(r, c1) for r in range(min(r1, r2) + 1, max(r1, r2))]
+        else:
+            return False
+        if not cells:
+            return False  # hai đảo sát nhau không được nối
+        for cell in cells:
+            if grid[cell[0]][cell[1]] > 0 or cell in used:
+                return False
+            used.add(cell)
+        degree[a] += count
+        degree[b] += count
+        parent[find(a)] = find(b)
+
+    if any(degree[(r, c)] != grid[r][c] for r, c in islands):
+        return False
+    return len({find(island) for island in islands}) <= 1
+
+
+class SolutionCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, grid):
+        """
+        Trả về (danh sách cạnh trong tọa độ của 'grid', tên solver đã giải), hoặc
+        None nếu chưa có. Không cần mã hóa CNF hay chạy solver nào.
+        """
+        canonical, k = canonical_form(grid)
+        path = self._path(canonical_key(canonical))
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if entry.get("grid") != canonical:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        bridges = transform_bridges(entry["bridges"], INVERSE[k], len(canonical), len(canonical[0]))
+        return bridges, entry.get("solver")
+
+    def put(self, grid, bridges, solver=None):
+        """Lưu lời giải nếu hợp lệ; trả về True nếu đã lưu."""
+        if not is_valid_solution(grid, bridges):
+            return False
+        canonical, k = canonical_form(grid)
+        entry = {
+            "grid": canonical,
+            "bridges": transform_bridges(bridges, k, len(grid), len(grid[0])),
+            "solver": solver,
+        }
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        # Ghi ra file tạm rồi đổi tên để các tiến trình khác không đọc phải file ghi dở
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(canonical_key(canonical)))
+        self.evict()
+        return True
+
+    def evict(self):
+        """Xóa các mục cũ nhất cho đến khi tổng dung lượng không vượt quá max_bytes."""
+        evict_lru(self.cache_dir, self.max_bytes, ".json")
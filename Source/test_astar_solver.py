@@ -0,0 +1,49 @@
+import itertools
+import random
+
+import pytest
+
+from astar_solver import AStarSolver
+
+MODES = ("astar", "ida")
+
+
+def satisfies(cnf, solution):
+    # Lời giải có thể chỉ gán một phần; mệnh đề chứa cả x và -x luôn thỏa
+    assigned = set(solution)
+    return all(any(lit in assigned or -lit in clause for lit in clause) for clause in cnf)
+
+
+def brute_force_sat(cnf, num_vars):
+    for values in itertools.product((False, True), repeat=num_vars):
+        if all(any(values[abs(lit) - 1] == (lit > 0) for lit in clause) for clause in cnf):
+            return True
+    return False
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_tautological_clause_is_satisfied(mode):
+    # [1, -1] luôn thỏa; không được ép x1 = True rồi báo UNSAT
+    assert AStarSolver([[1, -1], [-1]], mode=mode).solve() == [-1]
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_unsat(mode):
+    assert AStarSolver([[1, 2], [-1], [-2]], mode=mode).solve() is None
+
+
+@pytest.mark.parametrize("heuristic", ("vsids", "domwdeg", "freq"))
+@pytest.mark.parametrize("mode", MODES)
+def test_random_cnf_matches_brute_force(mode, heuristic):
+    rng = random.Random(2024)
+    for _ in range(150):
+        num_vars = rng.randint(2, 7)
+        cnf = [
+            [rng.randint(1, num_vars) * rng.choice((1, -1)) for _ in range(rng.randint(1, 3))]
+            for _ in range(rng.randint(1, 25))
+        ]
+        solution = AStarSolver(cnf, mode=mode, heuristic=heuristic).solve()
+        if solution is None:
+            assert not brute_force_sat(cnf, num_vars), cnf
+        else:
+            assert satisfies(cnf, solution), cnf
@@ -0,0 +1,39 @@
+import glob
+import os
+
+import pytest
+
+from cnf_cache import CNFCache
+from utils import parse_grid, read_input_from_file
+
+INPUT_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "Inputs", "*.txt")))
+
+# Hai đảo (0,0)-(0,1) sát nhau: Constraint 3 thêm mệnh đề đơn [-X1] dù cầu đó không được suy luận
+ADJACENT_GRID = parse_grid("""
+1, 2, 0, 1
+0, 0, 0, 0
+0, 1, 0, 0
+""")
+
+
+def assert_warm_matches_cold(cache_dir, grid, deduce):
+    cold = CNFCache(cache_dir).load_or_encode(grid, deduce=deduce)
+
+    cache = CNFCache(cache_dir)
+    warm = cache.load_or_encode(grid, deduce=deduce)
+    assert cache.hits == 1
+    assert warm.cnf.to_lists() == cold.cnf.to_lists()
+    assert warm.hash == cold.hash
+    assert warm.id == cold.id
+    # 'fixed' chỉ gồm các cầu đã suy luận, không lẫn mệnh đề đơn của Constraint 3
+    assert warm.fixed == cold.fixed
+
+
+@pytest.mark.parametrize("deduce", (False, True))
+@pytest.mark.parametrize("path", INPUT_FILES, ids=os.path.basename)
+def test_warm_load_matches_cold_encode(tmp_path, path, deduce):
+    assert_warm_matches_cold(str(tmp_path), read_input_from_file(path), deduce)
+
+
+def test_warm_load_keeps_fixed_with_adjacent_islands(tmp_path):
+    assert_warm_matches_cold(str(tmp_path), ADJACENT_GRID, deduce=True)
@@ -0,0 +1,72 @@
+import glob
+import os
+
+import pytest
+
+from hashiwokakero_cnf import HashiwokakeroCNF
+from utils import parse_grid, read_input_from_file
+
+INPUT_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "Inputs", "*.txt")))
+
+
+class ReferenceCNF(HashiwokakeroCNF):
+    """Bộ mã hóa với vòng lặp O(I²·d²) cũ của Constraint 4, dùng làm chuẩn so sánh."""
+
+    def crossing_pairs(self):
+        pairs = []
+        added = set()
+        for i, j in self.islands:
+            for z, k in self.islands:
+                for x1 in self.neighbors[(i, j)]:
+                    for x2 in self.neighbors[(z, k)]:
+                        vector1 = (x1[0] - i, x1[1] - j)
+                        vector2 = (x2[0] - z, x2[1] - k)
+                        if (vector1[0] == 0 and vector2[0] == 0) or (vector1[1] == 0 and vector2[1] == 0):
+                            continue
+                        if vector1[0] == 0:
+                            crossing = (x2[0] - i) * (z - i) < 0 and (j - k) * (x1[1] - k) < 0
+                        else:
+                            crossing = (i - z) * (x1[0] - z) < 0 and (k - j) * (x2[1] - j) < 0
+                        if crossing:
+                            sorted_cross = tuple(sorted([(i, j), (z, k), x1, x2]))
+                            if sorted_cross not in added:
+                                added.add(sorted_cross)
+                                pairs.append((((i, j), x1), ((z, k), x2)))
+        return pairs
+
+
+class NoCrossingCNF(HashiwokakeroCNF):
+    def crossing_pairs(self):
+        return []
+
+
+# Cầu ngang (1,0)-(1,4) cắt cầu dọc (0,2)-(2,2)
+CROSS_GRID = parse_grid("""
+0, 0, 1, 0, 0
+2, 0, 0, 0, 2
+0, 0, 1, 0, 0
+""")
+
+
+def assert_same_encoding(actual, expected):
+    assert actual.cnf.to_lists() == expected.cnf.to_lists()
+    assert actual.hash == expected.hash
+    assert actual.id == expected.id
+
+
+@pytest.mark.parametrize("path", INPUT_FILES, ids=os.path.basename)
+def test_sweep_matches_reference_on_inputs(path):
+    grid = read_input_from_file(path)
+    assert_same_encoding(HashiwokakeroCNF(grid), ReferenceCNF(grid))
+
+
+def test_sweep_matches_reference_with_crossing():
+    encoded = HashiwokakeroCNF(CROSS_GRID)
+    assert encoded.crossing_pairs() == [(((0, 2), (2, 2)), ((1, 0), (1, 4)))]
+    assert_same_encoding(encoded, ReferenceCNF(CROSS_GRID))
+
+    # Mệnh đề cắt nhau thực sự có mặt trong CNF
+    vertical = encoded.hash[("X1", (0, 2), (2, 2))]
+    horizontal = encoded.hash[("X1", (1, 0), (1, 4))]
+    assert [-vertical, -horizontal] in encoded.cnf.to_lists()
+    assert encoded.cnf.to_lists() != NoCrossingCNF(CROSS_GRID).cnf.to_lists()
@@ -1,3 +1,4 @@
+import json
 import os
 
 def choose_input_file():
@@ -32,68 +33,164 @@ def read_input_from_file(filename):
     """
     Đọc file 'filename' và chuyển nội dung thành một danh sách các hàng (grid).
     """
-    grid = []
     with open(filename, 'r') as file:
-        for line in file:
-            # Tách bằng ',' và loại bỏ khoảng trắng dư thừa
-            row = list(map(int, [x.strip() for x in line.strip().split(',')]))
-            grid.append(row)
+        return parse_grid(file)
+
+
+def parse_grid(lines):
+    """
+    Chuyển các dòng theo định dạng file đề ("2, 0, 2, 0") thành grid. 'lines' là một
+    chuỗi nhiều dòng hoặc một iterable các dòng (ví dụ file đang mở).
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    grid = []
+    for line in lines:
+        # Bỏ qua dòng trống (ví dụ dòng trống cuối file)
+        if not line.strip():
+            continue
+        # Tách bằng ',' và loại bỏ khoảng trắng dư thừa
+        row = list(map(int, [x.strip() for x in line.strip().split(',')]))
+        grid.append(row)
     return grid
 
 
+def solution_bridges(solution, hash_dict):
+    """
+    Các cầu được xây trong lời giải, mỗi cầu vô hướng xuất hiện đúng một lần:
+    danh sách ((x1, y1), (x2, y2), số cầu) với đầu (x1, y1) đứng trước.
+    Tập literal đúng được dựng một lần nên mỗi phép kiểm tra chỉ tốn O(1).
+    """
+    true_vars = {lit for lit in solution if lit > 0}
+    bridges = []
+    for (kind, a, b), var in hash_dict.items():
+        # key = ("X1"/"X2", (x1,y1), (x2,y2)); mỗi cầu có hai khóa X1 theo hai chiều
+        if kind != "X1" or a > b:
+            continue
+        if hash_dict[("X2", a, b)] in true_vars:
+            bridges.append((a, b, 2))
+        elif var in true_vars:
+            bridges.append((a, b, 1))
+    return bridges
+
+
 def solution_to_text(grid, solution, hash_dict):
     """
     Trả về danh sách các dòng (list of strings) mô tả lưới kèm các cầu.
     Mỗi phần tử trong danh sách là 1 dòng (string).
     """
-    rows, cols = len(grid), len(grid[0])
-    display_grid = [["0" for _ in range(cols)] for _ in range(rows)]
-    
-    # Đặt các đảo vào lưới hiển thị
-    for i in range(rows):
-        for j in range(cols):
-            if grid[i][j] > 0:
-                display_grid[i][j] = str(grid[i][j])
-    
+    return edges_to_text(grid, solution_edge_list(solution, hash_dict))
+
+
+def edges_to_text(grid, edges):
+    """
+    Như solution_to_text nhưng nhận thẳng danh sách cạnh [x1, y1, x2, y2, số cầu]
+    với đầu (x1, y1) đứng trước (ví dụ lời giải lấy từ cache), không cần bảng biến.
+    """
+    display_grid = [["0" if value <= 0 else str(value) for value in row] for row in grid]
+
     # Thêm cầu vào lưới hiển thị
-    for (key, var) in hash_dict.items():
-        # key = ("X1"/"X2", (x1,y1), (x2,y2))
-        if var in solution:
-            (x1, y1), (x2, y2) = key[1], key[2]
-            if x1 == x2:  # Cầu ngang
-                bridge_char = '-' if key[0] == "X1" else '='
-                for y in range(min(y1, y2) + 1, max(y1, y2)):
-                    display_grid[x1][y] = bridge_char
-            else:  # Cầu dọc
-                bridge_char = '|' if key[0] == "X1" else '$'
-                for x in range(min(x1, x2) + 1, max(x1, x2)):
-                    display_grid[x][y1] = bridge_char
-    
+    for x1, y1, x2, y2, count in edges:
+        if x1 == x2:  # Cầu ngang
+            bridge_char = '-' if count == 1 else '='
+            row = display_grid[x1]
+            for y in range(y1 + 1, y2):
+                row[y] = bridge_char
+        else:  # Cầu dọc
+            bridge_char = '|' if count == 1 else '$'
+            for x in range(x1 + 1, x2):
+                display_grid[x][y1] = bridge_char
+
     # Tạo list các dòng (string) để trả về
-    lines = []
-    for row in display_grid:
-        lines.append(" ".join(row))
-    return lines
+    return [" ".join(row) for row in display_grid]
+
+
+def solution_edge_list(solution, hash_dict):
+    """Danh sách cạnh gọn cho JSON: [hàng1, cột1, hàng2, cột2, số cầu]."""
+    return [[a[0], a[1], b[0], b[1], count] for a, b, count in solution_bridges(solution, hash_dict)]
 
 
-def write_output_to_file(input_filepath, content):
+def solution_to_json(grid, solutions):
     """
-    Ghi 'content' vào file trong thư mục Outputs/ với tên
-    thay 'input' thành 'output'. 
+    Dạng máy đọc được của các lời giải một đề: kích thước lưới, các đảo [hàng, cột, số]
+    và 'solutions' ánh xạ tên solver -> danh sách cạnh (None nếu không có lời giải).
+    """
+    return {
+        "rows": len(grid),
+        "cols": len(grid[0]),
+        "islands": [[i, j, value] for i, row in enumerate(grid) for j, value in enumerate(row) if value > 0],
+        "solutions": solutions,
+    }
+
+
+def write_output_to_file(input_filepath, lines, output_folder="Outputs"):
+    """
+    Ghi từng dòng của 'lines' (mỗi dòng kèm "\n") vào file trong thư mục Outputs/
+    (hoặc 'output_folder') với tên thay 'input' thành 'output', qua bộ đệm của file
+    thay vì nối tất cả thành một chuỗi lớn trước.
     Ví dụ:
       input_filepath = "Inputs/input1.txt"
       -> output_filepath = "Outputs/output1.txt"
+    Trả về đường dẫn file đã ghi.
     """
     filename = os.path.basename(input_filepath)
     output_filename = filename.replace("input", "output")
 
-    output_folder = "Outputs"
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
     output_path = os.path.join(output_folder, output_filename)
     
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+        for line in lines:
+            f.write(line)
+            f.write("\n")
     
     print(f"Đã ghi kết quả vào file: {output_path}")
+    return output_path
+
+
+def write_json_output(input_filepath, data, output_folder="Outputs"):
+    """
+    Ghi 'data' dạng JSON cạnh file lưới: "Inputs/input1.txt" -> "Outputs/output1.json".
+    Trả về đường dẫn file đã ghi.
+    """
+    filename = os.path.splitext(os.path.basename(input_filepath))[0]
+    output_filename = filename.replace("input", "output") + ".json"
+
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    output_path = os.path.join(output_folder, output_filename)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+    print(f"Đã ghi lời giải dạng JSON vào file: {output_path}")
+    return output_path
+
+
+def evict_lru(cache_dir, max_bytes, suffix):
+    """
+    Giới hạn dung lượng một thư mục cache: xóa các file đuôi 'suffix' ít được dùng gần
+    đây nhất (mtime nhỏ nhất) cho đến khi tổng dung lượng không vượt quá 'max_bytes'.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size